@@ -1,5 +1,18 @@
 from pyteal import *
-from .state import GlobalState, LocalState
+from pyteal.util import reset_label_count
+
+from . import teal
+from .state import GlobalState, LocalState, Cached, Named, Store, load, commit
+from .router import Route, router
+
+# Expected share of application calls per method, every swap is followed by a withdraw
+METHOD_FREQUENCIES = {
+    'UPDATE': 0,
+    'ADD_LIQUIDITY': 5,
+    'REMOVE_LIQUIDITY': 5,
+    'SWAP': 100,
+    'WITHDRAW': 100,
+}
 
 
 def state(ratio_decimal_points: int, fee_pct: int):
@@ -15,18 +28,14 @@ def state(ratio_decimal_points: int, fee_pct: int):
     TOKENS_TO_WITHDRAW = LocalState('TOKENS_TO_WITHDRAW')  # uint64
     USER_LIQUIDITY_TOKENS = LocalState('USER_LIQUIDITY_TOKENS')  # uint64
 
-    # exchange rate, always as ASA:ALGOS and in ratio_decimal_points precision
-    EXCHANGE_RATE = ALGOS_BALANCE.get() * Int(ratio_decimal_points) / TOKENS_BALANCE.get()
-    ALGOS_CALC = ALGOS_BALANCE.get() * Btoi(Txn.application_args[1]) / TOTAL_LIQUIDITY_TOKENS.get()
-    TOKEN_CALC = TOKENS_BALANCE.get() * Btoi(Txn.application_args[1]) / TOTAL_LIQUIDITY_TOKENS.get()
-
-    on_closeout = Assert(
-        And(
+    on_closeout = Seq([
+        Assert(And(
             TOKENS_TO_WITHDRAW.get() == Int(0),
             ALGOS_TO_WITHDRAW.get() == Int(0),
             USER_LIQUIDITY_TOKENS.get() == Int(0),
-        )
-    )
+        )),
+        Return(Int(1))
+    ])
 
     on_create = Seq([
         ASSET_IDX.put(Btoi(Txn.application_args[0])),
@@ -52,111 +61,173 @@ def state(ratio_decimal_points: int, fee_pct: int):
         Return(Int(1))
     ])
 
-    tx_ratio = Gtxn[2].amount() * Int(ratio_decimal_points) / Gtxn[1].asset_amount()
-    liquidity_calc = Gtxn[2].amount() * TOTAL_LIQUIDITY_TOKENS.get() / ALGOS_BALANCE.get()
+    # loaded once per call, see State.load()
+    exchange_rate = Cached(Named(
+        'exchange_rate', ALGOS_BALANCE.cached() * Int(ratio_decimal_points) / TOKENS_BALANCE.cached()
+    ))
+    tx_ratio = Cached(Named('tx_ratio', Gtxn[2].amount() * Int(ratio_decimal_points) / Gtxn[1].asset_amount()))
+    liquidity_calc = Cached(Named(
+        'liquidity_calc', Gtxn[2].amount() * TOTAL_LIQUIDITY_TOKENS.cached() / ALGOS_BALANCE.cached()
+    ))
     on_add_liquidity = Seq([
         Assert(And(
             Global.group_size() == Int(3),
-            Gtxn[1].type_enum() == TxnType.AssetTransfer,
-            Gtxn[2].type_enum() == TxnType.Payment,
+            # Only asset transfers have a non-zero XferAsset
             Gtxn[1].xfer_asset() == ASSET_IDX.get(),
+            Gtxn[2].type_enum() == TxnType.Payment,
         )),
+        load(TOKENS_BALANCE, ALGOS_BALANCE, TOTAL_LIQUIDITY_TOKENS),
         If(
             And(
-                TOKENS_BALANCE.get() != Int(0),
-                ALGOS_BALANCE.get() != Int(0),
-            ),
-            If(
-                # Check if transactions exchange rate matches or is max 1% different from current
-                Ge(EXCHANGE_RATE, tx_ratio),
-                Assert((EXCHANGE_RATE - tx_ratio) * Int(ratio_decimal_points) / EXCHANGE_RATE
-                       < Int(int(0.01 * ratio_decimal_points))),
-                Assert((tx_ratio - EXCHANGE_RATE) * Int(ratio_decimal_points) / EXCHANGE_RATE
-                       < Int(int(0.01 * ratio_decimal_points)))
+                TOKENS_BALANCE.cached() != Int(0),
+                ALGOS_BALANCE.cached() != Int(0),
             ),
+            Seq([
+                exchange_rate.store(),
+                tx_ratio.store(),
+                # Check if transactions exchange rate matches or is less than 1% different from current
+                Named('ratio_tolerance', Assert(
+                    If(
+                        Ge(exchange_rate.load(), tx_ratio.load()),
+                        exchange_rate.load() - tx_ratio.load(),
+                        tx_ratio.load() - exchange_rate.load(),
+                    ) * Int(100) < exchange_rate.load()
+                )),
+            ]),
         ),
         If(
             # If its first transaction then add tokens directly from txn amount, else based on calculations
-            TOTAL_LIQUIDITY_TOKENS.get() == Int(0),
+            TOTAL_LIQUIDITY_TOKENS.cached() == Int(0),
             Seq([
                 USER_LIQUIDITY_TOKENS.put(Gtxn[2].amount()),
                 TOTAL_LIQUIDITY_TOKENS.put(Gtxn[2].amount()),
             ]),
             Seq([
-                USER_LIQUIDITY_TOKENS.put(USER_LIQUIDITY_TOKENS.get() + liquidity_calc),
-                TOTAL_LIQUIDITY_TOKENS.put(TOTAL_LIQUIDITY_TOKENS.get() + liquidity_calc),
+                liquidity_calc.store(),
+                USER_LIQUIDITY_TOKENS.put(USER_LIQUIDITY_TOKENS.get() + liquidity_calc.load()),
+                TOTAL_LIQUIDITY_TOKENS.put(TOTAL_LIQUIDITY_TOKENS.cached() + liquidity_calc.load()),
             ])
         ),
-        TOKENS_BALANCE.put(TOKENS_BALANCE.get() + Gtxn[1].asset_amount()),
-        ALGOS_BALANCE.put(ALGOS_BALANCE.get() + Gtxn[2].amount()),
+        TOKENS_BALANCE.put(TOKENS_BALANCE.cached() + Gtxn[1].asset_amount()),
+        ALGOS_BALANCE.put(ALGOS_BALANCE.cached() + Gtxn[2].amount()),
         Return(Int(1))
     ])
 
+    liquidity_amount = Cached(Btoi(Txn.application_args[1]))
     on_remove_liquidity = Seq([
+        liquidity_amount.store(),
         Assert(And(
             Global.group_size() == Int(1),
-            USER_LIQUIDITY_TOKENS.get() >= Btoi(Txn.application_args[1]),
+            USER_LIQUIDITY_TOKENS.get() >= liquidity_amount.load(),
             ALGOS_TO_WITHDRAW.get() == Int(0),
             TOKENS_TO_WITHDRAW.get() == Int(0),
         )),
-        ALGOS_TO_WITHDRAW.put(ALGOS_CALC),
-        TOKENS_TO_WITHDRAW.put(TOKEN_CALC),
-        USER_LIQUIDITY_TOKENS.put(USER_LIQUIDITY_TOKENS.get() - Btoi(Txn.application_args[1])),
-        TOTAL_LIQUIDITY_TOKENS.put(TOTAL_LIQUIDITY_TOKENS.get() - Btoi(Txn.application_args[1])),
-        ALGOS_BALANCE.put(ALGOS_BALANCE.get() - ALGOS_TO_WITHDRAW.get()),
-        TOKENS_BALANCE.put(TOKENS_BALANCE.get() - TOKENS_TO_WITHDRAW.get()),
+        Named('withdraw_amounts', Seq([
+            ALGOS_TO_WITHDRAW.stage(ALGOS_BALANCE.get() * liquidity_amount.load() / TOTAL_LIQUIDITY_TOKENS.get()),
+            TOKENS_TO_WITHDRAW.stage(TOKENS_BALANCE.get() * liquidity_amount.load() / TOTAL_LIQUIDITY_TOKENS.get()),
+        ])),
+        USER_LIQUIDITY_TOKENS.put(USER_LIQUIDITY_TOKENS.get() - liquidity_amount.load()),
+        TOTAL_LIQUIDITY_TOKENS.put(TOTAL_LIQUIDITY_TOKENS.get() - liquidity_amount.load()),
+        ALGOS_BALANCE.put(ALGOS_BALANCE.get() - ALGOS_TO_WITHDRAW.cached()),
+        TOKENS_BALANCE.put(TOKENS_BALANCE.get() - TOKENS_TO_WITHDRAW.cached()),
+        commit(ALGOS_TO_WITHDRAW, TOKENS_TO_WITHDRAW),
         Return(Int(1))
     ])
 
+    reserve_in = ScratchSlot()
+    reserve_out = ScratchSlot()
+    swap_in = ScratchSlot()
+    swap_out = ScratchSlot()
+
+    def reserves(reserve_in_value: Expr, reserve_out_value: Expr) -> Expr:
+        return Seq([Store(reserve_in, reserve_in_value), Store(reserve_out, reserve_out_value)])
+
+    # x * y = k on the reserves before the deposit, with the fee kept from the input. Fields that do not apply
+    # to the transfer type read as zero, so the sum is the amount sent either way. reserve_out * swap_in / D,
+    # with D = reserve_in + swap_in, is split on reserve_out = q * D + r into q * swap_in + r * swap_in / D.
+    # That is the same floor, and as r < D it cannot overflow before D * swap_in reaches 2^64
+    constant_product = Seq([
+        Store(swap_in, (Gtxn[1].amount() + Gtxn[1].asset_amount()) * Int(100 - fee_pct) / Int(100)),
+        Store(reserve_in, reserve_in.load() + swap_in.load()),
+        Store(
+            swap_out,
+            reserve_out.load() / reserve_in.load() * swap_in.load()
+            + reserve_out.load() % reserve_in.load() * swap_in.load() / reserve_in.load()
+        ),
+    ])
+
+    # Gtxn[1] and Gtxn[2] are checked to be transfers, so this call can only be Gtxn[0]
     on_swap = Seq([
-        Assert(And(
+        If(
+            # Only asset transfers have a non-zero XferAsset
+            Gtxn[1].xfer_asset(),
+            Seq([
+                Assert(And(
+                    Gtxn[1].asset_receiver() == ESCROW_ADDR.get(),
+                    Gtxn[1].xfer_asset() == ASSET_IDX.get(),
+                )),
+                reserves(TOKENS_BALANCE.get(), ALGOS_BALANCE.get()),
+                TOKENS_BALANCE.put(TOKENS_BALANCE.get() + Gtxn[1].asset_amount()),
+            ]),
+            Seq([
+                # Only payments have a non-zero Receiver
+                Assert(Gtxn[1].receiver() == ESCROW_ADDR.get()),
+                reserves(ALGOS_BALANCE.get(), TOKENS_BALANCE.get()),
+                ALGOS_BALANCE.put(ALGOS_BALANCE.get() + Gtxn[1].amount()),
+            ])
+        ),
+        Named('swap_out', constant_product),
+        If(
+            # Groups of 3 are settled by the escrow, it signs no other SWAP groups
             Global.group_size() == Int(2),
-            Gtxn[0].type_enum() == TxnType.ApplicationCall,
-            ALGOS_TO_WITHDRAW.get() == Int(0),
-            TOKENS_TO_WITHDRAW.get() == Int(0),
-        )),
-        Cond(
-            [
-                Gtxn[1].type_enum() == TxnType.AssetTransfer,
-                Seq([
-                    Assert(And(
-                        Gtxn[1].asset_receiver() == ESCROW_ADDR.get(),
-                        Gtxn[1].xfer_asset() == ASSET_IDX.get(),
-                    )),
-                    TOKENS_BALANCE.put(TOKENS_BALANCE.get() + Gtxn[1].asset_amount()),
-                    ALGOS_TO_WITHDRAW.put(
-                        # same as (exchange_rate * asset_amount * ((100 - fee_pct)/100)) / ratio_decimal_points
-                        (EXCHANGE_RATE * Gtxn[1].asset_amount() * Int(100 - fee_pct))
-                        / Int(ratio_decimal_points) * Int(100)
-                    ),
-                    ALGOS_BALANCE.put(ALGOS_BALANCE.get() - ALGOS_TO_WITHDRAW.get()),
-                ])
-            ],
-            [
-                Gtxn[1].type_enum() == TxnType.Payment,
-                Seq([
-                    Assert(Gtxn[1].receiver() == ESCROW_ADDR.get()),
-                    ALGOS_BALANCE.put(ALGOS_BALANCE.get() + Gtxn[1].amount()),
-                    TOKENS_TO_WITHDRAW.put(
-                        (Gtxn[1].amount() * Int(100 - fee_pct))
-                        * Int(ratio_decimal_points) / Int(100) / EXCHANGE_RATE
-                    ),
-                    TOKENS_BALANCE.put(TOKENS_BALANCE.get() - TOKENS_TO_WITHDRAW.get()),
-                ])
-            ]
+            Named('swap_credit', Seq([
+                Assert(Not(Or(ALGOS_TO_WITHDRAW.get(), TOKENS_TO_WITHDRAW.get()))),
+                If(
+                    Gtxn[1].xfer_asset(),
+                    Seq([
+                        ALGOS_TO_WITHDRAW.put(swap_out.load()),
+                        ALGOS_BALANCE.put(ALGOS_BALANCE.get() - swap_out.load()),
+                    ]),
+                    Seq([
+                        TOKENS_TO_WITHDRAW.put(swap_out.load()),
+                        TOKENS_BALANCE.put(TOKENS_BALANCE.get() - swap_out.load()),
+                    ])
+                ),
+            ])),
+            # The escrow pays the output to the trader in the same group. Payment and asset transfer fields
+            # that do not apply to the payout type read as zero, so one set of checks covers both directions.
+            Named('swap_settle', Seq([
+                Assert(And(
+                    Gtxn[2].sender() == ESCROW_ADDR.get(),
+                    # The escrow only signs payments and asset transfers, so this makes the payout an asset
+                    # transfer of the pool's asset after a payment and a payment after an asset transfer
+                    Gtxn[1].xfer_asset() + Gtxn[2].xfer_asset() == ASSET_IDX.get(),
+                    Or(Gtxn[2].receiver() == Txn.sender(), Gtxn[2].asset_receiver() == Txn.sender()),
+                    Gtxn[2].amount() + Gtxn[2].asset_amount() <= swap_out.load(),
+                )),
+                ALGOS_BALANCE.put(ALGOS_BALANCE.get() - Gtxn[2].amount() - Gtxn[2].fee()),
+                TOKENS_BALANCE.put(TOKENS_BALANCE.get() - Gtxn[2].asset_amount()),
+            ]))
         ),
         Return(Int(1))
     ])
 
+    # Groups of 3 carry the asset transfer and then the payment, groups of 2 only the one that is due.
+    # The escrow signs nothing but payments and asset transfers, and the fields of the other type read as zero.
     on_withdraw = Seq([
         Assert(And(
-            Global.group_size() == Int(3),
-            Gtxn[1].asset_amount() == TOKENS_TO_WITHDRAW.get(),
             Gtxn[1].sender() == ESCROW_ADDR.get(),
-            Gtxn[1].xfer_asset() == ASSET_IDX.get(),
-            Gtxn[2].amount() == ALGOS_TO_WITHDRAW.get(),
-            Gtxn[2].sender() == ESCROW_ADDR.get(),
+            Or(Gtxn[1].type_enum() == TxnType.Payment, Gtxn[1].xfer_asset() == ASSET_IDX.get()),
+            Gtxn[1].asset_amount() == TOKENS_TO_WITHDRAW.get(),
         )),
+        If(
+            Global.group_size() == Int(3),
+            Assert(And(
+                Gtxn[2].sender() == ESCROW_ADDR.get(),
+                Gtxn[1].amount() + Gtxn[2].amount() == ALGOS_TO_WITHDRAW.get(),
+            )),
+            Assert(Gtxn[1].amount() == ALGOS_TO_WITHDRAW.get()),
+        ),
         TOKENS_TO_WITHDRAW.put(Int(0)),
         ALGOS_TO_WITHDRAW.put(Int(0)),
         # Remove 1000 Algos that is taken as a fee
@@ -164,19 +235,18 @@ def state(ratio_decimal_points: int, fee_pct: int):
         Return(Int(1))
     ])
 
-    return Cond(
-        [Txn.application_id() == Int(0), on_create],
-        [Txn.on_completion() == OnComplete.OptIn, on_register],
-        [Txn.on_completion() == Or(
-            OnComplete.UpdateApplication,
-            OnComplete.DeleteApplication
-        ), Return(Int(0))],
-        [Txn.on_completion() == OnComplete.CloseOut, on_closeout],
-        [Txn.application_args[0] == Bytes('UPDATE'), on_update],
-        [Txn.application_args[0] == Bytes('ADD_LIQUIDITY'), on_add_liquidity],
-        [Txn.application_args[0] == Bytes('REMOVE_LIQUIDITY'), on_remove_liquidity],
-        [Txn.application_args[0] == Bytes('SWAP'), on_swap],
-        [Txn.application_args[0] == Bytes('WITHDRAW'), on_withdraw]
+    handlers = {
+        'UPDATE': on_update,
+        'ADD_LIQUIDITY': on_add_liquidity,
+        'REMOVE_LIQUIDITY': on_remove_liquidity,
+        'SWAP': on_swap,
+        'WITHDRAW': on_withdraw,
+    }
+    return router(
+        [Route(method, handler, METHOD_FREQUENCIES[method]) for method, handler in handlers.items()],
+        on_create=on_create,
+        on_opt_in=on_register,
+        on_close_out=on_closeout,
     )
 
 
@@ -196,39 +266,111 @@ def clear():
 
 
 def escrow(app_id):
+    # Anything the escrow signs must not close, rekey or drain the account through the fee
+    untouched = And(
+        Txn.fee() <= Global.min_txn_fee(),
+        Txn.close_remainder_to() == Global.zero_address(),
+        Txn.asset_close_to() == Global.zero_address(),
+        Txn.rekey_to() == Global.zero_address(),
+    )
+    # The approval program must run the branch that validates the group
+    app_call = And(
+        Gtxn[0].application_id() == Int(app_id),
+        Gtxn[0].type_enum() == TxnType.ApplicationCall,
+        Gtxn[0].on_completion() == OnComplete.NoOp,
+    )
+    payout = Or(Txn.type_enum() == TxnType.Payment, Txn.type_enum() == TxnType.AssetTransfer)
+
     on_asset_opt_in = Seq([
         Assert(And(
             Txn.type_enum() == TxnType.AssetTransfer,
-            Txn.asset_amount() == Int(0)
+            Txn.asset_amount() == Int(0),
+            Txn.asset_receiver() == Txn.sender(),
+            untouched,
         )),
         Return(Int(1))
     ])
 
     on_withdraw = Seq([
         Assert(And(
-            Gtxn[0].application_id() == Int(app_id),
-            Gtxn[0].type_enum() == TxnType.ApplicationCall,
-            Gtxn[0].application_args[0] == Bytes('WITHDRAW'),
-            Gtxn[1].type_enum() == TxnType.AssetTransfer,
-            Gtxn[2].type_enum() == TxnType.Payment,
+            app_call,
+            Txn.group_index() != Int(0),
+            payout,
+            untouched,
+        )),
+        Return(Int(1))
+    ])
+
+    on_swap_settle = Seq([
+        Assert(And(
+            app_call,
+            # Only the payout is signed by the escrow, never the deposit
+            Txn.group_index() == Int(2),
+            payout,
+            # The pool pays this fee, see on_swap
+            untouched,
         )),
         Return(Int(1))
     ])
 
     return Cond(
         [Global.group_size() == Int(1), on_asset_opt_in],
-        [Global.group_size() == Int(3), on_withdraw],
+        # Groups of 2 carry a single transfer of either type
+        [And(Global.group_size() == Int(2), Gtxn[0].application_args[0] == Bytes('WITHDRAW')), on_withdraw],
+        [
+            And(Global.group_size() == Int(3), Gtxn[0].application_args[0] == Bytes('WITHDRAW')),
+            Seq([
+                Assert(And(
+                    Gtxn[1].type_enum() == TxnType.AssetTransfer,
+                    Gtxn[2].type_enum() == TxnType.Payment,
+                )),
+                on_withdraw,
+            ])
+        ],
+        [And(Global.group_size() == Int(3), Gtxn[0].application_args[0] == Bytes('SWAP')), on_swap_settle],
     )
 
 
-with open('./contracts/state.teal', 'w') as f:
-    state_teal = compileTeal(state(1000000, 3), Mode.Application)
-    f.write(state_teal)
+def to_teal(expr: Expr, mode: Mode) -> str:
+    """
+    Compile `expr` the same way whatever this process compiled before.
+    """
+    # PyTeal numbers labels and scratch slots per process
+    reset_label_count()
+    ScratchSlot.slotId = 0
+    return compileTeal(expr, mode)
+
+
+def check_size(name: str, source: str, limit: int):
+    size = len(teal.assemble(source))
+    if size > limit:
+        raise teal.TealError(f'{name} is {size} bytes, over the limit of {limit}')
+
+
+def build_app(ratio_decimal_points: int = 1000000, fee_pct: int = 3, directory: str = './contracts'):
+    state_teal = to_teal(state(ratio_decimal_points, fee_pct), Mode.Application)
+    check_size('state.teal', state_teal, teal.MAX_APP_PROGRAM_LEN)
+    clear_teal = to_teal(clear(), Mode.Application)
+    check_size('clear.teal', clear_teal, teal.MAX_APP_PROGRAM_LEN)
+
+    with open(f'{directory}/state.teal', 'w') as f:
+        f.write(state_teal)
+    with open(f'{directory}/clear.teal', 'w') as f:
+        f.write(clear_teal)
+
+
+def build_escrow(app_id: int = 123, directory: str = './contracts'):
+    escrow_teal = to_teal(escrow(app_id), Mode.Signature)
+    check_size('escrow.teal', escrow_teal, teal.MAX_LOGIC_SIG_LEN)
+
+    with open(f'{directory}/escrow.teal', 'w') as f:
+        f.write(escrow_teal)
+
+
+def build(ratio_decimal_points: int = 1000000, fee_pct: int = 3, app_id: int = 123, directory: str = './contracts'):
+    build_app(ratio_decimal_points, fee_pct, directory)
+    build_escrow(app_id, directory)
 
-with open('./contracts/clear.teal', 'w') as f:
-    clear_teal = compileTeal(clear(), Mode.Application)
-    f.write(clear_teal)
 
-with open('./contracts/escrow.teal', 'w') as f:
-    escrow_teal = compileTeal(escrow(123), Mode.Signature)
-    f.write(escrow_teal)
+if __name__ == '__main__':
+    build()
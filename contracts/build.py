@@ -0,0 +1,129 @@
+"""
+Incremental builds of contract variants.
+
+The approval and clear programs of each (`ratio_decimal_points`, `fee_pct`)
+are compiled into `<directory>/app-<key>/`, and the escrow of each `app_id`
+into `<directory>/escrow-<key>/`, where the key hashes the PyTeal sources,
+the PyTeal version and the parameters the programs depend on. A directory
+that exists is up to date and is not rebuilt, missing ones are compiled on
+a process pool. Run with:
+
+    python -m contracts.build --fee 1 --fee 3 --fee 5 --app-id 123
+"""
+import os
+import json
+import shutil
+import hashlib
+import argparse
+import tempfile
+import itertools
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import pyteal
+
+# Modules whose code ends up in the TEAL programs
+SOURCES = ('asaswap.py', 'state.py', 'router.py')
+
+Variant = namedtuple('Variant', ['ratio_decimal_points', 'fee_pct', 'app_id'], defaults=[1000000, 3, 123])
+BuildResult = namedtuple('BuildResult', ['variant', 'app_path', 'escrow_path', 'built'])
+
+
+def source_hash() -> str:
+    digest = hashlib.sha256(getattr(pyteal, '__version__', '').encode())
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in SOURCES:
+        with open(os.path.join(directory, name), 'rb') as f:
+            digest.update(name.encode() + b'\0' + f.read())
+    return digest.hexdigest()
+
+
+def program_key(kind: str, params: dict, sources: str = None) -> str:
+    params = json.dumps(params, sort_keys=True)
+    return hashlib.sha256(f'{sources or source_hash()}:{kind}:{params}'.encode()).hexdigest()[:32]
+
+
+def _targets(variant: Variant) -> tuple:
+    app = ('app', {'ratio_decimal_points': variant.ratio_decimal_points, 'fee_pct': variant.fee_pct})
+    escrow = ('escrow', {'app_id': variant.app_id})
+    return app, escrow
+
+
+def _build(kind: str, params: dict, path: str, sources: str) -> str:
+    from contracts.asaswap import build_app, build_escrow
+
+    parent = os.path.dirname(path)
+    os.makedirs(parent, exist_ok=True)
+    # Build next to the target and rename, so a directory that exists is always complete
+    tmp_path = tempfile.mkdtemp(dir=parent)
+    try:
+        if kind == 'app':
+            build_app(directory=tmp_path, **params)
+        else:
+            build_escrow(directory=tmp_path, **params)
+        with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+            json.dump({kind: params, 'sources': sources}, f, indent=2)
+        os.rename(tmp_path, path)
+    except OSError:
+        # Another build of the same programs got there first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        if not os.path.isdir(path):
+            raise
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    return path
+
+
+def build_variants(variants, directory: str = './build', max_workers: int = None) -> list:
+    """
+    Bring every variant up to date and return a BuildResult for each.
+
+    Variants that differ in `app_id` only share their approval and clear programs.
+    """
+    sources = source_hash()
+    paths = {}
+    results = []
+    for variant in dict.fromkeys(Variant(*variant) for variant in variants):
+        variant_paths = []
+        for kind, params in _targets(variant):
+            path = os.path.join(directory, f'{kind}-{program_key(kind, params, sources)}')
+            paths.setdefault(path, (kind, params, not os.path.isdir(path)))
+            variant_paths.append(path)
+        app_path, escrow_path = variant_paths
+        results.append(BuildResult(variant, app_path, escrow_path, paths[app_path][2] or paths[escrow_path][2]))
+
+    todo = [(kind, params, path) for path, (kind, params, missing) in paths.items() if missing]
+    if len(todo) == 1 or max_workers == 1:
+        for kind, params, path in todo:
+            _build(kind, params, path, sources)
+    elif todo:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_build, kind, params, path, sources) for kind, params, path in todo]
+            for future in futures:
+                future.result()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m contracts.build', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--ratio', type=int, action='append', help='ratio_decimal_points, repeatable')
+    parser.add_argument('--fee', type=int, action='append', help='fee_pct, repeatable')
+    parser.add_argument('--app-id', type=int, action='append', help='escrow app id, repeatable')
+    parser.add_argument('--directory', default='./build')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    defaults = Variant()
+    variants = itertools.product(
+        args.ratio or [defaults.ratio_decimal_points],
+        args.fee or [defaults.fee_pct],
+        args.app_id or [defaults.app_id],
+    )
+    for result in build_variants(variants, args.directory, args.workers):
+        status = 'built' if result.built else 'up to date'
+        print(f'{result.app_path}  {result.escrow_path}  {status:<10}  {json.dumps(result.variant._asdict())}')
+
+
+if __name__ == '__main__':
+    main()
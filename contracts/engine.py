@@ -0,0 +1,327 @@
+"""
+Pure-Python reference engine for the pool state machine in contracts/asaswap.py.
+
+Every branch mirrors the integer math of the TEAL program, including the
+order of uint64 truncating divisions and the points where the AVM would
+panic on overflow, underflow or division by zero.
+"""
+
+UINT64_MAX = (1 << 64) - 1
+
+# Fee that on_withdraw takes out of ALGOS_BALANCE for the escrow transactions
+WITHDRAW_FEE = 1000
+
+
+class TransactionRejected(Exception):
+    """
+    Raised whenever the contract would reject the transaction group.
+    """
+
+
+def _add(a: int, b: int) -> int:
+    c = a + b
+    if c > UINT64_MAX:
+        raise TransactionRejected('+ overflowed')
+    return c
+
+
+def _sub(a: int, b: int) -> int:
+    if b > a:
+        raise TransactionRejected('- would result negative')
+    return a - b
+
+
+def _mul(a: int, b: int) -> int:
+    c = a * b
+    if c > UINT64_MAX:
+        raise TransactionRejected('* overflowed')
+    return c
+
+
+def _div(a: int, b: int) -> int:
+    if b == 0:
+        raise TransactionRejected('/ 0')
+    return a // b
+
+
+def _mod(a: int, b: int) -> int:
+    if b == 0:
+        raise TransactionRejected('% 0')
+    return a % b
+
+
+def _constant_product(reserve_in: int, reserve_out: int, amount_in: int) -> int:
+    # reserve_out * amount_in / (reserve_in + amount_in), split the way the contract does so it overflows alike
+    total = _add(reserve_in, amount_in)
+    return _add(_mul(_div(reserve_out, total), amount_in), _div(_mul(_mod(reserve_out, total), amount_in), total))
+
+
+def _assert(condition: bool, message: str):
+    if not condition:
+        raise TransactionRejected(message)
+
+
+def _uint64(value: int) -> int:
+    if not 0 <= value <= UINT64_MAX:
+        raise TransactionRejected('value does not fit in uint64')
+    return value
+
+
+class PoolState:
+    """
+    Global state of the application.
+    """
+    __slots__ = (
+        'total_liquidity_tokens',
+        'algos_balance',
+        'tokens_balance',
+        'escrow_addr',
+        'creator_addr',
+        'asset_idx',
+    )
+
+    def __init__(self, creator_addr: str, asset_idx: int):
+        self.total_liquidity_tokens = 0
+        self.algos_balance = 0
+        self.tokens_balance = 0
+        self.escrow_addr = None
+        self.creator_addr = creator_addr
+        self.asset_idx = asset_idx
+
+    def as_dict(self) -> dict:
+        state = {
+            'TOTAL_LIQUIDITY_TOKENS': self.total_liquidity_tokens,
+            'ALGOS_BALANCE': self.algos_balance,
+            'TOKENS_BALANCE': self.tokens_balance,
+            'CREATOR_ADDR': self.creator_addr,
+            'ASSET_IDX': self.asset_idx,
+        }
+        if self.escrow_addr is not None:
+            state['ESCROW_ADDR'] = self.escrow_addr
+        return state
+
+
+class AccountState:
+    """
+    Local state of a single opted in account.
+    """
+    __slots__ = (
+        'algos_to_withdraw',
+        'tokens_to_withdraw',
+        'user_liquidity_tokens',
+    )
+
+    def __init__(self):
+        self.algos_to_withdraw = 0
+        self.tokens_to_withdraw = 0
+        self.user_liquidity_tokens = 0
+
+    def as_dict(self) -> dict:
+        return {
+            'ALGOS_TO_WITHDRAW': self.algos_to_withdraw,
+            'TOKENS_TO_WITHDRAW': self.tokens_to_withdraw,
+            'USER_LIQUIDITY_TOKENS': self.user_liquidity_tokens,
+        }
+
+
+class Pool:
+    """
+    Offline replica of a single ASASwap application.
+
+    Methods are named after the branches of `state()` and take the same
+    amounts that the corresponding transaction group would carry.
+    Each call either applies all of its state changes or raises
+    `TransactionRejected` and leaves the state untouched.
+    """
+
+    def __init__(self, ratio_decimal_points: int, fee_pct: int):
+        self.ratio_decimal_points = ratio_decimal_points
+        self.fee_pct = fee_pct
+        self.state = None
+        self.accounts = {}
+
+    def _local(self, user: str) -> AccountState:
+        try:
+            return self.accounts[user]
+        except KeyError:
+            raise TransactionRejected(f'{user} has not opted in to the application')
+
+    def _global(self) -> PoolState:
+        _assert(self.state is not None, 'application does not exist')
+        return self.state
+
+    def _exchange_rate(self, algos_balance: int, tokens_balance: int) -> int:
+        # exchange rate, always as ASA:ALGOS and in ratio_decimal_points precision
+        return _div(_mul(algos_balance, self.ratio_decimal_points), tokens_balance)
+
+    def global_state(self) -> dict:
+        return self._global().as_dict()
+
+    def local_state(self, user: str) -> dict:
+        return self._local(user).as_dict()
+
+    def create(self, creator: str, asset_index: int):
+        _assert(self.state is None, 'application already exists')
+        self.state = PoolState(creator, _uint64(asset_index))
+
+    def update(self, sender: str, escrow_addr: str):
+        state = self._global()
+        _assert(sender == state.creator_addr, 'only the creator can set the escrow')
+        state.escrow_addr = escrow_addr
+
+    def opt_in(self, user: str):
+        self._global()
+        self.accounts[user] = AccountState()
+
+    def close_out(self, user: str):
+        local = self._local(user)
+        _assert(
+            local.tokens_to_withdraw == 0
+            and local.algos_to_withdraw == 0
+            and local.user_liquidity_tokens == 0,
+            'account still holds liquidity or funds to withdraw'
+        )
+        del self.accounts[user]
+
+    def clear(self, user: str):
+        local = self._local(user)
+        state = self._global()
+        # The account is opted out even if the clear program fails
+        del self.accounts[user]
+        try:
+            total = _sub(state.total_liquidity_tokens, local.user_liquidity_tokens)
+            algos = _add(state.algos_balance, local.algos_to_withdraw)
+            tokens = _add(state.tokens_balance, local.tokens_to_withdraw)
+        except TransactionRejected:
+            return
+        state.total_liquidity_tokens = total
+        state.algos_balance = algos
+        state.tokens_balance = tokens
+
+    def add_liquidity(self, user: str, asset_amount: int, algos_amount: int, asset_index: int = None):
+        state = self._global()
+        local = self._local(user)
+        asset_amount = _uint64(asset_amount)
+        algos_amount = _uint64(algos_amount)
+        rdp = self.ratio_decimal_points
+        _assert(asset_index is None or asset_index == state.asset_idx, 'wrong asset')
+
+        if state.tokens_balance != 0 and state.algos_balance != 0:
+            # Check if transactions exchange rate matches or is less than 1% different from current
+            exchange_rate = self._exchange_rate(state.algos_balance, state.tokens_balance)
+            tx_ratio = _div(_mul(algos_amount, rdp), asset_amount)
+            if exchange_rate >= tx_ratio:
+                difference = exchange_rate - tx_ratio
+            else:
+                difference = tx_ratio - exchange_rate
+            _assert(_mul(difference, 100) < exchange_rate, 'ratio differs by more than 1%')
+
+        if state.total_liquidity_tokens == 0:
+            user_liquidity_tokens = algos_amount
+            total_liquidity_tokens = algos_amount
+        else:
+            liquidity_calc = _div(_mul(algos_amount, state.total_liquidity_tokens), state.algos_balance)
+            user_liquidity_tokens = _add(local.user_liquidity_tokens, liquidity_calc)
+            total_liquidity_tokens = _add(state.total_liquidity_tokens, liquidity_calc)
+        tokens_balance = _add(state.tokens_balance, asset_amount)
+        algos_balance = _add(state.algos_balance, algos_amount)
+
+        local.user_liquidity_tokens = user_liquidity_tokens
+        state.total_liquidity_tokens = total_liquidity_tokens
+        state.tokens_balance = tokens_balance
+        state.algos_balance = algos_balance
+
+    def remove_liquidity(self, user: str, amount: int):
+        state = self._global()
+        local = self._local(user)
+        amount = _uint64(amount)
+        _assert(
+            local.user_liquidity_tokens >= amount
+            and local.algos_to_withdraw == 0
+            and local.tokens_to_withdraw == 0,
+            'not enough liquidity tokens or pending withdrawal'
+        )
+        algos_to_withdraw = _div(_mul(state.algos_balance, amount), state.total_liquidity_tokens)
+        tokens_to_withdraw = _div(_mul(state.tokens_balance, amount), state.total_liquidity_tokens)
+        total_liquidity_tokens = _sub(state.total_liquidity_tokens, amount)
+        algos_balance = _sub(state.algos_balance, algos_to_withdraw)
+        tokens_balance = _sub(state.tokens_balance, tokens_to_withdraw)
+
+        local.algos_to_withdraw = algos_to_withdraw
+        local.tokens_to_withdraw = tokens_to_withdraw
+        local.user_liquidity_tokens -= amount
+        state.total_liquidity_tokens = total_liquidity_tokens
+        state.algos_balance = algos_balance
+        state.tokens_balance = tokens_balance
+
+    def _swap_out(self, state: PoolState, amount: int, asset_index: int = None) -> tuple:
+        # Balances after the deposit and the output the pool owes for it
+        amount_in = _div(_mul(amount, 100 - self.fee_pct), 100)
+        if asset_index:
+            _assert(asset_index == state.asset_idx, 'wrong asset')
+            algos_out = _constant_product(state.tokens_balance, state.algos_balance, amount_in)
+            return state.algos_balance, _add(state.tokens_balance, amount), algos_out
+
+        tokens_out = _constant_product(state.algos_balance, state.tokens_balance, amount_in)
+        return _add(state.algos_balance, amount), state.tokens_balance, tokens_out
+
+    def swap(self, user: str, amount: int, asset_index: int = None):
+        """
+        Swap Algos for ASA tokens, or ASA tokens for Algos when `asset_index`
+        is given, the same way `swap_call` selects the transfer type.
+        """
+        state = self._global()
+        local = self._local(user)
+        amount = _uint64(amount)
+        _assert(
+            local.algos_to_withdraw == 0 and local.tokens_to_withdraw == 0,
+            'pending withdrawal'
+        )
+
+        algos_balance, tokens_balance, out = self._swap_out(state, amount, asset_index)
+        if asset_index:
+            algos_balance = _sub(algos_balance, out)
+            local.algos_to_withdraw = out
+        else:
+            tokens_balance = _sub(tokens_balance, out)
+            local.tokens_to_withdraw = out
+        state.algos_balance = algos_balance
+        state.tokens_balance = tokens_balance
+
+    def swap_settle(self, user: str, amount: int, payout: int, asset_index: int = None, fee: int = WITHDRAW_FEE):
+        """
+        Swap with the escrow paying `payout` out in the same group, see `swap_settle_call`.
+
+        The account does not have to be opted in and its pending withdrawal is
+        left alone. The escrow transaction fee is taken out of ALGOS_BALANCE.
+        """
+        state = self._global()
+        amount = _uint64(amount)
+        payout = _uint64(payout)
+        _assert(fee <= WITHDRAW_FEE, 'escrow fee above the minimum')
+
+        algos_balance, tokens_balance, out = self._swap_out(state, amount, asset_index)
+        _assert(payout <= out, 'payout exceeds the swap output')
+        if asset_index:
+            algos_balance = _sub(algos_balance, _add(payout, fee))
+        else:
+            algos_balance = _sub(algos_balance, fee)
+            tokens_balance = _sub(tokens_balance, payout)
+        state.algos_balance = algos_balance
+        state.tokens_balance = tokens_balance
+
+    def withdraw(self, user: str, asset_amount: int, algos_amount: int, asset_index: int = None):
+        state = self._global()
+        local = self._local(user)
+        _assert(
+            asset_amount == local.tokens_to_withdraw
+            and algos_amount == local.algos_to_withdraw
+            and (asset_index is None or asset_index == state.asset_idx),
+            'withdraw amounts do not match'
+        )
+        # Remove 1000 Algos that is taken as a fee
+        algos_balance = _sub(state.algos_balance, WITHDRAW_FEE)
+
+        local.tokens_to_withdraw = 0
+        local.algos_to_withdraw = 0
+        state.algos_balance = algos_balance
@@ -0,0 +1,288 @@
+"""
+Size and opcode cost profile of the contract programs.
+
+Compiles `state()`, `clear()` and `escrow()` with profiling markers around
+every `Named` sub-expression, deploys them on an in-process ledger and runs
+one group per call path: every method, both swap directions, the first and
+later ADD_LIQUIDITY, WITHDRAW of either or both. The cost of each executed
+instruction goes to the innermost name around it, and what is outside any
+name goes to `(dispatch)`. Run with:
+
+    python -m contracts.profile            # print the report
+    python -m contracts.profile --check    # fail if a program is over a limit, or a hot branch got more expensive
+    python -m contracts.profile --update   # write the current costs to contracts/costs.json
+"""
+import os
+import re
+import sys
+import json
+import argparse
+from collections import Counter, namedtuple
+
+from pyteal import compileTeal, Mode
+
+from contracts import teal
+from contracts.state import Named, MARKER_BEGIN, MARKER_END
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'costs.json')
+OUTSIDE = '(dispatch)'
+_MARKER = re.compile(rf'^({MARKER_BEGIN}|{MARKER_END})(.+)_\d+:$')
+
+ProgramSize = namedtuple('ProgramSize', ['bytes', 'ops', 'limit', 'cost', 'budget'])
+BranchCost = namedtuple('BranchCost', ['program', 'cost', 'budget', 'names'])
+
+
+def compile_marked(expr, mode) -> tuple:
+    """
+    Assemble `expr` and return the program with the name each instruction belongs to.
+    """
+    Named.markers = True
+    try:
+        source = compileTeal(expr, mode)
+    finally:
+        Named.markers = False
+
+    owners, names = [], []
+    for line in source.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        marker = _MARKER.match(line)
+        if marker:
+            if marker.group(1) == MARKER_BEGIN:
+                names.append(marker.group(2))
+            else:
+                names.pop()
+        elif not line.endswith(':'):
+            owners.append(names[-1] if names else OUTSIDE)
+
+    program = teal.assemble(source)
+    _, instructions = teal.disassemble(program)
+    # Constant blocks come first and have no source line
+    header = sum(instruction.name in ('intcblock', 'bytecblock') for instruction in instructions[:2])
+    if len(instructions) - header != len(owners):
+        raise teal.TealError('instructions do not line up with the source')
+    return program, [OUTSIDE] * header + owners
+
+
+class Profiler:
+    """
+    Runs each call path of a freshly deployed pool and attributes its cost.
+    """
+    def __init__(self, ratio_decimal_points: int = 1000000, fee_pct: int = 3):
+        from contracts.asaswap import state, clear
+
+        self.ratio_decimal_points = ratio_decimal_points
+        self.fee_pct = fee_pct
+        self.approval, self.approval_owners = compile_marked(state(ratio_decimal_points, fee_pct), Mode.Application)
+        self.clear, self.clear_owners = compile_marked(clear(), Mode.Application)
+        self.escrow = self.escrow_owners = None
+        self.branches = {}
+        self._branch = None
+        self._group = {}
+
+    def sizes(self) -> dict:
+        def size(program, limit, budget):
+            ops = len(teal.disassemble(program)[1])
+            return ProgramSize(len(program), ops, limit, teal.program_cost(program), budget)
+
+        sizes = {
+            'approval': size(self.approval, teal.MAX_APP_PROGRAM_LEN, teal.MAX_APP_COST),
+            'clear': size(self.clear, teal.MAX_APP_PROGRAM_LEN, teal.MAX_APP_COST),
+        }
+        if self.escrow is not None:
+            sizes['escrow'] = size(self.escrow, teal.MAX_LOGIC_SIG_LEN, teal.MAX_LOGIC_SIG_COST)
+        return sizes
+
+    def _trace(self, program, ctx, trace):
+        if self._branch is None:
+            return
+        if program == self.approval:
+            name, owners, budget = 'approval', self.approval_owners, teal.MAX_APP_COST
+        elif program == self.clear:
+            name, owners, budget = 'clear', self.clear_owners, teal.MAX_APP_COST
+        elif program == self.escrow:
+            name, owners, budget = 'escrow', self.escrow_owners, teal.MAX_LOGIC_SIG_COST
+        else:
+            return
+        instructions, _ = teal._decode(program)
+        names = Counter()
+        for i in trace:
+            names[owners[i]] += instructions[i].cost
+        key = self._branch if name == 'approval' else f'{self._branch} [{name}]'
+        # Escrow transactions of the same group add up
+        previous = self._group.get(key)
+        if previous is not None:
+            names.update(previous.names)
+        self._group[key] = BranchCost(name, sum(names.values()), budget, dict(names))
+
+    def _run(self, branch: str, send):
+        from transactions.utils import wait_for_confirmation
+
+        self._branch, self._group = branch, {}
+        try:
+            confirmed = wait_for_confirmation(self.client, send())
+        finally:
+            self._branch = None
+        self.branches.update(self._group)
+        return confirmed
+
+    def run(self) -> dict:
+        """
+        Profile every call path and return the BranchCost of each.
+        """
+        from algosdk import account
+        from algosdk.future import transaction
+        from contracts.asaswap import escrow
+        from transactions import main
+        from transactions.local import LocalClient
+        from transactions.utils import int_to_bytes, wait_for_confirmation
+
+        client = self.client = LocalClient()
+        client.ledger.tracer = self._trace
+        priv_key, user = account.generate_account()
+        other_priv_key, other = account.generate_account()
+        client.ledger.fund(user, 10 ** 12)
+        client.ledger.fund(other, 10 ** 7)
+        sp = client.suggested_params()
+
+        def send(txns, signers):
+            if len(txns) > 1:
+                main.assign_group_id(txns)
+            return client.send_transactions(main.sign_group(txns, signers))
+
+        asset_index = wait_for_confirmation(
+            client, main.create_asset(client, user, priv_key, sp, 10 ** 15, 6)
+        )['asset-index']
+        app_id = self._run('create', lambda: send([transaction.ApplicationCreateTxn(
+            user, sp, transaction.OnComplete.NoOpOC.real, self.approval, self.clear,
+            transaction.StateSchema(num_byte_slices=2, num_uints=4),
+            transaction.StateSchema(num_byte_slices=0, num_uints=3),
+            app_args=[int_to_bytes(asset_index)],
+        )], [priv_key]))['application-index']
+
+        self.escrow, self.escrow_owners = compile_marked(escrow(app_id), Mode.Signature)
+        lsig = transaction.LogicSig(self.escrow)
+        escrow_addr = lsig.address()
+        wait_for_confirmation(client, main.fund_account(client, user, priv_key, sp, escrow_addr, 10 ** 6))
+        self._run('escrow opt-in', lambda: main.escrow_opt_in_to_asset(client, sp, escrow_addr, asset_index, lsig))
+        self._run('UPDATE', lambda: main.add_escrow(client, user, priv_key, sp, app_id, escrow_addr))
+        self._run('OptIn', lambda: main.opt_in_to_app(client, user, priv_key, sp, app_id))
+
+        def add_liquidity(asset_amount, algos_amount):
+            return lambda: main.add_liquidity_call(
+                client, user, priv_key, sp, app_id, escrow_addr, asset_amount, algos_amount, asset_index
+            )
+
+        def withdraw():
+            state = main.read_local_state(client, user, app_id)
+            return main.withdraw_call(
+                client, user, priv_key, sp, app_id, escrow_addr, asset_index,
+                state['ALGOS_TO_WITHDRAW'], state['TOKENS_TO_WITHDRAW'], lsig,
+            )
+
+        self._run('ADD_LIQUIDITY first', add_liquidity(4000000, 1000000))
+        self._run('ADD_LIQUIDITY', add_liquidity(2000000, 500000))
+        self._run('SWAP algos in', lambda: main.swap_call(client, user, priv_key, sp, app_id, 10000, escrow_addr))
+        self._run('WITHDRAW tokens', withdraw)
+        self._run('SWAP tokens in', lambda: main.swap_call(
+            client, user, priv_key, sp, app_id, 10, escrow_addr, asset_index
+        ))
+        self._run('WITHDRAW algos', withdraw)
+        self._run('REMOVE_LIQUIDITY', lambda: main.remove_liquidity_call(client, user, priv_key, sp, app_id, 1000))
+        self._run('WITHDRAW algos and tokens', withdraw)
+        self._run('SWAP settle algos in', lambda: main.swap_settle_call(
+            client, user, priv_key, sp, app_id, 10000, 1, escrow_addr, asset_index, lsig=lsig
+        ))
+        self._run('SWAP settle tokens in', lambda: main.swap_settle_call(
+            client, user, priv_key, sp, app_id, 10, 1, escrow_addr, asset_index, asset_in=True, lsig=lsig
+        ))
+
+        wait_for_confirmation(client, main.opt_in_to_app(client, other, other_priv_key, sp, app_id))
+        self._run('CloseOut', lambda: main.close_out(client, other, other_priv_key, sp, app_id))
+        # Fresh params, the same opt-in would be a duplicate transaction
+        sp = client.suggested_params()
+        wait_for_confirmation(client, main.opt_in_to_app(client, other, other_priv_key, sp, app_id))
+        self._run('ClearState', lambda: send(
+            [transaction.ApplicationClearStateTxn(other, sp, app_id)], [other_priv_key]
+        ))
+        return self.branches
+
+
+def hot_branches(branches: dict) -> list:
+    """
+    Approval branches of the methods called most, see METHOD_FREQUENCIES.
+    """
+    from contracts.asaswap import METHOD_FREQUENCIES
+
+    top = max(METHOD_FREQUENCIES.values())
+    hot = [method for method, frequency in METHOD_FREQUENCIES.items() if frequency * 2 >= top]
+    return [name for name in branches if name.split(' ')[0] in hot]
+
+
+def report(sizes: dict, branches: dict) -> str:
+    lines = [f'{"program":<12}{"bytes":>8}{"limit":>8}{"ops":>8}{"cost":>8}{"budget":>8}']
+    for name, size in sizes.items():
+        lines.append(f'{name:<12}{size.bytes:>8}{size.limit:>8}{size.ops:>8}{size.cost:>8}{size.budget:>8}')
+    lines.append('')
+    lines.append(f'{"branch":<36}{"cost":>6}{"budget":>8}  by name')
+    for name, branch in branches.items():
+        names = ', '.join(f'{owner} {cost}' for owner, cost in sorted(branch.names.items(), key=lambda item: -item[1]))
+        lines.append(f'{name:<36}{branch.cost:>6}{branch.budget:>8}  {names}')
+    return '\n'.join(lines)
+
+
+def baseline(sizes: dict, branches: dict) -> dict:
+    return {
+        'sizes': {name: size.bytes for name, size in sizes.items()},
+        'costs': {name: branch.cost for name, branch in branches.items()},
+    }
+
+
+def regressions(sizes: dict, branches: dict, expected: dict) -> list:
+    """
+    Hot branches that cost more than in `expected`, and programs over their size or static cost limit.
+    """
+    problems = []
+    for name, size in sizes.items():
+        if size.bytes > size.limit:
+            problems.append(f'{name} is {size.bytes} bytes, over the limit of {size.limit}')
+        if size.cost > size.budget:
+            problems.append(f'{name} has a static cost of {size.cost}, over the limit of {size.budget}')
+    for name in hot_branches(branches):
+        before = expected['costs'].get(name)
+        if before is not None and branches[name].cost > before:
+            problems.append(f'{name} costs {branches[name].cost}, up from {before}')
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m contracts.profile', description=__doc__.split('\n\n')[0])
+    parser.add_argument(
+        '--check', action='store_true',
+        help='exit non-zero when a program is over a limit or a hot branch got more expensive',
+    )
+    parser.add_argument('--update', action='store_true', help=f'write the current costs to {BASELINE_PATH}')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    args = parser.parse_args(argv)
+
+    profiler = Profiler()
+    branches = profiler.run()
+    sizes = profiler.sizes()
+    print(report(sizes, branches))
+
+    if args.update:
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline(sizes, branches), f, indent=2)
+            f.write('\n')
+    if args.check:
+        with open(args.baseline) as f:
+            problems = regressions(sizes, branches, json.load(f))
+        for problem in problems:
+            print(problem, file=sys.stderr)
+        if problems:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
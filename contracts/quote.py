@@ -0,0 +1,204 @@
+"""
+Vectorized quoting for swaps and liquidity operations.
+
+Every function mirrors the uint64 arithmetic of the matching branch in
+contracts/asaswap.py element-wise. Lanes where the contract would reject
+the group (overflow, underflow, division by zero or a failed assert) are
+reported as invalid and their outputs are set to zero.
+"""
+from collections import namedtuple
+
+import numpy as np
+
+SwapQuote = namedtuple('SwapQuote', ['amount_out', 'algos_balance', 'tokens_balance', 'valid'])
+AddLiquidityQuote = namedtuple('AddLiquidityQuote', [
+    'liquidity_tokens', 'algos_balance', 'tokens_balance', 'total_liquidity_tokens', 'valid',
+])
+RemoveLiquidityQuote = namedtuple('RemoveLiquidityQuote', [
+    'algos_amount', 'tokens_amount', 'algos_balance', 'tokens_balance', 'total_liquidity_tokens', 'valid',
+])
+
+_ZERO = np.uint64(0)
+_ONE = np.uint64(1)
+
+
+def _uint64(value) -> np.ndarray:
+    return np.asarray(value, dtype=np.uint64)
+
+
+def _add(a, b, ok):
+    c = a + b
+    ok = ok & (c >= a)
+    return np.where(ok, c, _ZERO), ok
+
+
+def _sub(a, b, ok):
+    ok = ok & (a >= b)
+    return np.where(ok, a - b, _ZERO), ok
+
+
+def _mul(a, b, ok):
+    c = a * b
+    ok = ok & ((a == 0) | (c // np.where(a == 0, _ONE, a) == b))
+    return np.where(ok, c, _ZERO), ok
+
+
+def _div(a, b, ok):
+    ok = ok & (b != 0)
+    return np.where(ok, a // np.where(b == 0, _ONE, b), _ZERO), ok
+
+
+def _mod(a, b, ok):
+    ok = ok & (b != 0)
+    return np.where(ok, a % np.where(b == 0, _ONE, b), _ZERO), ok
+
+
+def _constant_product(reserve_in, reserve_out, amount_in, ok):
+    # reserve_out * amount_in / (reserve_in + amount_in), split the way the contract does
+    total, ok = _add(reserve_in, amount_in, ok)
+    quotient, ok = _div(reserve_out, total, ok)
+    quotient, ok = _mul(quotient, amount_in, ok)
+    remainder, ok = _mod(reserve_out, total, ok)
+    remainder, ok = _mul(remainder, amount_in, ok)
+    remainder, ok = _div(remainder, total, ok)
+    return _add(quotient, remainder, ok)
+
+
+def _exchange_rate(algos_balance, tokens_balance, ratio_decimal_points, ok):
+    rate, ok = _mul(algos_balance, ratio_decimal_points, ok)
+    return _div(rate, tokens_balance, ok)
+
+
+def quote_swap(
+    amounts,
+    asset_in,
+    algos_balance,
+    tokens_balance,
+    ratio_decimal_points: int,
+    fee_pct: int,
+) -> SwapQuote:
+    """
+    Quote swaps of `amounts` against pool snapshots.
+
+    `asset_in` is true for lanes that send ASA tokens and receive Algos,
+    false for lanes that send Algos and receive ASA tokens.
+    All arguments broadcast against each other. Swaps are priced on the
+    reserves alone, `ratio_decimal_points` only matters for liquidity.
+    """
+    amounts, algos_balance, tokens_balance = np.broadcast_arrays(
+        _uint64(amounts), _uint64(algos_balance), _uint64(tokens_balance)
+    )
+    asset_in = np.broadcast_to(np.asarray(asset_in, dtype=bool), amounts.shape)
+    ok = np.ones(amounts.shape, dtype=bool)
+    fee = np.uint64(100 - fee_pct)
+    hundred = np.uint64(100)
+
+    amount_in, ok = _mul(amounts, fee, ok)
+    amount_in, ok = _div(amount_in, hundred, ok)
+
+    # ASA tokens in, Algos out
+    algos_out, asset_ok = _constant_product(tokens_balance, algos_balance, amount_in, ok)
+    asset_tokens, asset_ok = _add(tokens_balance, amounts, asset_ok)
+    asset_algos, asset_ok = _sub(algos_balance, algos_out, asset_ok)
+
+    # Algos in, ASA tokens out
+    tokens_out, algo_ok = _constant_product(algos_balance, tokens_balance, amount_in, ok)
+    algo_algos, algo_ok = _add(algos_balance, amounts, algo_ok)
+    algo_tokens, algo_ok = _sub(tokens_balance, tokens_out, algo_ok)
+
+    valid = np.where(asset_in, asset_ok, algo_ok)
+    return SwapQuote(
+        amount_out=np.where(valid, np.where(asset_in, algos_out, tokens_out), _ZERO),
+        algos_balance=np.where(valid, np.where(asset_in, asset_algos, algo_algos), algos_balance),
+        tokens_balance=np.where(valid, np.where(asset_in, asset_tokens, algo_tokens), tokens_balance),
+        valid=valid,
+    )
+
+
+def quote_add_liquidity(
+    asset_amounts,
+    algos_amounts,
+    algos_balance,
+    tokens_balance,
+    total_liquidity_tokens,
+    ratio_decimal_points: int,
+) -> AddLiquidityQuote:
+    """
+    Quote liquidity tokens minted for deposits of `asset_amounts` and
+    `algos_amounts`, including the 1% ratio tolerance check.
+    """
+    asset_amounts, algos_amounts, algos_balance, tokens_balance, total_liquidity_tokens = np.broadcast_arrays(
+        _uint64(asset_amounts),
+        _uint64(algos_amounts),
+        _uint64(algos_balance),
+        _uint64(tokens_balance),
+        _uint64(total_liquidity_tokens),
+    )
+    ok = np.ones(asset_amounts.shape, dtype=bool)
+    rdp = np.uint64(ratio_decimal_points)
+    hundred = np.uint64(100)
+
+    # Check if transactions exchange rate matches or is less than 1% different from current
+    checked = (tokens_balance != 0) & (algos_balance != 0)
+    rate, check_ok = _exchange_rate(algos_balance, tokens_balance, rdp, ok)
+    tx_ratio, check_ok = _mul(algos_amounts, rdp, check_ok)
+    tx_ratio, check_ok = _div(tx_ratio, asset_amounts, check_ok)
+    difference = np.where(rate >= tx_ratio, rate - tx_ratio, tx_ratio - rate)
+    difference, check_ok = _mul(difference, hundred, check_ok)
+    check_ok = check_ok & (difference < rate)
+    ok = ok & (~checked | check_ok)
+
+    first = total_liquidity_tokens == 0
+    liquidity_calc, calc_ok = _mul(algos_amounts, total_liquidity_tokens, ok)
+    liquidity_calc, calc_ok = _div(liquidity_calc, algos_balance, calc_ok)
+    total, calc_ok = _add(total_liquidity_tokens, liquidity_calc, calc_ok)
+    ok = np.where(first, ok, calc_ok)
+    liquidity_tokens = np.where(first, algos_amounts, liquidity_calc)
+    total = np.where(first, algos_amounts, total)
+
+    new_tokens, ok = _add(tokens_balance, asset_amounts, ok)
+    new_algos, ok = _add(algos_balance, algos_amounts, ok)
+    return AddLiquidityQuote(
+        liquidity_tokens=np.where(ok, liquidity_tokens, _ZERO),
+        algos_balance=np.where(ok, new_algos, algos_balance),
+        tokens_balance=np.where(ok, new_tokens, tokens_balance),
+        total_liquidity_tokens=np.where(ok, total, total_liquidity_tokens),
+        valid=ok,
+    )
+
+
+def quote_remove_liquidity(
+    amounts,
+    algos_balance,
+    tokens_balance,
+    total_liquidity_tokens,
+) -> RemoveLiquidityQuote:
+    """
+    Quote Algos and ASA tokens credited for burning `amounts` liquidity tokens.
+
+    The per-account checks of on_remove_liquidity (enough liquidity tokens,
+    no pending withdrawal) depend on local state and are left to the caller.
+    """
+    amounts, algos_balance, tokens_balance, total_liquidity_tokens = np.broadcast_arrays(
+        _uint64(amounts),
+        _uint64(algos_balance),
+        _uint64(tokens_balance),
+        _uint64(total_liquidity_tokens),
+    )
+    ok = np.ones(amounts.shape, dtype=bool)
+
+    algos_amount, ok = _mul(algos_balance, amounts, ok)
+    algos_amount, ok = _div(algos_amount, total_liquidity_tokens, ok)
+    tokens_amount, ok = _mul(tokens_balance, amounts, ok)
+    tokens_amount, ok = _div(tokens_amount, total_liquidity_tokens, ok)
+    total, ok = _sub(total_liquidity_tokens, amounts, ok)
+    new_algos, ok = _sub(algos_balance, algos_amount, ok)
+    new_tokens, ok = _sub(tokens_balance, tokens_amount, ok)
+    return RemoveLiquidityQuote(
+        algos_amount=np.where(ok, algos_amount, _ZERO),
+        tokens_amount=np.where(ok, tokens_amount, _ZERO),
+        algos_balance=np.where(ok, new_algos, algos_balance),
+        tokens_balance=np.where(ok, new_tokens, tokens_balance),
+        total_liquidity_tokens=np.where(ok, total, total_liquidity_tokens),
+        valid=ok,
+    )
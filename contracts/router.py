@@ -0,0 +1,121 @@
+from collections import namedtuple
+
+from pyteal import *
+from pyteal.util import new_label
+
+from .state import Named
+
+Route = namedtuple('Route', ['method', 'handler', 'frequency'])
+
+
+class Dispatch(Cond):
+    """
+    Cond whose branches all end the program.
+
+    Cond jumps past the remaining branches after each one, which is dead
+    code when every branch ends in `return` or `err`, so it is left out.
+    """
+    def __teal__(self):
+        checks = []
+        bodies = []
+        for condition, branch in self.args:
+            label = new_label()
+            checks += condition.__teal__() + [TealOp(Op.bnz, label)]
+            body = branch.__teal__()
+            ops = [op for op in body if isinstance(op, TealOp)]
+            if not ops or ops[-1].op not in (Op.return_, Op.err):
+                raise TealInputError('Dispatch branches must end in Return or Err: {}'.format(branch))
+            bodies += [TealLabel(label)] + body
+        return checks + [TealOp(Op.err)] + bodies
+
+
+def router(
+    routes,
+    on_create: Expr,
+    on_opt_in: Expr = None,
+    on_close_out: Expr = None,
+    on_update: Expr = None,
+    on_delete: Expr = None,
+    ordered: bool = True,
+) -> Dispatch:
+    """
+    Dispatch application calls to their handlers.
+
+    TEAL v2 has neither a switch nor backward jumps, so a dispatcher is a
+    chain of compare-and-branch checks that costs 4 ops per method passed.
+    Methods are tried in order of expected call frequency, and a single
+    OnCompletion check steers the rare non-NoOp calls away from them.
+    Update and Delete are rejected unless handlers are given for them.
+    """
+    branches = [[Not(Txn.application_id()), Named('create', on_create)]]
+
+    on_completion = [
+        [Txn.on_completion() == on_complete, Named(name, handler)] for on_complete, name, handler in (
+            (OnComplete.OptIn, 'OptIn', on_opt_in),
+            (OnComplete.CloseOut, 'CloseOut', on_close_out),
+            (OnComplete.UpdateApplication, 'UpdateApplication', on_update),
+            (OnComplete.DeleteApplication, 'DeleteApplication', on_delete),
+        ) if handler is not None
+    ]
+    # NoOp is 0, anything else goes to the OnCompletion handlers
+    branches.append([Txn.on_completion(), Dispatch(*on_completion) if on_completion else Return(Int(0))])
+
+    if ordered:
+        routes = sorted(routes, key=lambda route: -route.frequency)
+    for route in routes:
+        branches.append([Txn.application_args[0] == Bytes(route.method), Named(route.method, route.handler)])
+    return Dispatch(*branches)
+
+
+def dispatch_costs(frequencies: dict, ordered: bool = True) -> dict:
+    """
+    Ops each call spends in the dispatcher before reaching its handler.
+    """
+    from algosdk.future import transaction
+    from contracts.teal import EvalContext, assemble, evaluate
+
+    stub = Return(Int(1))
+    routes = [Route(method, stub, frequency) for method, frequency in frequencies.items()]
+    program = assemble(compileTeal(
+        router(routes, on_create=stub, on_opt_in=stub, on_close_out=stub, ordered=ordered),
+        Mode.Application,
+    ))
+
+    sp = transaction.SuggestedParams(1000, 1, 1000, 'A' * 44, flat_fee=True)
+    sender = 'A' * 58
+    calls = {'create': transaction.ApplicationCallTxn(sender, sp, 0, transaction.OnComplete.NoOpOC)}
+    on_completes = (('OptIn', transaction.OnComplete.OptInOC), ('CloseOut', transaction.OnComplete.CloseOutOC))
+    for name, on_complete in on_completes:
+        calls[name] = transaction.ApplicationCallTxn(sender, sp, 1, on_complete)
+    for method in frequencies:
+        calls[method] = transaction.ApplicationCallTxn(
+            sender, sp, 1, transaction.OnComplete.NoOpOC, app_args=[method.encode('utf-8')]
+        )
+
+    stub_cost = 2
+    return {
+        name: evaluate(program, EvalContext([txn], 0), application=True) - stub_cost
+        for name, txn in calls.items()
+    }
+
+
+def report(frequencies: dict) -> str:
+    """
+    Table of per-method dispatch cost, declaration order against frequency order.
+    """
+    declared = dispatch_costs(frequencies, ordered=False)
+    ordered = dispatch_costs(frequencies)
+    lines = [f'{"method":<20}{"frequency":>10}{"declared":>10}{"ordered":>10}']
+    for name in ordered:
+        lines.append(f'{name:<20}{frequencies.get(name, 0):>10}{declared[name]:>10}{ordered[name]:>10}')
+
+    total = sum(frequencies.values()) or 1
+    for label, costs in (('declared', declared), ('ordered', ordered)):
+        weighted = sum(costs[method] * frequency for method, frequency in frequencies.items()) / total
+        lines.append(f'weighted average ({label}): {weighted:.2f} ops')
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    from contracts.asaswap import METHOD_FREQUENCIES
+    print(report(METHOD_FREQUENCIES))
@@ -1,12 +1,89 @@
+import itertools
+
 from pyteal import *
 
 
+class Store(Expr):
+    """
+    Evaluate `value` and store it in `slot`.
+    """
+    def __init__(self, slot: ScratchSlot, value: Expr):
+        self.slot = slot
+        self.value = value
+
+    def __teal__(self):
+        return self.value.__teal__() + [TealOp(Op.store, self.slot)]
+
+    def __str__(self):
+        return '(Store {} {})'.format(self.slot, self.value)
+
+    def type_of(self):
+        return TealType.none
+
+
+class Named(Expr):
+    """
+    Sub-expression with a name the cost profiler attributes its ops to.
+
+    Compiles to `expr` unchanged unless `Named.markers` is set, then its ops
+    are enclosed in labels, which the assembler drops from the bytecode.
+    """
+    markers = False
+    _count = itertools.count()
+
+    def __init__(self, name: str, expr: Expr):
+        self.name = name
+        self.expr = expr
+
+    def __teal__(self):
+        ops = self.expr.__teal__()
+        if not Named.markers:
+            return ops
+        n = next(Named._count)
+        return [TealLabel(f'{MARKER_BEGIN}{self.name}_{n}')] + ops + [TealLabel(f'{MARKER_END}{self.name}_{n}')]
+
+    def __str__(self):
+        return '(Named {} {})'.format(self.name, self.expr)
+
+    def type_of(self):
+        return self.expr.type_of()
+
+
+MARKER_BEGIN = 'profile_begin_'
+MARKER_END = 'profile_end_'
+
+
+class Cached:
+    """
+    Expression evaluated once into a scratch slot and then loaded from it.
+
+    `store()` has to run before the first `load()` of the branch.
+    """
+    def __init__(self, expr: Expr, type: TealType = TealType.uint64):
+        self._expr = expr
+        self._type = type
+        self._slot = ScratchSlot()
+
+    def store(self) -> Expr:
+        return Store(self._slot, self._expr)
+
+    def load(self) -> ScratchLoad:
+        return self._slot.load(self._type)
+
+
 class State:
     """
     Wrapper around state vars.
+
+    Besides direct `get()`/`put()`, every var owns a scratch slot: `load()`
+    reads the var into it once per branch, `cached()` serves later reads
+    from it, `stage()` writes to it only and `commit()` writes the staged
+    value back to the state. Reads through `cached()` see staged writes.
     """
-    def __init__(self, name: str):
+    def __init__(self, name: str, type: TealType = TealType.uint64):
         self._name = name
+        self._slot = ScratchSlot()
+        self._type = type
 
     def put(self, value) -> App:
         raise NotImplementedError
@@ -14,6 +91,18 @@ class State:
     def get(self) -> App:
         raise NotImplementedError
 
+    def load(self) -> Expr:
+        return Store(self._slot, self.get())
+
+    def cached(self) -> ScratchLoad:
+        return self._slot.load(self._type)
+
+    def stage(self, value) -> Expr:
+        return Store(self._slot, value)
+
+    def commit(self) -> App:
+        return self.put(self.cached())
+
 
 class LocalState(State):
     def put(self, value) -> App:
@@ -29,3 +118,11 @@ class GlobalState(State):
 
     def get(self) -> App:
         return App.globalGet(Bytes(self._name))
+
+
+def load(*states: State) -> Seq:
+    return Seq([state.load() for state in states])
+
+
+def commit(*states: State) -> Seq:
+    return Seq([state.commit() for state in states])
@@ -0,0 +1,774 @@
+"""
+Assembler and evaluator for TEAL version 2.
+
+Covers the opcodes PyTeal emits for contracts/asaswap.py so the programs can
+be assembled and executed offline, with the same byte layout as algod's
+assembler and the same cost accounting as the AVM.
+"""
+import os
+import re
+import json
+import base64
+from collections import namedtuple
+
+import algosdk
+from algosdk import encoding
+
+MAX_VERSION = 2
+UINT64_MAX = (1 << 64) - 1
+ZERO_ADDRESS = bytes(32)
+
+# Cost budgets and program size limits of TEAL version 2
+MAX_APP_COST = 700
+MAX_LOGIC_SIG_COST = 20000
+MAX_APP_PROGRAM_LEN = 1024
+MAX_LOGIC_SIG_LEN = 1000
+MAX_STACK_DEPTH = 1000
+SCRATCH_SIZE = 256
+
+TYPE_ENUMS = {'unknown': 0, 'pay': 1, 'keyreg': 2, 'acfg': 3, 'axfer': 4, 'afrz': 5, 'appl': 6}
+ON_COMPLETIONS = {
+    'NoOp': 0,
+    'OptIn': 1,
+    'CloseOut': 2,
+    'ClearState': 3,
+    'UpdateApplication': 4,
+    'DeleteApplication': 5,
+}
+NAMED_INTS = dict(TYPE_ENUMS, **ON_COMPLETIONS)
+
+BRANCH_OPS = ('bnz', 'bz', 'b')
+
+Instruction = namedtuple('Instruction', ['pc', 'name', 'immediates', 'cost', 'line'])
+
+
+class TealError(Exception):
+    """
+    Raised when a program fails to assemble or rejects during evaluation.
+    """
+
+
+def _load_spec():
+    with open(os.path.join(os.path.dirname(algosdk.__file__), 'data', 'langspec.json')) as f:
+        return json.load(f)
+
+
+_spec = _load_spec()
+OPS = {op['Name']: op for op in _spec['Ops']}
+OPS_BY_CODE = {op['Opcode']: op for op in _spec['Ops']}
+TXN_FIELDS = OPS['txn']['ArgEnum']
+TXNA_FIELDS = OPS['txna']['ArgEnum']
+GLOBAL_FIELDS = OPS['global']['ArgEnum'] + ['CurrentApplicationID']
+ASSET_HOLDING_FIELDS = OPS['asset_holding_get']['ArgEnum']
+ASSET_PARAMS_FIELDS = OPS['asset_params_get']['ArgEnum']
+# TEAL v2 names for opcodes the bundled spec still lists under their old names
+OPS.setdefault('addw', OPS.get('plusw'))
+
+
+def encode_uvarint(value: int) -> bytes:
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def decode_uvarint(program: bytes, pc: int):
+    value = shift = 0
+    while True:
+        if pc >= len(program):
+            raise TealError('truncated varuint')
+        b = program[pc]
+        value |= (b & 0x7F) << shift
+        pc += 1
+        if b < 0x80:
+            return value, pc
+        shift += 7
+
+
+def _tokenize(line: str):
+    tokens = []
+    for match in re.finditer(r'"(?:[^"\\]|\\.)*"|//.*|\S+', line):
+        token = match.group(0)
+        if token.startswith('//'):
+            break
+        tokens.append(token)
+    return tokens
+
+
+def _parse_string(token: str) -> bytes:
+    out = bytearray()
+    body = token[1:-1].encode('utf-8')
+    i = 0
+    escapes = {ord('n'): 10, ord('r'): 13, ord('t'): 9, ord('"'): 34, ord('\\'): 92}
+    while i < len(body):
+        c = body[i]
+        if c == 92:
+            i += 1
+            if body[i] == ord('x'):
+                out.append(int(body[i + 1:i + 3], 16))
+                i += 3
+                continue
+            out.append(escapes[body[i]])
+        else:
+            out.append(c)
+        i += 1
+    return bytes(out)
+
+
+def parse_bytes(args) -> bytes:
+    if len(args) == 1:
+        value = args[0]
+        if value.startswith('"'):
+            return _parse_string(value)
+        if value.startswith('0x'):
+            return bytes.fromhex(value[2:])
+        for prefix in ('base64(', 'b64('):
+            if value.startswith(prefix) and value.endswith(')'):
+                return base64.b64decode(value[len(prefix):-1])
+        for prefix in ('base32(', 'b32('):
+            if value.startswith(prefix) and value.endswith(')'):
+                return base64.b32decode(value[len(prefix):-1] + '=' * (-len(value[len(prefix):-1]) % 8))
+    if len(args) == 2 and args[0] in ('base64', 'b64'):
+        return base64.b64decode(args[1])
+    if len(args) == 2 and args[0] in ('base32', 'b32'):
+        return base64.b32decode(args[1] + '=' * (-len(args[1]) % 8))
+    raise TealError(f'cannot parse byte literal {" ".join(args)}')
+
+
+def parse_int(value: str) -> int:
+    if value in NAMED_INTS:
+        return NAMED_INTS[value]
+    try:
+        number = int(value, 0)
+    except ValueError:
+        raise TealError(f'cannot parse int {value}')
+    if not 0 <= number <= UINT64_MAX:
+        raise TealError(f'int {value} does not fit in uint64')
+    return number
+
+
+def _field_index(fields, name: str) -> int:
+    try:
+        return fields.index(name)
+    except ValueError:
+        raise TealError(f'unknown field {name}')
+
+
+def assemble(source: str) -> bytes:
+    """
+    Assemble TEAL source into bytecode laid out like algod's assembler does:
+    constants in intcblock/bytecblock in order of first use, branches as
+    relative forward offsets.
+    """
+    version = 1
+    ints = []
+    byte_constants = []
+    code = []
+    labels = {}
+
+    for line in source.splitlines():
+        line = line.strip()
+        if line.startswith('#pragma'):
+            parts = line.split()
+            if len(parts) == 3 and parts[1] == 'version':
+                version = int(parts[2])
+                if version > MAX_VERSION:
+                    raise TealError(f'unsupported version {version}')
+            continue
+        tokens = _tokenize(line)
+        if not tokens:
+            continue
+        if tokens[0].endswith(':') and len(tokens) == 1:
+            labels[tokens[0][:-1]] = len(code)
+            continue
+
+        name, args = tokens[0], tokens[1:]
+        if name == 'int':
+            value = parse_int(args[0])
+            if value not in ints:
+                ints.append(value)
+            code.append(('intc', ints.index(value)))
+        elif name in ('byte', 'addr'):
+            value = encoding.decode_address(args[0]) if name == 'addr' else parse_bytes(args)
+            if value not in byte_constants:
+                byte_constants.append(value)
+            code.append(('bytec', byte_constants.index(value)))
+        elif name in BRANCH_OPS:
+            code.append((name, args[0]))
+        elif name in ('txn', 'global', 'gtxn', 'txna', 'gtxna', 'asset_holding_get', 'asset_params_get'):
+            code.append((name, args))
+        elif name in ('load', 'store', 'arg', 'substring', 'intc', 'bytec'):
+            code.append((name, [int(arg) for arg in args]))
+        elif name in OPS and OPS[name]['Size'] == 1:
+            code.append((name, None))
+        else:
+            raise TealError(f'unsupported instruction {line}')
+
+    def encode(item, pc, offsets):
+        name, args = item
+        if name == 'intc':
+            return bytes([OPS[f'intc_{args}']['Opcode']]) if args < 4 else bytes([OPS['intc']['Opcode'], args])
+        if name == 'bytec':
+            return bytes([OPS[f'bytec_{args}']['Opcode']]) if args < 4 else bytes([OPS['bytec']['Opcode'], args])
+        if name in BRANCH_OPS:
+            if offsets is None:
+                return bytes(3)
+            if args not in labels:
+                raise TealError(f'reference to undefined label {args}')
+            offset = offsets[labels[args]] - (pc + 3)
+            if offset < 0:
+                raise TealError(f'label {args} is before reference but only forward jumps are allowed')
+            return bytes([OPS[name]['Opcode']]) + offset.to_bytes(2, 'big')
+        opcode = OPS[name]['Opcode']
+        if name == 'txn':
+            return bytes([opcode, _field_index(TXN_FIELDS, args[0])])
+        if name == 'global':
+            return bytes([opcode, _field_index(GLOBAL_FIELDS, args[0])])
+        if name == 'gtxn':
+            return bytes([opcode, int(args[0]), _field_index(TXN_FIELDS, args[1])])
+        if name == 'txna':
+            return bytes([opcode, _field_index(TXNA_FIELDS, args[0]), int(args[1])])
+        if name == 'gtxna':
+            return bytes([opcode, int(args[0]), _field_index(TXNA_FIELDS, args[1]), int(args[2])])
+        if name == 'asset_holding_get':
+            return bytes([opcode, _field_index(ASSET_HOLDING_FIELDS, args[0])])
+        if name == 'asset_params_get':
+            return bytes([opcode, _field_index(ASSET_PARAMS_FIELDS, args[0])])
+        if args is None:
+            return bytes([opcode])
+        return bytes([opcode] + args)
+
+    header = encode_uvarint(version)
+    if ints:
+        header += bytes([OPS['intcblock']['Opcode']]) + encode_uvarint(len(ints))
+        header += b''.join(encode_uvarint(value) for value in ints)
+    if byte_constants:
+        header += bytes([OPS['bytecblock']['Opcode']]) + encode_uvarint(len(byte_constants))
+        header += b''.join(encode_uvarint(len(value)) + value for value in byte_constants)
+
+    # Every instruction has a fixed size, so label offsets are known after one sizing pass
+    offsets = []
+    pc = len(header)
+    for item in code:
+        offsets.append(pc)
+        pc += len(encode(item, pc, None))
+    offsets.append(pc)
+
+    body = b''.join(encode(item, offsets[i], offsets) for i, item in enumerate(code))
+    return header + body
+
+
+def disassemble(program: bytes):
+    """
+    Decode bytecode into instructions, resolving constant blocks and branch targets.
+    """
+    version, pc = decode_uvarint(program, 0)
+    if version > MAX_VERSION:
+        raise TealError(f'unsupported version {version}')
+    instructions = []
+    while pc < len(program):
+        op = OPS_BY_CODE.get(program[pc])
+        if op is None:
+            raise TealError(f'invalid opcode {program[pc]:#x} at pc={pc}')
+        name = op['Name']
+        start = pc
+        if name == 'intcblock':
+            count, pc = decode_uvarint(program, pc + 1)
+            values = []
+            for _ in range(count):
+                value, pc = decode_uvarint(program, pc)
+                values.append(value)
+            immediates = values
+        elif name == 'bytecblock':
+            count, pc = decode_uvarint(program, pc + 1)
+            values = []
+            for _ in range(count):
+                length, pc = decode_uvarint(program, pc)
+                values.append(program[pc:pc + length])
+                pc += length
+            immediates = values
+        else:
+            size = op['Size']
+            if start + size > len(program):
+                raise TealError(f'{name} at pc={pc} runs past the end of the program')
+            immediates = list(program[start + 1:start + size])
+            if name in BRANCH_OPS:
+                immediates = [start + size + int.from_bytes(program[start + 1:start + 3], 'big')]
+            pc = start + size
+        instructions.append(Instruction(start, name, immediates, op['Cost'], len(instructions)))
+    return version, instructions
+
+
+def program_cost(program: bytes) -> int:
+    """
+    Static cost of every instruction in the program, as checked for LogicSigs.
+    """
+    return sum(instruction.cost for instruction in disassemble(program)[1])
+
+
+def check_cost(program: bytes, application: bool = False):
+    """
+    Raise TealError when the static cost is over the limit, which is what algod checks before TEAL v4.
+    """
+    cost = _costs.get(program)
+    if cost is None:
+        cost = program_cost(program)
+        if len(_costs) > 256:
+            _costs.clear()
+        _costs[program] = cost
+    limit = MAX_APP_COST if application else MAX_LOGIC_SIG_COST
+    if cost > limit:
+        raise TealError(f'program cost {cost} is over the limit of {limit}')
+
+
+_costs = {}
+
+
+_decoded = {}
+
+
+def _decode(program: bytes):
+    decoded = _decoded.get(program)
+    if decoded is None:
+        _, instructions = disassemble(program)
+        index = {instruction.pc: i for i, instruction in enumerate(instructions)}
+        index[len(program)] = len(instructions)
+        decoded = instructions, index
+        if len(_decoded) > 256:
+            _decoded.clear()
+        _decoded[program] = decoded
+    return decoded
+
+
+def _address(address) -> bytes:
+    return encoding.decode_address(address) if address else ZERO_ADDRESS
+
+
+def txn_field(txn, group_index: int, field: str, array_index: int = None):
+    """
+    Value of a transaction field as seen by `txn`/`gtxn`/`txna`/`gtxna`.
+    """
+    kind = txn.type
+    if field == 'Sender':
+        return _address(txn.sender)
+    if field == 'Fee':
+        return txn.fee
+    if field == 'FirstValid':
+        return txn.first_valid_round or 0
+    if field == 'LastValid':
+        return txn.last_valid_round
+    if field == 'Note':
+        return txn.note or b''
+    if field == 'Lease':
+        return txn.lease or bytes(32)
+    if field == 'Type':
+        return kind.encode()
+    if field == 'TypeEnum':
+        return TYPE_ENUMS.get(kind, 0)
+    if field == 'GroupIndex':
+        return group_index
+    if field == 'TxID':
+        return txn.get_txid().encode()
+    if field == 'RekeyTo':
+        return _address(txn.rekey_to)
+    if field == 'Receiver':
+        return _address(txn.receiver) if kind == 'pay' else ZERO_ADDRESS
+    if field == 'Amount':
+        return txn.amt if kind == 'pay' else 0
+    if field == 'CloseRemainderTo':
+        return _address(txn.close_remainder_to) if kind == 'pay' else ZERO_ADDRESS
+    if field == 'XferAsset':
+        return txn.index if kind == 'axfer' else 0
+    if field == 'AssetAmount':
+        return txn.amount if kind == 'axfer' else 0
+    if field == 'AssetSender':
+        return _address(txn.revocation_target) if kind == 'axfer' else ZERO_ADDRESS
+    if field == 'AssetReceiver':
+        return _address(txn.receiver) if kind == 'axfer' else ZERO_ADDRESS
+    if field == 'AssetCloseTo':
+        return _address(txn.close_assets_to) if kind == 'axfer' else ZERO_ADDRESS
+    if kind == 'appl':
+        if field == 'ApplicationID':
+            return txn.index or 0
+        if field == 'OnCompletion':
+            return int(txn.on_complete or 0)
+        if field == 'NumAppArgs':
+            return len(txn.app_args or [])
+        if field == 'ApplicationArgs':
+            args = txn.app_args or []
+            if array_index >= len(args):
+                raise TealError(f'invalid ApplicationArgs index {array_index}')
+            return args[array_index]
+        if field == 'NumAccounts':
+            return len(txn.accounts or [])
+        if field == 'Accounts':
+            # Accounts 0 is always the sender, foreign accounts start at 1
+            accounts = [txn.sender] + list(txn.accounts or [])
+            if array_index >= len(accounts):
+                raise TealError(f'invalid Accounts index {array_index}')
+            return encoding.decode_address(accounts[array_index])
+        if field == 'ApprovalProgram':
+            return txn.approval_program or b''
+        if field == 'ClearStateProgram':
+            return txn.clear_program or b''
+    elif field in ('ApplicationID', 'OnCompletion', 'NumAppArgs', 'NumAccounts'):
+        return 0
+    elif field in ('ApprovalProgram', 'ClearStateProgram'):
+        return b''
+    if kind == 'acfg' and field.startswith('ConfigAsset'):
+        values = {
+            'ConfigAsset': txn.index or 0,
+            'ConfigAssetTotal': txn.total or 0,
+            'ConfigAssetDecimals': txn.decimals or 0,
+            'ConfigAssetDefaultFrozen': int(bool(txn.default_frozen)),
+            'ConfigAssetUnitName': (txn.unit_name or '').encode(),
+            'ConfigAssetName': (txn.asset_name or '').encode(),
+            'ConfigAssetURL': (txn.url or '').encode(),
+            'ConfigAssetMetadataHash': txn.metadata_hash or b'',
+            'ConfigAssetManager': _address(txn.manager),
+            'ConfigAssetReserve': _address(txn.reserve),
+            'ConfigAssetFreeze': _address(txn.freeze),
+            'ConfigAssetClawback': _address(txn.clawback),
+        }
+        return values[field]
+    if field in TXN_FIELDS:
+        index = TXN_FIELDS.index(field)
+        return 0 if OPS['txn']['ArgEnumTypes'][index] == 'U' else b''
+    raise TealError(f'unsupported field {field}')
+
+
+class EvalContext:
+    """
+    Everything a program can observe besides its own stack and scratch space.
+
+    `ledger` is only needed in application mode and must provide the
+    app_* and asset_* accessors used by the state opcodes.
+    """
+    def __init__(
+        self,
+        group,
+        group_index: int,
+        ledger=None,
+        app_id: int = 0,
+        args=None,
+        round_num: int = 0,
+        timestamp: int = 0,
+    ):
+        self.group = group
+        self.group_index = group_index
+        self.ledger = ledger
+        self.app_id = app_id
+        self.args = args or []
+        self.round_num = round_num
+        self.timestamp = timestamp
+
+    @property
+    def txn(self):
+        return self.group[self.group_index]
+
+    def account(self, index: int) -> str:
+        accounts = [self.txn.sender] + list(getattr(self.txn, 'accounts', None) or [])
+        if index >= len(accounts):
+            raise TealError(f'invalid account index {index}')
+        return accounts[index]
+
+    def global_field(self, field: str):
+        if field == 'MinTxnFee':
+            return 1000
+        if field == 'MinBalance':
+            return 100000
+        if field == 'MaxTxnLife':
+            return 1000
+        if field == 'ZeroAddress':
+            return ZERO_ADDRESS
+        if field == 'GroupSize':
+            return len(self.group)
+        if field == 'LogicSigVersion':
+            return MAX_VERSION
+        if field == 'Round':
+            return self.round_num
+        if field == 'LatestTimestamp':
+            return self.timestamp
+        if field == 'CurrentApplicationID':
+            return self.app_id
+        raise TealError(f'unsupported global {field}')
+
+
+def _int(value):
+    if not isinstance(value, int):
+        raise TealError('expected uint64 but got []byte')
+    return value
+
+
+def _bytes(value):
+    if not isinstance(value, bytes):
+        raise TealError('expected []byte but got uint64')
+    return value
+
+
+def evaluate(
+    program: bytes, ctx: EvalContext, application: bool = False, max_cost: int = None, trace: list = None
+) -> int:
+    """
+    Run `program` and return its cost. Raises TealError if it rejects.
+
+    When `trace` is given the index of every executed instruction is appended to it.
+    """
+    if max_cost is None:
+        check_cost(program, application)
+        max_cost = MAX_APP_COST if application else MAX_LOGIC_SIG_COST
+    instructions, index = _decode(program)
+    stack = []
+    push = stack.append
+    pop = stack.pop
+    scratch = [0] * SCRATCH_SIZE
+    intc = []
+    bytec = []
+    cost = 0
+    i = 0
+    count = len(instructions)
+
+    while i < count:
+        instruction = instructions[i]
+        name = instruction.name
+        if trace is not None:
+            trace.append(i)
+        cost += instruction.cost
+        if cost > max_cost:
+            raise TealError(f'program cost exceeds {max_cost}')
+        i += 1
+        try:
+            if name.startswith('intc_'):
+                push(intc[int(name[5])])
+            elif name.startswith('bytec_'):
+                push(bytec[int(name[6])])
+            elif name == 'app_global_get':
+                key = _bytes(pop())
+                push(ctx.ledger.app_global_get(ctx.app_id, key))
+            elif name == 'app_local_get':
+                key = _bytes(pop())
+                account = ctx.account(_int(pop()))
+                push(ctx.ledger.app_local_get(account, ctx.app_id, key))
+            elif name == 'app_global_put':
+                value = pop()
+                ctx.ledger.app_global_put(ctx.app_id, _bytes(pop()), value)
+            elif name == 'app_local_put':
+                value = pop()
+                key = _bytes(pop())
+                ctx.ledger.app_local_put(ctx.account(_int(pop())), ctx.app_id, key, value)
+            elif name == '==':
+                b, a = pop(), pop()
+                if type(a) is not type(b):
+                    raise TealError('cannot compare uint64 to []byte')
+                push(int(a == b))
+            elif name == '!=':
+                b, a = pop(), pop()
+                if type(a) is not type(b):
+                    raise TealError('cannot compare uint64 to []byte')
+                push(int(a != b))
+            elif name in ('txn', 'gtxn', 'txna', 'gtxna'):
+                imm = instruction.immediates
+                if name == 'txn':
+                    gi, field, array_index = ctx.group_index, TXN_FIELDS[imm[0]], None
+                elif name == 'gtxn':
+                    gi, field, array_index = imm[0], TXN_FIELDS[imm[1]], None
+                elif name == 'txna':
+                    gi, field, array_index = ctx.group_index, TXNA_FIELDS[imm[0]], imm[1]
+                else:
+                    gi, field, array_index = imm[0], TXNA_FIELDS[imm[1]], imm[2]
+                if gi >= len(ctx.group):
+                    raise TealError(f'gtxn lookup TxnGroup[{gi}] but it only has {len(ctx.group)}')
+                push(txn_field(ctx.group[gi], gi, field, array_index))
+            elif name == 'bnz':
+                if _int(pop()) != 0:
+                    i = index[instruction.immediates[0]]
+            elif name == 'bz':
+                if _int(pop()) == 0:
+                    i = index[instruction.immediates[0]]
+            elif name == 'b':
+                i = index[instruction.immediates[0]]
+            elif name == '&&':
+                b, a = _int(pop()), _int(pop())
+                push(int(a != 0 and b != 0))
+            elif name == '||':
+                b, a = _int(pop()), _int(pop())
+                push(int(a != 0 or b != 0))
+            elif name == '!':
+                push(int(_int(pop()) == 0))
+            elif name == '+':
+                b, a = _int(pop()), _int(pop())
+                if a + b > UINT64_MAX:
+                    raise TealError('+ overflowed')
+                push(a + b)
+            elif name == '-':
+                b, a = _int(pop()), _int(pop())
+                if b > a:
+                    raise TealError('- would result negative')
+                push(a - b)
+            elif name == '*':
+                b, a = _int(pop()), _int(pop())
+                if a * b > UINT64_MAX:
+                    raise TealError('* overflowed')
+                push(a * b)
+            elif name == '/':
+                b, a = _int(pop()), _int(pop())
+                if b == 0:
+                    raise TealError('/ 0')
+                push(a // b)
+            elif name == '%':
+                b, a = _int(pop()), _int(pop())
+                if b == 0:
+                    raise TealError('% 0')
+                push(a % b)
+            elif name == '<':
+                b, a = _int(pop()), _int(pop())
+                push(int(a < b))
+            elif name == '>':
+                b, a = _int(pop()), _int(pop())
+                push(int(a > b))
+            elif name == '<=':
+                b, a = _int(pop()), _int(pop())
+                push(int(a <= b))
+            elif name == '>=':
+                b, a = _int(pop()), _int(pop())
+                push(int(a >= b))
+            elif name == '|':
+                b, a = _int(pop()), _int(pop())
+                push(a | b)
+            elif name == '&':
+                b, a = _int(pop()), _int(pop())
+                push(a & b)
+            elif name == '^':
+                b, a = _int(pop()), _int(pop())
+                push(a ^ b)
+            elif name == '~':
+                push(UINT64_MAX ^ _int(pop()))
+            elif name == 'mulw':
+                b, a = _int(pop()), _int(pop())
+                product = a * b
+                push(product >> 64)
+                push(product & UINT64_MAX)
+            elif name in ('plusw', 'addw'):
+                b, a = _int(pop()), _int(pop())
+                total = a + b
+                push(total >> 64)
+                push(total & UINT64_MAX)
+            elif name == 'btoi':
+                value = _bytes(pop())
+                if len(value) > 8:
+                    raise TealError(f'btoi arg too long, got [{len(value)}]bytes')
+                push(int.from_bytes(value, 'big'))
+            elif name == 'itob':
+                push(_int(pop()).to_bytes(8, 'big'))
+            elif name == 'len':
+                push(len(_bytes(pop())))
+            elif name == 'concat':
+                b, a = _bytes(pop()), _bytes(pop())
+                if len(a) + len(b) > 4096:
+                    raise TealError('concat resulted in string too long')
+                push(a + b)
+            elif name == 'substring':
+                start, end = instruction.immediates
+                value = _bytes(pop())
+                if end < start or end > len(value):
+                    raise TealError('substring range beyond length of string')
+                push(value[start:end])
+            elif name == 'substring3':
+                end, start, value = _int(pop()), _int(pop()), _bytes(pop())
+                if end < start or end > len(value):
+                    raise TealError('substring range beyond length of string')
+                push(value[start:end])
+            elif name == 'intcblock':
+                intc = instruction.immediates
+            elif name == 'bytecblock':
+                bytec = instruction.immediates
+            elif name == 'intc':
+                push(intc[instruction.immediates[0]])
+            elif name == 'bytec':
+                push(bytec[instruction.immediates[0]])
+            elif name == 'arg' or name.startswith('arg_'):
+                if application:
+                    raise TealError(f'{name} not allowed in application mode')
+                n = instruction.immediates[0] if name == 'arg' else int(name[4])
+                if n >= len(ctx.args):
+                    raise TealError(f'cannot load arg[{n}] of {len(ctx.args)}')
+                push(ctx.args[n])
+            elif name == 'global':
+                push(ctx.global_field(GLOBAL_FIELDS[instruction.immediates[0]]))
+            elif name == 'load':
+                push(scratch[instruction.immediates[0]])
+            elif name == 'store':
+                scratch[instruction.immediates[0]] = pop()
+            elif name == 'pop':
+                pop()
+            elif name == 'dup':
+                push(stack[-1])
+            elif name == 'dup2':
+                push(stack[-2])
+                push(stack[-2])
+            elif name == 'err':
+                raise TealError('err opcode executed')
+            elif name == 'return':
+                result = pop()
+                stack[:] = [result]
+                break
+            elif name in ('sha256', 'keccak256', 'sha512_256'):
+                import hashlib
+                value = _bytes(pop())
+                if name == 'sha256':
+                    push(hashlib.sha256(value).digest())
+                elif name == 'sha512_256':
+                    push(encoding.checksum(value))
+                else:
+                    from Cryptodome.Hash import keccak
+                    push(keccak.new(data=value, digest_bits=256).digest())
+            elif not application:
+                raise TealError(f'{name} not allowed in signature mode')
+            elif name == 'balance':
+                push(ctx.ledger.balance(ctx.account(_int(pop()))))
+            elif name == 'app_opted_in':
+                app = _int(pop())
+                account = ctx.account(_int(pop()))
+                push(int(ctx.ledger.opted_in(account, ctx.app_id if app == 0 else app)))
+            elif name == 'app_local_get_ex':
+                key, app = _bytes(pop()), _int(pop())
+                account = ctx.account(_int(pop()))
+                value = ctx.ledger.app_local_get_ex(account, ctx.app_id if app == 0 else app, key)
+                push(0 if value is None else value)
+                push(int(value is not None))
+            elif name == 'app_global_get_ex':
+                key, app = _bytes(pop()), _int(pop())
+                value = ctx.ledger.app_global_get_ex(ctx.app_id if app == 0 else app, key)
+                push(0 if value is None else value)
+                push(int(value is not None))
+            elif name == 'app_local_del':
+                key = _bytes(pop())
+                ctx.ledger.app_local_del(ctx.account(_int(pop())), ctx.app_id, key)
+            elif name == 'app_global_del':
+                ctx.ledger.app_global_del(ctx.app_id, _bytes(pop()))
+            elif name == 'asset_holding_get':
+                asset, account = _int(pop()), ctx.account(_int(pop()))
+                value = ctx.ledger.asset_holding_get(account, asset, ASSET_HOLDING_FIELDS[instruction.immediates[0]])
+                push(0 if value is None else value)
+                push(int(value is not None))
+            elif name == 'asset_params_get':
+                asset = _int(pop())
+                value = ctx.ledger.asset_params_get(asset, ASSET_PARAMS_FIELDS[instruction.immediates[0]])
+                push(0 if value is None else value)
+                push(int(value is not None))
+            else:
+                raise TealError(f'unsupported opcode {name}')
+        except IndexError:
+            raise TealError(f'stack underflow in {name} at pc={instruction.pc}')
+        if len(stack) > MAX_STACK_DEPTH:
+            raise TealError('stack overflow')
+
+    if len(stack) != 1:
+        raise TealError(f'stack len is {len(stack)} instead of 1')
+    if not isinstance(stack[0], int):
+        raise TealError('stack finished with bytes not int')
+    if stack[0] == 0:
+        raise TealError('rejected by logic')
+    return cost
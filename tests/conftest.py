@@ -1,8 +1,41 @@
+from collections import namedtuple
+
 import pytest
+from algosdk.account import generate_account
+
+from transactions.factory import PoolFactory
+from transactions.main import create_asset
+from transactions.utils import get_client
+from transactions.local import LocalClient
+
+LocalPool = namedtuple(
+    'LocalPool', ['client', 'user', 'priv_key', 'sp', 'asset_index', 'app_id', 'escrow_addr', 'lsig']
+)
 
 
 @pytest.fixture
 def dispenser():
     dispenser_priv_key = 'eITGjcku6NHv/b+uPBrBu4R81TbS4wTrrPcATL6wVuh4TYtEwXeE0EdPLjEsF1MaB9QRhnZbU3Geeo0juIeJmA=='
     dispenser = 'PBGYWRGBO6CNAR2PFYYSYF2TDID5IEMGOZNVG4M6PKGSHOEHRGMIWR5J2I'
+    client = get_client()
+    if isinstance(client, LocalClient) and client.ledger.balance(dispenser) == 0:
+        client.ledger.fund(dispenser, 10 ** 15)
     return {'priv_key': dispenser_priv_key, 'address': dispenser}
+
+
+@pytest.fixture
+def pool():
+    """
+    Pool of a fresh asset on an in-process ledger, deployed by a funded `user` holding the whole asset.
+    """
+    client = LocalClient()
+    priv_key, user = generate_account()
+    client.ledger.fund(user, 10 ** 13)
+    sp = client.suggested_params()
+    asset_index = client.pending_transaction_info(
+        create_asset(client, user, priv_key, sp, 10 ** 15, 6)
+    )['asset-index']
+    deployed = PoolFactory(client, user, priv_key, sp).deploy([asset_index]).pools[0]
+    return LocalPool(
+        client, user, priv_key, sp, asset_index, deployed.app_id, deployed.escrow_addr, deployed.logicsig()
+    )
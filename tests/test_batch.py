@@ -0,0 +1,111 @@
+import base64
+from concurrent.futures import ProcessPoolExecutor
+
+from algosdk import encoding
+from algosdk.account import generate_account
+from algosdk.future import transaction
+
+from transactions import batch
+from transactions.batch import OnboardRequest, SwapRequest, onboard_calls, onboard_groups, swap_calls, sign_groups
+from transactions.local import LocalClient
+from transactions.main import create_app, create_asset, swap_group, sign_group
+from transactions.reader import StateReader
+from transactions.utils import wait_for_confirmation
+
+PARAMS = transaction.SuggestedParams(0, 1, 1001, base64.b64encode(bytes(32)).decode(), 'sandnet-v1')
+
+
+class StubClient:
+    def __init__(self):
+        self.sent = []
+
+    def send_transactions(self, signed_txns):
+        self.sent.append(signed_txns)
+        if signed_txns[1].transaction.amt == 0:
+            raise ValueError('rejected')
+        return signed_txns[0].transaction.get_txid()
+
+
+def _requests(n):
+    accounts = [generate_account() for _ in range(4)]
+    return [SwapRequest(accounts[i % 4][1], accounts[i % 4][0], i) for i in range(n)]
+
+
+def test_sign_groups_in_parallel_matches_sequential(monkeypatch):
+    monkeypatch.setattr(batch, 'PARALLEL_SIGNING_THRESHOLD', 0)
+    requests = _requests(20)
+    groups = [swap_group(r.user, PARAMS, 1, r.amount + 1, r.user) for r in requests]
+    signers = [[r.user_priv_key] * 2 for r in requests]
+
+    with ProcessPoolExecutor(2) as executor:
+        signed = sign_groups(groups, signers, executor)
+
+    expected = [sign_group(txns, keys) for txns, keys in zip(groups, signers)]
+    assert [[encoding.msgpack_encode(t) for t in g] for g in signed] == \
+        [[encoding.msgpack_encode(t) for t in g] for g in expected]
+
+
+def test_swap_calls_send_every_group():
+    client = StubClient()
+    requests = _requests(5)
+
+    results = swap_calls(client, PARAMS, 1, requests[0].user, requests)
+
+    assert len(client.sent) == 5
+    assert isinstance(results[0], ValueError)
+    sent = sorted(client.sent, key=lambda group: group[1].transaction.amt)
+    for group, result in zip(sent[1:], results[1:]):
+        assert group[0].transaction.group == group[1].transaction.group
+        assert result == group[0].transaction.get_txid()
+
+
+def test_onboard_groups_keep_accounts_together():
+    funder_priv_key, funder = generate_account()
+    requests = [OnboardRequest(address, priv_key, 500000) for priv_key, address in _accounts(11)]
+    groups, signers, members = onboard_groups(funder, funder_priv_key, PARAMS, requests, app_id=1, asset_index=2)
+
+    # 5 accounts of 3 transactions fill a group of 15, the last account gets a group of its own
+    assert [len(group) for group in groups] == [15, 15, 3]
+    assert members == [[0, 1, 2, 3, 4], [5, 6, 7, 8, 9], [10]]
+    assert [txn.type for txn in groups[0][:3]] == ['pay', 'axfer', 'appl']
+    assert signers[2] == [funder_priv_key, requests[10].user_priv_key, requests[10].user_priv_key]
+    assert len({txn.group for txn in groups[1]}) == 1
+
+    # Accounts that are funded already only opt in, a single transaction needs no group
+    groups, _, _ = onboard_groups(funder, funder_priv_key, PARAMS, [requests[0]._replace(algos_amount=0)], app_id=1)
+    assert len(groups) == 1 and groups[0][0].group is None and groups[0][0].type == 'appl'
+
+
+def _accounts(n):
+    return [generate_account() for _ in range(n)]
+
+
+def test_onboard_calls_fund_and_opt_in():
+    client = LocalClient()
+    funder_priv_key, funder = generate_account()
+    client.ledger.fund(funder, 10 ** 12)
+    sp = client.suggested_params()
+    asset_index = wait_for_confirmation(
+        client, create_asset(client, funder, funder_priv_key, sp, 10 ** 9, 0)
+    )['asset-index']
+    app_id = wait_for_confirmation(client, create_app(client, funder, funder_priv_key, sp, asset_index))[
+        'application-index'
+    ]
+
+    accounts = _accounts(12)
+    requests = [OnboardRequest(address, priv_key, 1000000) for priv_key, address in accounts]
+    # Too little to hold the asset and the local state, only this account's group is rejected
+    requests[11] = requests[11]._replace(algos_amount=100000)
+    tx_ids = onboard_calls(client, sp, funder, funder_priv_key, requests, app_id, asset_index)
+
+    assert len(set(tx_ids[:10])) == 2
+    assert isinstance(tx_ids[10], Exception) and tx_ids[11] is tx_ids[10]
+    for tx_id in set(tx_ids[:10]):
+        wait_for_confirmation(client, tx_id)
+    reader = StateReader(client, app_id)
+    for _, address in accounts[:10]:
+        assert reader.fetch_local_state(address) == {
+            'ALGOS_TO_WITHDRAW': 0, 'TOKENS_TO_WITHDRAW': 0, 'USER_LIQUIDITY_TOKENS': 0,
+        }
+        assert client.account_info(address)['assets'][0]['asset-id'] == asset_index
+    assert client.ledger.balance(accounts[10][1]) == 0
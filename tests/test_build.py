@@ -0,0 +1,57 @@
+import os
+
+import pytest
+
+from contracts import teal
+from contracts.asaswap import build_app
+from contracts.build import Variant, build_variants, program_key
+
+
+def test_build_variants_is_incremental(tmp_path):
+    directory = str(tmp_path)
+    variants = [Variant(fee_pct=fee_pct) for fee_pct in (1, 3, 5)]
+
+    results = build_variants(variants + [Variant(fee_pct=1)], directory, max_workers=2)
+    assert [result.variant for result in results] == variants
+    assert all(result.built for result in results)
+    assert len({result.app_path for result in results}) == 3
+    assert len({result.escrow_path for result in results}) == 1
+    for result in results:
+        assert sorted(os.listdir(result.app_path)) == ['clear.teal', 'manifest.json', 'state.teal']
+        assert sorted(os.listdir(result.escrow_path)) == ['escrow.teal', 'manifest.json']
+    # Pool workers build several variants each, yet write the same files as `make contracts`
+    for name in ('state.teal', 'clear.teal'):
+        with open(os.path.join(results[1].app_path, name)) as f, open(f'./contracts/{name}') as g:
+            assert f.read() == g.read()
+    with open(os.path.join(results[0].app_path, 'state.teal')) as f:
+        with open(os.path.join(results[2].app_path, 'state.teal')) as g:
+            assert f.read() != g.read()
+
+    # Only the escrow of the new app id is compiled
+    again = build_variants(variants + [Variant(app_id=456)], directory)
+    assert [result.built for result in again] == [False, False, False, True]
+    assert again[3].app_path == results[1].app_path
+    assert len(os.listdir(directory)) == 5
+
+    # Any change of the sources moves every program to a new key
+    assert program_key('app', {}, 'a') != program_key('app', {}, 'b')
+
+
+def test_build_does_not_depend_on_earlier_compiles(tmp_path):
+    # One process compiles both, the default comes second
+    results = build_variants([Variant(fee_pct=1), Variant(fee_pct=3)], str(tmp_path), max_workers=1)
+    for name in ('state.teal', 'clear.teal'):
+        with open(os.path.join(results[1].app_path, name)) as f, open(f'./contracts/{name}') as g:
+            assert f.read() == g.read()
+
+
+def test_build_rejects_programs_over_the_size_limit(tmp_path, monkeypatch):
+    # Larger ratio_decimal_points take more bytes in the constant block
+    build_app(10 ** 18, 3, directory=str(tmp_path))
+    assert sorted(os.listdir(str(tmp_path))) == ['clear.teal', 'state.teal']
+    os.remove(str(tmp_path / 'state.teal'))
+    os.remove(str(tmp_path / 'clear.teal'))
+    monkeypatch.setattr(teal, 'MAX_APP_PROGRAM_LEN', 1000)
+    with pytest.raises(teal.TealError, match='over the limit'):
+        build_app(directory=str(tmp_path))
+    assert os.listdir(str(tmp_path)) == []
@@ -0,0 +1,46 @@
+import base64
+
+from transactions.cache import ProgramCache
+from transactions.utils import compile_program
+
+
+def test_program_cache_evicts_least_recently_used():
+    cache = ProgramCache(maxsize=2)
+    cache.put(b'a', b'\x01')
+    cache.put(b'b', b'\x02')
+    assert cache.get(b'a') == b'\x01'
+
+    cache.put(b'c', b'\x03')
+    assert cache.get(b'b') is None
+    assert cache.get(b'a') == b'\x01'
+    assert cache.get(b'c') == b'\x03'
+
+
+def test_program_cache_survives_restart(tmp_path):
+    ProgramCache(directory=str(tmp_path)).put(b'#pragma version 2', b'\x02\x20')
+
+    cache = ProgramCache(directory=str(tmp_path))
+    assert cache.get(b'#pragma version 2') == b'\x02\x20'
+    assert cache.get(b'#pragma version 3') is None
+
+
+class CountingClient:
+    def __init__(self):
+        self.compiles = 0
+
+    def compile(self, source):
+        self.compiles += 1
+        return {'result': base64.b64encode(source.encode()).decode()}
+
+
+def test_compile_program_compiles_a_source_once():
+    client = CountingClient()
+    cache = ProgramCache()
+    with open('./contracts/escrow.teal', 'rb') as f:
+        source = f.read()
+
+    program = compile_program(client, source, cache)
+    assert compile_program(client, source, cache) == program
+    assert client.compiles == 1
+    compile_program(client, b'#pragma version 2\nint 1', cache)
+    assert client.compiles == 2
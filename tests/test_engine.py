@@ -0,0 +1,114 @@
+import pytest
+
+from contracts.engine import Pool, TransactionRejected
+
+
+@pytest.fixture
+def pool():
+    pool = Pool(1000000, 3)
+    pool.create('creator', 1)
+    pool.update('creator', 'escrow')
+    pool.opt_in('user')
+    return pool
+
+
+def test_engine_matches_contract_scenario(pool):
+    pool.add_liquidity('user', 4000000, 1000000)
+    assert pool.global_state()['TOKENS_BALANCE'] == 4000000
+    assert pool.global_state()['ALGOS_BALANCE'] == 1000000
+    assert pool.global_state()['TOTAL_LIQUIDITY_TOKENS'] == 1000000
+    assert pool.local_state('user')['USER_LIQUIDITY_TOKENS'] == 1000000
+
+    pool.remove_liquidity('user', 1000)
+    assert pool.global_state()['TOKENS_BALANCE'] == 3996000
+    assert pool.global_state()['ALGOS_BALANCE'] == 999000
+    assert pool.global_state()['TOTAL_LIQUIDITY_TOKENS'] == 999000
+    assert pool.local_state('user') == {
+        'ALGOS_TO_WITHDRAW': 1000,
+        'TOKENS_TO_WITHDRAW': 4000,
+        'USER_LIQUIDITY_TOKENS': 999000,
+    }
+
+    pool.withdraw('user', 4000, 1000)
+    assert pool.global_state()['ALGOS_BALANCE'] == 998000
+    assert pool.local_state('user')['ALGOS_TO_WITHDRAW'] == 0
+    assert pool.local_state('user')['TOKENS_TO_WITHDRAW'] == 0
+
+    pool.swap('user', 1000)
+    assert pool.global_state()['TOKENS_BALANCE'] == 3992120
+    assert pool.global_state()['ALGOS_BALANCE'] == 999000
+    assert pool.local_state('user')['TOKENS_TO_WITHDRAW'] == 3880
+
+
+def test_engine_rejects_without_changing_state(pool):
+    pool.add_liquidity('user', 4000000, 1000000)
+    before = pool.global_state()
+
+    with pytest.raises(TransactionRejected):
+        # 2% off the current ratio
+        pool.add_liquidity('user', 4000000, 1020000)
+    with pytest.raises(TransactionRejected):
+        pool.withdraw('user', 1, 0)
+    with pytest.raises(TransactionRejected):
+        pool.swap('user', 1, asset_index=2)
+    with pytest.raises(TransactionRejected):
+        pool.swap('stranger', 1000)
+
+    assert pool.global_state() == before
+
+
+def test_engine_swap_settle(pool):
+    pool.add_liquidity('user', 4000000, 1000000)
+    pool.swap('user', 1000)
+    assert pool.local_state('user')['TOKENS_TO_WITHDRAW'] == 3876
+
+    with pytest.raises(TransactionRejected):
+        pool.swap_settle('stranger', 1000, 3869)
+    pool.swap_settle('stranger', 1000, 3868)
+    assert pool.global_state()['TOKENS_BALANCE'] == 3996124 - 3868
+    # The deposit minus the fee of the payout transaction
+    assert pool.global_state()['ALGOS_BALANCE'] == 1001000
+    assert pool.local_state('user')['TOKENS_TO_WITHDRAW'] == 3876
+
+
+def test_engine_swaps_along_the_curve(pool):
+    pool.add_liquidity('user', 4000000, 1000000)
+    pool.swap('user', 1000000)
+    # Trading the whole Algo reserve gets about half the tokens, not all of them at the spot rate
+    assert pool.local_state('user')['TOKENS_TO_WITHDRAW'] == 4000000 * 970000 // 1970000
+    state = pool.global_state()
+    assert state['ALGOS_BALANCE'] * state['TOKENS_BALANCE'] >= 4000000 * 1000000
+
+    pool.withdraw('user', 1969543, 0)
+    pool.swap('user', 2030457, asset_index=1)
+    assert pool.local_state('user')['ALGOS_TO_WITHDRAW'] == 1999000 * 1969543 // (2030457 + 1969543)
+
+
+def test_engine_swaps_in_deep_pools(pool):
+    # reserve * amount is past 64 bits, (reserve + amount) * amount is not
+    pool.add_liquidity('user', 4 * 10 ** 12, 10 ** 12)
+    for amount, asset_index in ((5 * 10 ** 6, None), (10 ** 7, None), (4 * 10 ** 6, 1)):
+        before = pool.global_state()
+        pool.swap('user', amount, asset_index)
+        local = pool.local_state('user')
+        amount_in = amount * 97 // 100
+        if asset_index:
+            expected = before['ALGOS_BALANCE'] * amount_in // (before['TOKENS_BALANCE'] + amount_in)
+        else:
+            expected = before['TOKENS_BALANCE'] * amount_in // (before['ALGOS_BALANCE'] + amount_in)
+        assert before['ALGOS_BALANCE'] * before['TOKENS_BALANCE'] > 2 ** 64
+        assert local['ALGOS_TO_WITHDRAW'] + local['TOKENS_TO_WITHDRAW'] == expected
+        pool.withdraw('user', local['TOKENS_TO_WITHDRAW'], local['ALGOS_TO_WITHDRAW'])
+
+
+def test_engine_closeout_and_clear(pool):
+    pool.add_liquidity('user', 4000000, 1000000)
+    with pytest.raises(TransactionRejected):
+        pool.close_out('user')
+
+    pool.remove_liquidity('user', 1000)
+    pool.clear('user')
+    assert pool.global_state()['TOTAL_LIQUIDITY_TOKENS'] == 0
+    assert pool.global_state()['ALGOS_BALANCE'] == 1000000
+    assert pool.global_state()['TOKENS_BALANCE'] == 4000000
+    assert 'user' not in pool.accounts
@@ -0,0 +1,30 @@
+import pytest
+from algosdk import logic
+
+from transactions.escrow import EscrowTemplate, TEMPLATE_APP_ID, encode_uvarint
+
+
+def _program(app_id):
+    # intcblock 1 <app_id> 6; intc_1; intc_2; ==; return
+    return (
+        bytes([2, 0x20, 3, 1]) + encode_uvarint(app_id) + bytes([6])
+        + bytes([0x23, 0x24, 0x12, 0x43])
+    )
+
+
+def test_escrow_template_matches_compiled_program():
+    template = EscrowTemplate(_program(TEMPLATE_APP_ID))
+
+    for app_id in (7, 127, 128, 16384, 2 ** 63):
+        assert template.program(app_id) == _program(app_id)
+        assert template.address(app_id) == logic.address(_program(app_id))
+        assert template.logicsig(app_id).address() == logic.address(_program(app_id))
+
+
+def test_escrow_template_rejects_colliding_app_id():
+    template = EscrowTemplate(_program(TEMPLATE_APP_ID))
+    with pytest.raises(ValueError):
+        template.program(6)
+    with pytest.raises(ValueError):
+        EscrowTemplate(_program(123))
+
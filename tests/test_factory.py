@@ -0,0 +1,58 @@
+import pytest
+from algosdk.account import generate_account
+
+from transactions.factory import PoolFactory, PoolRegistry
+from transactions.local import LocalClient
+from transactions.main import create_asset
+from transactions.reader import fetch_global_state
+
+
+@pytest.fixture
+def client():
+    return LocalClient()
+
+
+def test_factory_deploys_pools_and_persists_registry(client, tmp_path):
+    priv_key, creator = generate_account()
+    client.ledger.fund(creator, 100000000)
+    sp = client.suggested_params()
+    assets = [
+        client.pending_transaction_info(create_asset(client, creator, priv_key, sp, 1000 + i, 0))['asset-index']
+        for i in range(3)
+    ]
+
+    path = str(tmp_path / 'pools.json')
+    factory = PoolFactory(client, creator, priv_key, sp, PoolRegistry(path))
+    result = factory.deploy(assets + [assets[0]])
+    assert result.failed == {}
+    assert [pool.asset_index for pool in result.pools] == assets
+
+    for pool in result.pools:
+        state = fetch_global_state(client, pool.app_id)
+        assert state['ASSET_IDX'] == pool.asset_index
+        assert pool.logicsig().address() == pool.escrow_addr
+        assert client.account_info(pool.escrow_addr)['assets'][0]['asset-id'] == pool.asset_index
+
+    registry = PoolRegistry(path)
+    assert len(registry) == 3
+    assert registry.get(assets[1]) == result.pools[1]
+    assert registry.get_by_app(result.pools[2].app_id).asset_index == assets[2]
+
+    # Already deployed assets are skipped
+    assert factory.deploy(assets).pools == []
+
+    discovered = PoolRegistry()
+    discovered.discover(client, creator, factory.template)
+    assert sorted(discovered, key=lambda pool: pool.asset_index) == result.pools
+
+
+def test_factory_reports_failed_pools(client):
+    priv_key, creator = generate_account()
+    # Enough for the applications, not for funding their escrows
+    client.ledger.fund(creator, 1000000)
+    factory = PoolFactory(client, creator, priv_key, client.suggested_params())
+
+    result = factory.deploy([1, 2])
+    assert result.pools == []
+    assert sorted(result.failed) == [1, 2]
+    assert len(factory.registry) == 0
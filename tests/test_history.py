@@ -0,0 +1,73 @@
+import pytest
+
+np = pytest.importorskip('numpy')
+
+from transactions.history import (  # noqa: E402
+    ADD_LIQUIDITY, SWAP, WITHDRAW, HistoryRecorder, HistoryStore, sender_address,
+)
+from transactions.indexer import PoolIndexer  # noqa: E402
+from transactions.main import (  # noqa: E402
+    add_liquidity_call, opt_in_to_app, swap_call, swap_settle_call, withdraw_call,
+)
+from transactions.reader import fetch_global_state  # noqa: E402
+
+
+def test_store_range_lookups(tmp_path):
+    store = HistoryStore(str(tmp_path))
+    store.append(7, 'snapshots', {
+        'round': [3, 5, 9],
+        'algos_balance': [10, 20, 30],
+        'tokens_balance': [1, 2, 3],
+        'total_liquidity_tokens': [4, 5, 6],
+    })
+    assert store.snapshot_at(7, 2) is None
+    assert store.snapshot_at(7, 5).algos_balance == 20
+    assert store.snapshot_at(7, 8).algos_balance == 20
+    assert store.snapshot_at(7, 100).round == 9
+    assert list(store.between(7, 'snapshots', 4, 9)['tokens_balance']) == [2, 3]
+    assert isinstance(store.snapshots(7)['round'], np.memmap)
+
+    with pytest.raises(ValueError):
+        store.append(7, 'snapshots', {
+            'round': [8], 'algos_balance': [0], 'tokens_balance': [0], 'total_liquidity_tokens': [0],
+        })
+    # A torn append only counts once its round column is written
+    with open(str(tmp_path / '7' / 'snapshots' / 'algos_balance.bin'), 'ab') as f:
+        f.write(bytes(8))
+    assert len(store.snapshots(7)['round']) == 3
+    # and is dropped by the next append
+    store.append(7, 'snapshots', {
+        'round': [10], 'algos_balance': [40], 'tokens_balance': [4], 'total_liquidity_tokens': [7],
+    })
+    assert store.snapshot_at(7, 10) == (10, 40, 4, 7)
+    assert store.snapshot_at(7, 9) == (9, 30, 3, 6)
+
+
+def test_recorder_follows_indexer(pool, tmp_path):
+    client, user, priv_key, sp, asset_index, app_id, escrow_addr, lsig = pool
+
+    indexer = PoolIndexer(client, [app_id])
+    store = HistoryStore(str(tmp_path))
+    recorder = HistoryRecorder(store)
+    recorder.attach(indexer)
+
+    opt_in_to_app(client, user, priv_key, sp, app_id)
+    add_liquidity_call(client, user, priv_key, sp, app_id, escrow_addr, 4000000, 1000000, asset_index)
+    swap_call(client, user, priv_key, sp, app_id, 1000, escrow_addr)
+    withdraw_call(client, user, priv_key, sp, app_id, escrow_addr, asset_index, asset_amount=3876, lsig=lsig)
+    swap_settle_call(client, user, priv_key, sp, app_id, 1000, 3800, escrow_addr, asset_index, lsig=lsig)
+    indexer.catch_up()
+    recorder.flush()
+
+    events = store.events(app_id)
+    assert list(events['kind']) == [ADD_LIQUIDITY, SWAP, WITHDRAW, SWAP]
+    assert list(events['algos_in']) == [1000000, 1000, 0, 1000]
+    assert list(events['tokens_out']) == [0, 3876, 3876, 3800]
+    assert events['liquidity_tokens'][0] == 1000000
+    assert sender_address(events['sender'][0]) == user
+
+    state = fetch_global_state(client, app_id)
+    last = store.snapshot_at(app_id, indexer.last_round)
+    assert last.algos_balance == state['ALGOS_BALANCE']
+    assert last.tokens_balance == state['TOKENS_BALANCE']
+    assert store.snapshot_at(app_id, int(events['round'][0])).tokens_balance == 4000000
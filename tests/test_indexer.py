@@ -0,0 +1,92 @@
+import time
+
+from algosdk.account import generate_account
+
+from transactions.indexer import PoolIndexer
+from transactions.main import (
+    add_liquidity_call,
+    close_out,
+    opt_in_to_app,
+    remove_liquidity_call,
+    swap_call,
+    withdraw_call,
+)
+from transactions.reader import StateReader, fetch_global_state
+
+
+def test_indexer_replicates_pool_state(pool, tmp_path):
+    client, user, priv_key, sp, asset_index, app_id, escrow_addr, lsig = pool
+    opt_in_to_app(client, user, priv_key, sp, app_id)
+    add_liquidity_call(client, user, priv_key, sp, app_id, escrow_addr, 4000000, 1000000, asset_index)
+
+    checkpoint = str(tmp_path / 'indexer.json')
+    indexer = PoolIndexer(client, [app_id], checkpoint_path=checkpoint)
+    events = []
+    indexer.subscribe(events.append)
+    indexer.catch_up()
+    indexer.save_checkpoint()
+    assert indexer.global_state(app_id) == fetch_global_state(client, app_id)
+
+    swap_call(client, user, priv_key, sp, app_id, 1000, escrow_addr)
+
+    # A restarted indexer resumes from the checkpoint
+    restarted = PoolIndexer(client, [app_id], checkpoint_path=checkpoint)
+    assert restarted.last_round == indexer.last_round
+    restarted.catch_up()
+    reader = StateReader(client, app_id)
+    assert restarted.global_state(app_id) == fetch_global_state(client, app_id)
+    assert restarted.local_state(app_id, user) == reader.fetch_local_state(user)
+
+    for amount in (None, 500000):
+        if amount:
+            remove_liquidity_call(client, user, priv_key, sp, app_id, amount)
+            restarted.catch_up()
+        algos_amount, asset_amount = restarted.pending_withdrawals(app_id)[user]
+        withdraw_call(
+            client, user, priv_key, sp, app_id, escrow_addr, asset_index,
+            algos_amount=algos_amount, asset_amount=asset_amount, lsig=lsig,
+        )
+    other_priv_key, other = generate_account()
+    client.ledger.fund(other, 1000000)
+    opt_in_to_app(client, other, other_priv_key, sp, app_id)
+    restarted.catch_up()
+    assert restarted.local_state(app_id, other)['USER_LIQUIDITY_TOKENS'] == 0
+    close_out(client, other, other_priv_key, sp, app_id)
+    restarted.catch_up()
+    assert restarted.local_state(app_id, other) is None
+    assert restarted.local_state(app_id, user) == reader.fetch_local_state(user)
+    assert restarted.global_state(app_id) == fetch_global_state(client, app_id)
+
+    methods = [event.method for event in events]
+    assert methods == ['create', 'UPDATE', 'OptIn', 'ADD_LIQUIDITY']
+    assert [transfer.amount for transfer in events[-1].transfers] == [4000000, 1000000]
+    assert events[-1].delta['global']['ALGOS_BALANCE'] == 1000000
+    assert events[-1].delta['local'][user] == {'USER_LIQUIDITY_TOKENS': 1000000}
+
+
+def test_indexer_restarts_with_a_single_follower(pool, tmp_path):
+    client, user, priv_key, sp, asset_index, app_id, escrow_addr, lsig = pool
+    # Short long polls, so stopped followers notice quickly
+    client.wait_timeout = 0.05
+    checkpoint = str(tmp_path / 'indexer.json')
+    indexer = PoolIndexer(client, [app_id], checkpoint_path=checkpoint, block_time=1)
+    events = []
+    indexer.subscribe(events.append)
+
+    indexer.start()
+    first = indexer._thread
+    indexer.stop(timeout=0)
+    indexer.start()
+    second = indexer._thread
+    opt_in_to_app(client, user, priv_key, sp, app_id)
+    for _ in range(100):
+        if indexer.last_round == client.ledger.round:
+            break
+        time.sleep(0.01)
+    indexer.stop()
+    first.join(1)
+
+    assert not first.is_alive() and not second.is_alive()
+    # Every block was applied once
+    assert [event.method for event in events] == ['create', 'UPDATE', 'OptIn']
+    assert PoolIndexer(client, [app_id], checkpoint_path=checkpoint).last_round == client.ledger.round
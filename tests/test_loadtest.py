@@ -0,0 +1,42 @@
+import pytest
+from algosdk.account import generate_account
+
+from transactions.loadtest import LoadTest, classify_rejection, parse_mix, percentile
+from transactions.local import LocalClient
+from transactions.reader import fetch_global_state
+
+
+def test_parse_mix():
+    assert parse_mix('swap=3, add=1,remove') == {'swap': 3.0, 'add_liquidity': 1.0, 'remove_liquidity': 1.0}
+    with pytest.raises(ValueError):
+        parse_mix('swap=1,mint=2')
+    with pytest.raises(ValueError):
+        parse_mix('swap=0')
+
+
+def test_report_helpers():
+    assert percentile([], 50) is None
+    assert percentile([4, 1, 3, 2], 50) == 2
+    assert percentile([4, 1, 3, 2], 99) == 4
+    assert classify_rejection(Exception('transaction rejected by ApprovalProgram of app 3: err')) == 'approval program'
+    assert classify_rejection(Exception('txn 12 has no signer')) == 'txn N has no signer'
+
+
+def test_load_test_drives_mix():
+    client = LocalClient()
+    priv_key, funder = generate_account()
+    client.ledger.fund(funder, 10 ** 12)
+
+    load = LoadTest(client, funder, priv_key, accounts=6, mix=parse_mix('swap=2,withdraw=2,add=1,remove=1'), seed=1)
+    load.setup()
+    report = load.run(rate=40, duration=1.5)
+
+    data = report.as_dict()
+    assert sum(report.confirmed.values()) + data['rejected'] == sum(report.submitted.values())
+    assert sum(report.confirmed.values()) > 10
+    assert set(data['rejections']) <= {'approval program'}
+    assert data['latency']['p50'] <= data['latency']['p99']
+    # Each group is a block of its own on the local ledger
+    assert data['groups_per_round']['peak'] == 1
+    assert set(report.confirmed) >= {'swap', 'withdraw'}
+    assert load.indexer.global_state(load.pool.app_id) == fetch_global_state(client, load.pool.app_id)
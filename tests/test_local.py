@@ -0,0 +1,154 @@
+import pytest
+from algosdk.account import generate_account
+from algosdk.error import AlgodHTTPError
+from algosdk.future import transaction
+
+from contracts.engine import Pool
+from contracts.teal import assemble
+from transactions.local import LocalClient
+from transactions.main import (
+    add_liquidity_call, assign_group_id, create_asset, fund_account, opt_in_to_app, read_local_state, swap_call,
+    withdraw_call,
+)
+from transactions.tracker import ConfirmationTracker
+
+
+@pytest.fixture
+def client():
+    return LocalClient()
+
+
+@pytest.fixture
+def funded(client):
+    priv_key, address = generate_account()
+    client.ledger.fund(address, 10000000)
+    return priv_key, address
+
+
+def test_group_is_applied_atomically(client, funded):
+    priv_key, address = funded
+    _, receiver = generate_account()
+    sp = client.suggested_params()
+    txns = assign_group_id([
+        transaction.PaymentTxn(address, sp, receiver, 1000000),
+        transaction.PaymentTxn(address, sp, receiver, 100000000),
+    ])
+    with pytest.raises(AlgodHTTPError) as e:
+        client.send_transactions([txn.sign(priv_key) for txn in txns])
+    assert 'overspend' in str(e.value)
+    assert client.account_info(address)['amount'] == 10000000
+    assert client.account_info(receiver)['amount'] == 0
+    assert client.status()['last-round'] == 0
+
+
+def test_rejects_bad_signature_and_min_balance(client, funded):
+    priv_key, address = funded
+    other_priv_key, receiver = generate_account()
+    sp = client.suggested_params()
+    with pytest.raises(AlgodHTTPError):
+        client.send_transactions([transaction.PaymentTxn(address, sp, receiver, 200000).sign(other_priv_key)])
+    with pytest.raises(AlgodHTTPError):
+        client.send_transactions([transaction.PaymentTxn(address, sp, receiver, 1000).sign(priv_key)])
+
+    txid = fund_account(client, address, priv_key, sp, receiver, 200000)
+    assert client.pending_transaction_info(txid)['confirmed-round'] == 1
+    assert client.account_info(address)['amount'] == 10000000 - 200000 - 1000
+    with pytest.raises(AlgodHTTPError):
+        client.send_transactions([transaction.PaymentTxn(address, sp, receiver, 200000).sign(priv_key)])
+
+
+def test_blocks_resolve_tracked_transactions(client, funded):
+    priv_key, address = funded
+    txid = create_asset(client, address, priv_key, client.suggested_params(), 1000, 0)
+    assert client.pending_transaction_info(txid)['asset-index'] == 1
+
+    tracker = ConfirmationTracker(client)
+    future = tracker.track(txid)
+    tracker.fetch_block(1)
+    assert future.result(0) == 1
+
+
+def test_failing_clear_program_still_clears_account(client, funded):
+    priv_key, address = funded
+    sp = client.suggested_params()
+    approve = assemble('#pragma version 2\nint 1')
+    fail = assemble('#pragma version 2\nint 0\nbyte "X"\nint 1\napp_local_put\nint 0')
+    txid = client.send_transactions([transaction.ApplicationCreateTxn(
+        address, sp, transaction.OnComplete.OptInOC, approve, fail,
+        transaction.StateSchema(0, 0), transaction.StateSchema(1, 0),
+    ).sign(priv_key)])
+    app_id = client.pending_transaction_info(txid)['application-index']
+    assert client.account_info(address)['apps-local-state'][0]['id'] == app_id
+
+    client.send_transactions([transaction.ApplicationClearStateTxn(address, sp, app_id).sign(priv_key)])
+    assert client.account_info(address)['apps-local-state'] == []
+
+
+def test_rejects_app_over_the_static_cost_limit(client, funded):
+    priv_key, address = funded
+    sp = client.suggested_params()
+    approve = assemble('#pragma version 2\nint 1\nbnz done\n' + 'byte 0x00\nkeccak256\npop\n' * 6 + 'done:\nint 1')
+    with pytest.raises(AlgodHTTPError, match='program cost 797'):
+        client.send_transactions([transaction.ApplicationCreateTxn(
+            address, sp, transaction.OnComplete.NoOpOC, approve, assemble('#pragma version 2\nint 1'),
+            transaction.StateSchema(0, 0), transaction.StateSchema(0, 0),
+        ).sign(priv_key)])
+
+
+def test_close_out_of_empty_account(client, funded):
+    from transactions.main import close_out, create_app, opt_in_to_app
+
+    priv_key, address = funded
+    sp = client.suggested_params()
+    app_id = client.pending_transaction_info(create_app(client, address, priv_key, sp, 1))['application-index']
+    opt_in_to_app(client, address, priv_key, sp, app_id)
+    assert client.account_info(address)['apps-local-state'][0]['id'] == app_id
+
+    close_out(client, address, priv_key, sp, app_id)
+    assert client.account_info(address)['apps-local-state'] == []
+
+
+def test_escrow_opt_in_cannot_close_or_rekey(client, funded):
+    from pyteal import Mode, compileTeal
+    from contracts.asaswap import escrow
+
+    priv_key, address = funded
+    sp = client.suggested_params()
+    asset_index = client.pending_transaction_info(create_asset(client, address, priv_key, sp, 1000, 0))['asset-index']
+    lsig = transaction.LogicSig(assemble(compileTeal(escrow(123), Mode.Signature)))
+    escrow_addr = lsig.address()
+    client.ledger.fund(escrow_addr, 1000000)
+
+    for kwargs in ({'close_assets_to': address}, {'rekey_to': address}):
+        txn = transaction.AssetTransferTxn(escrow_addr, sp, escrow_addr, 0, asset_index, **kwargs)
+        with pytest.raises(AlgodHTTPError):
+            client.send_transactions([transaction.LogicSigTransaction(txn, lsig)])
+    with pytest.raises(AlgodHTTPError):
+        txn = transaction.AssetTransferTxn(escrow_addr, sp, address, 0, asset_index)
+        client.send_transactions([transaction.LogicSigTransaction(txn, lsig)])
+
+    txn = transaction.AssetTransferTxn(escrow_addr, sp, escrow_addr, 0, asset_index)
+    client.send_transactions([transaction.LogicSigTransaction(txn, lsig)])
+    assert client.account_info(escrow_addr)['assets'][0]['asset-id'] == asset_index
+
+
+def test_deep_pool_swaps_match_the_engine(pool):
+    client, user, priv_key, sp, asset_index, app_id, escrow_addr, lsig = pool
+    engine = Pool(1000000, 3)
+    engine.create('creator', asset_index)
+    engine.opt_in(user)
+    opt_in_to_app(client, user, priv_key, sp, app_id)
+    add_liquidity_call(client, user, priv_key, sp, app_id, escrow_addr, 4 * 10 ** 12, 10 ** 12, asset_index)
+    engine.add_liquidity(user, 4 * 10 ** 12, 10 ** 12)
+
+    # The reserves times the amount do not fit in 64 bits
+    for amount, swap_asset in ((5 * 10 ** 6, None), (10 ** 7, None), (4 * 10 ** 6, asset_index)):
+        swap_call(client, user, priv_key, sp, app_id, amount, escrow_addr, swap_asset)
+        engine.swap(user, amount, swap_asset)
+        state = read_local_state(client, user, app_id)
+        assert state == engine.local_state(user)
+        withdraw_call(
+            client, user, priv_key, sp, app_id, escrow_addr, asset_index,
+            state['ALGOS_TO_WITHDRAW'], state['TOKENS_TO_WITHDRAW'], lsig,
+        )
+        engine.withdraw(user, state['TOKENS_TO_WITHDRAW'], state['ALGOS_TO_WITHDRAW'])
@@ -0,0 +1,57 @@
+import pytest
+from algosdk.account import generate_account
+
+from transactions import metrics
+from transactions.cache import ProgramCache
+from transactions.local import LocalClient
+from transactions.main import create_app, create_asset, remove_liquidity_call
+from transactions.utils import wait_for_confirmation
+
+
+@pytest.fixture
+def recorded(tmp_path):
+    path = str(tmp_path / 'asaswap.prom')
+    yield metrics.enable(metrics.PrometheusTextfileSink(path)), path
+    metrics.disable()
+
+
+def test_helpers_record_phases_requests_and_rejections(recorded):
+    registry, path = recorded
+    client = LocalClient()
+    priv_key, user = generate_account()
+    client.ledger.fund(user, 10000000)
+    sp = client.suggested_params()
+
+    asset_index = wait_for_confirmation(client, create_asset(client, user, priv_key, sp, 1000, 0))['asset-index']
+    txid = create_app(client, user, priv_key, sp, asset_index, cache=ProgramCache())
+    app_id = wait_for_confirmation(client, txid)['application-index']
+    with pytest.raises(Exception):
+        # Not opted in, so the approval program fails
+        remove_liquidity_call(client, user, priv_key, sp, app_id, 1)
+
+    phases = {key for key in registry.phases}
+    assert {('create_app', name) for name in ('compile', 'build', 'sign', 'submit')} <= phases
+    assert {('remove_liquidity_call', 'build'), ('remove_liquidity_call', 'sign')} <= phases
+    # Helpers outside an operation are accounted to their own phase
+    assert ('confirm', 'confirm') in phases
+    # A fresh program cache misses for both the approval and the clear program
+    assert registry.requests['create_app', 'POST /teal/compile'] == 2
+    assert registry.requests['create_app', 'POST /transactions'] == 1
+    assert registry.rejections == {('remove_liquidity_call', 'approval program'): 1}
+
+    registry.flush()
+    with open(path) as f:
+        text = f.read()
+    assert '# TYPE asaswap_phase_seconds histogram' in text
+    assert 'asaswap_phase_seconds_count{operation="create_app",phase="sign"} 1' in text
+    assert 'asaswap_phase_seconds_bucket{operation="create_app",phase="sign",le="+Inf"} 1' in text
+    assert 'asaswap_rejections_total{operation="remove_liquidity_call",reason="approval program"} 1' in text
+    assert 'asaswap_algod_requests_total{operation="create_app",endpoint="POST /transactions"} 1' in text
+
+
+def test_disabled_metrics_record_nothing():
+    assert metrics.get_metrics() is None
+    with metrics.phase('sign'):
+        pass
+    assert metrics.endpoint('GET', '/transactions/pending/ABC?format=msgpack') == 'GET /transactions/pending/ABC'
+    assert metrics.endpoint('GET', '/blocks/12') == 'GET /blocks/:id'
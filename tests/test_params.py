@@ -0,0 +1,87 @@
+import threading
+
+from algosdk.future.transaction import SuggestedParams
+
+from transactions.params import SuggestedParamsProvider
+from transactions.utils import resolve_params
+
+
+class StubClient:
+    def __init__(self):
+        self.last_round = 10
+        self.requests = 0
+
+    def suggested_params(self):
+        self.requests += 1
+        return SuggestedParams(0, self.last_round, self.last_round + 1000, 'gh')
+
+    def status(self):
+        return {'last-round': self.last_round}
+
+    def status_after_block(self, round_num):
+        # A long poll that returns quickly, as if a block came
+        threading.Event().wait(0.01)
+        return {'last-round': self.last_round}
+
+
+def test_provider_refreshes_after_ttl_rounds():
+    client = StubClient()
+    provider = SuggestedParamsProvider(client, ttl_rounds=100, background=False)
+
+    params = provider.get()
+    assert provider.get() is params
+    assert resolve_params(provider) is params
+    assert client.requests == 1
+
+    client.last_round = 50
+    provider.observe_round(50)
+    assert provider.get() is params
+
+    client.last_round = 110
+    provider.observe_round(110)
+    assert provider.get().first == 110
+    assert client.requests == 2
+
+
+def test_provider_estimates_age_without_background_thread():
+    client = StubClient()
+    provider = SuggestedParamsProvider(client, ttl_rounds=100, background=False, block_time=0)
+
+    provider.get()
+    provider.get()
+    assert client.requests == 2
+
+
+def test_stop_waits_for_the_background_thread():
+    provider = SuggestedParamsProvider(StubClient(), block_time=1)
+    provider.start()
+    thread = provider._thread
+    provider.stop()
+    assert not thread.is_alive()
+
+    # A thread left stopping does not run on once the provider is restarted
+    provider.start()
+    first = provider._thread
+    provider.stop(timeout=0)
+    provider.start()
+    second = provider._thread
+    provider.stop()
+    first.join(1)
+    assert first is not second
+    assert not first.is_alive() and not second.is_alive()
+
+    # Params are still served after stop, without a new thread
+    assert provider.get() is not None
+    assert provider._thread is None
+
+
+def test_provider_falls_back_to_expiry_when_the_thread_died():
+    client = StubClient()
+    provider = SuggestedParamsProvider(client, ttl_rounds=100, background=False, block_time=0)
+    provider._thread = threading.Thread(target=lambda: None)
+    provider._thread.start()
+    provider._thread.join()
+
+    provider.get()
+    provider.get()
+    assert client.requests == 2
@@ -0,0 +1,145 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from algosdk.error import AlgodHTTPError
+
+from transactions.pooled import NodeUnavailable, PooledAlgodClient
+
+
+class FakeAlgod:
+    """
+    algod stub answering /v2/status with a configurable round or error.
+
+    Only the stub a transaction was submitted to knows its pending info.
+    """
+    def __init__(self, last_round=100, status=200):
+        self.last_round = last_round
+        self.status = status
+        self.pending = set()
+        self.connections = 0
+        self.requests = []
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def setup(self):
+                fake.connections += 1
+                super().setup()
+
+            def _reply(self):
+                fake.requests.append((self.command, self.path))
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+                status = fake.status
+                if status == 200 and self.command == 'POST' and self.path == '/v2/transactions':
+                    fake.pending.add('TX')
+                elif status == 200 and self.path.startswith('/v2/transactions/pending/'):
+                    status = 200 if self.path.split('/')[-1].split('?')[0] in fake.pending else 404
+                if status == 200:
+                    body = json.dumps({'last-round': fake.last_round, 'txId': 'TX'}).encode()
+                else:
+                    body = json.dumps({'message': f'status {status}'}).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = _reply
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.address = f'http://127.0.0.1:{self.server.server_address[1]}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def nodes():
+    started = [FakeAlgod(), FakeAlgod()]
+    yield started
+    for node in started:
+        node.close()
+
+
+def client_for(nodes, **kwargs):
+    kwargs.setdefault('backoff', 0.01)
+    return PooledAlgodClient('token', ','.join(node.address for node in nodes), **kwargs)
+
+
+def test_requests_reuse_connections_and_spread_over_nodes(nodes):
+    client = client_for(nodes)
+    for _ in range(20):
+        assert client.status()['last-round'] == 100
+    assert [node.connections for node in nodes] == [1, 1]
+    assert all(len(node.requests) >= 10 for node in nodes)
+
+
+def test_lagging_and_failing_nodes_are_skipped(nodes):
+    lagging, synced = nodes
+    lagging.last_round = 90
+    client = client_for(nodes, max_round_lag=2)
+    client.refresh_rounds()
+    served = len(lagging.requests)
+    for _ in range(5):
+        client.status()
+    assert len(lagging.requests) == served
+
+    # Reads fail over to the other node once a node errors
+    lagging.last_round = 100
+    client.refresh_rounds()
+    synced.status = 503
+    for _ in range(5):
+        assert client.status()['last-round'] == 100
+
+
+def test_submissions_are_not_retried(nodes):
+    for node in nodes:
+        node.status = 500
+    client = client_for(nodes, status_interval=60)
+    client.nodes[0].last_round = client.nodes[1].last_round = 1
+    client._checked_at = float('inf')
+
+    with pytest.raises(AlgodHTTPError, match='status 500'):
+        client.send_raw_transaction('AAAA')
+    assert sum(method == 'POST' for node in nodes for method, _ in node.requests) == 1
+
+    with pytest.raises(NodeUnavailable):
+        client.status()
+
+
+def test_pending_info_goes_to_the_node_that_accepted_the_transaction(nodes):
+    behind, ahead = nodes
+    behind.last_round = 99
+    client = client_for(nodes, max_round_lag=2, status_interval=60)
+    client.refresh_rounds()
+
+    assert client.send_raw_transaction('AAAA') == 'TX'
+    accepted = behind if behind.pending else ahead
+    other = ahead if accepted is behind else behind
+    for _ in range(4):
+        assert client.pending_transaction_info('TX')['last-round'] == accepted.last_round
+    assert not any(path.startswith('/v2/transactions/pending/') for _, path in other.requests)
+
+    # Other reads keep spreading over both nodes
+    served = len(other.requests)
+    for _ in range(4):
+        client.status()
+    assert len(other.requests) == served + 2
+
+    # Once the accepting node falls out of sync it is not asked first anymore
+    accepted.last_round -= 10
+    client.refresh_rounds()
+    other.pending.add('TX')
+    served = len(other.requests)
+    client.pending_transaction_info('TX')
+    assert len(other.requests) == served + 1
@@ -0,0 +1,46 @@
+import json
+
+from pyteal import Mode, Seq, Int, Pop, compileTeal
+
+from contracts import teal
+from contracts.profile import BASELINE_PATH, OUTSIDE, ProgramSize, Profiler, compile_marked, hot_branches, regressions
+from contracts.state import Named
+
+
+def test_markers_attribute_instructions_to_the_innermost_name():
+    program, owners = compile_marked(
+        Seq([Pop(Named('outer', Int(1) + Named('inner', Int(2)))), Int(1)]), Mode.Application
+    )
+    _, instructions = teal.disassemble(program)
+    assert len(owners) == len(instructions)
+    assert 'inner' in owners and 'outer' in owners and owners[-1] == OUTSIDE
+    # Markers are labels, the plain build is the same program
+    assert program == teal.assemble(compileTeal(Seq([Pop(Int(1) + Int(2)), Int(1)]), Mode.Application))
+
+
+def test_hot_branches_do_not_get_more_expensive():
+    profiler = Profiler()
+    branches = profiler.run()
+    sizes = profiler.sizes()
+    with open(BASELINE_PATH) as f:
+        expected = json.load(f)
+
+    assert regressions(sizes, branches, expected) == []
+    for name, size in sizes.items():
+        assert size.cost == teal.program_cost(getattr(profiler, name)), name
+    assert {'SWAP algos in', 'SWAP tokens in', 'WITHDRAW algos and tokens'} <= set(hot_branches(branches))
+    assert 'REMOVE_LIQUIDITY' in branches and 'ClearState [clear]' in branches
+    for name, branch in branches.items():
+        assert branch.cost <= branch.budget, name
+        assert branch.cost == sum(branch.names.values())
+
+
+def test_programs_over_a_limit_are_regressions():
+    sizes = {
+        'approval': ProgramSize(1025, 500, teal.MAX_APP_PROGRAM_LEN, 600, teal.MAX_APP_COST),
+        'clear': ProgramSize(144, 26, teal.MAX_APP_PROGRAM_LEN, 701, teal.MAX_APP_COST),
+    }
+    assert regressions(sizes, {}, {'costs': {}}) == [
+        'approval is 1025 bytes, over the limit of 1024',
+        'clear has a static cost of 701, over the limit of 700',
+    ]
@@ -0,0 +1,107 @@
+import random
+
+import pytest
+
+from contracts.engine import Pool, TransactionRejected
+
+np = pytest.importorskip('numpy')
+quote = pytest.importorskip('contracts.quote')
+
+
+def _snapshots(rng, n):
+    snapshots = []
+    for _ in range(n):
+        scale = 10 ** rng.randint(0, 13)
+        snapshots.append((rng.randint(0, 4 * scale), rng.randint(0, 4 * scale), rng.randint(0, 4 * scale)))
+    return snapshots
+
+
+def _pool(algos_balance, tokens_balance, total_liquidity_tokens):
+    pool = Pool(1000000, 3)
+    pool.create('creator', 1)
+    pool.opt_in('user')
+    pool.state.algos_balance = algos_balance
+    pool.state.tokens_balance = tokens_balance
+    pool.state.total_liquidity_tokens = total_liquidity_tokens
+    pool.accounts['user'].user_liquidity_tokens = total_liquidity_tokens
+    return pool
+
+
+def test_quote_swap_matches_engine():
+    rng = random.Random(1)
+    snapshots = _snapshots(rng, 2000)
+    amounts = [rng.randint(0, 10 ** rng.randint(0, 12)) for _ in snapshots]
+    asset_in = [rng.random() < 0.5 for _ in snapshots]
+
+    result = quote.quote_swap(
+        amounts,
+        asset_in,
+        [s[0] for s in snapshots],
+        [s[1] for s in snapshots],
+        1000000,
+        3,
+    )
+
+    for i, (algos, tokens, total) in enumerate(snapshots):
+        pool = _pool(algos, tokens, total)
+        try:
+            pool.swap('user', amounts[i], asset_index=1 if asset_in[i] else None)
+        except TransactionRejected:
+            assert not result.valid[i]
+            continue
+        local = pool.local_state('user')
+        assert result.valid[i]
+        assert int(result.amount_out[i]) == local['ALGOS_TO_WITHDRAW'] + local['TOKENS_TO_WITHDRAW']
+        assert int(result.algos_balance[i]) == pool.state.algos_balance
+        assert int(result.tokens_balance[i]) == pool.state.tokens_balance
+
+
+def test_quote_swap_in_deep_pools():
+    amounts = [5 * 10 ** 6, 10 ** 7, 4 * 10 ** 6]
+    asset_in = [False, False, True]
+    result = quote.quote_swap(amounts, asset_in, 10 ** 12, 4 * 10 ** 12, 1000000, 3)
+
+    assert result.valid.all()
+    for i, amount in enumerate(amounts):
+        amount_in = amount * 97 // 100
+        reserve_in, reserve_out = (4 * 10 ** 12, 10 ** 12) if asset_in[i] else (10 ** 12, 4 * 10 ** 12)
+        assert int(result.amount_out[i]) == reserve_out * amount_in // (reserve_in + amount_in)
+
+
+def test_quote_liquidity_matches_engine():
+    rng = random.Random(2)
+    snapshots = _snapshots(rng, 2000)
+    asset_amounts = [rng.randint(0, 4 * 10 ** rng.randint(0, 12)) for _ in snapshots]
+    # Deposit close to the pool ratio most of the time so the tolerance check passes
+    algos_amounts = [
+        a * s[0] // s[1] if s[1] and rng.random() < 0.7 else rng.randint(0, 10 ** 9)
+        for a, s in zip(asset_amounts, snapshots)
+    ]
+    burn = [rng.randint(0, s[2]) for s in snapshots]
+    algos_balance, tokens_balance, total = ([s[i] for s in snapshots] for i in range(3))
+
+    added = quote.quote_add_liquidity(asset_amounts, algos_amounts, algos_balance, tokens_balance, total, 1000000)
+    removed = quote.quote_remove_liquidity(burn, algos_balance, tokens_balance, total)
+
+    for i, snapshot in enumerate(snapshots):
+        pool = _pool(*snapshot)
+        try:
+            pool.add_liquidity('user', asset_amounts[i], algos_amounts[i])
+        except TransactionRejected:
+            assert not added.valid[i]
+        else:
+            assert added.valid[i]
+            assert int(added.total_liquidity_tokens[i]) == pool.state.total_liquidity_tokens
+            assert int(added.algos_balance[i]) == pool.state.algos_balance
+            assert int(added.tokens_balance[i]) == pool.state.tokens_balance
+
+        pool = _pool(*snapshot)
+        try:
+            pool.remove_liquidity('user', burn[i])
+        except TransactionRejected:
+            assert not removed.valid[i]
+        else:
+            assert removed.valid[i]
+            assert int(removed.algos_amount[i]) == pool.local_state('user')['ALGOS_TO_WITHDRAW']
+            assert int(removed.tokens_amount[i]) == pool.local_state('user')['TOKENS_TO_WITHDRAW']
+            assert int(removed.total_liquidity_tokens[i]) == pool.state.total_liquidity_tokens
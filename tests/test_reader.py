@@ -0,0 +1,75 @@
+import base64
+
+from algosdk.error import AlgodHTTPError
+
+from transactions.main import read_local_state, read_global_state
+from transactions.reader import StateReader
+
+
+def _key_value(**values):
+    return [
+        {'key': base64.b64encode(key.encode()).decode(), 'value': {'type': 2, 'uint': value}}
+        for key, value in values.items()
+    ]
+
+
+class StubClient:
+    def __init__(self, app_endpoint=True):
+        self.app_endpoint = app_endpoint
+        self.last_round = 1
+        self.requests = []
+        self.accounts = {
+            'LP1': {'apps-local-state': [
+                {'id': 7, 'key-value': _key_value(USER_LIQUIDITY_TOKENS=1)},
+                {'id': 42, 'key-value': _key_value(USER_LIQUIDITY_TOKENS=10, ALGOS_TO_WITHDRAW=0)},
+            ]},
+            'LP2': {'apps-local-state': [
+                {'id': 42, 'key-value': _key_value(USER_LIQUIDITY_TOKENS=20, ALGOS_TO_WITHDRAW=5)},
+            ]},
+            'NOBODY': {'apps-local-state': []},
+        }
+
+    def status(self):
+        self.requests.append('status')
+        return {'last-round': self.last_round}
+
+    def account_info(self, addr):
+        self.requests.append(f'account {addr}')
+        return self.accounts[addr]
+
+    def algod_request(self, method, requrl):
+        self.requests.append(requrl)
+        if requrl == '/applications/42':
+            return {'id': 42, 'params': {'global-state': _key_value(ALGOS_BALANCE=100, TOKENS_BALANCE=400)}}
+        addr = requrl.split('/')[2]
+        for local_state in self.accounts[addr]['apps-local-state']:
+            if self.app_endpoint and local_state['id'] == 42:
+                return {'app-local-state': local_state, 'round': self.last_round}
+        raise AlgodHTTPError('not found', 404)
+
+
+def test_reader_finds_local_state_of_the_right_app():
+    for app_endpoint in (True, False):
+        client = StubClient(app_endpoint)
+        assert read_local_state(client, 'LP1', 42) == {'USER_LIQUIDITY_TOKENS': 10, 'ALGOS_TO_WITHDRAW': 0}
+        assert read_local_state(client, 'NOBODY', 42) is None
+        assert read_global_state(client, 'CREATOR', 42) == {'ALGOS_BALANCE': 100, 'TOKENS_BALANCE': 400}
+
+
+def test_reader_batches_and_caches_per_round():
+    client = StubClient()
+    reader = StateReader(client, 42)
+
+    states = reader.local_states(['LP1', 'LP2', 'NOBODY'])
+    assert states['LP2'] == {'USER_LIQUIDITY_TOKENS': 20, 'ALGOS_TO_WITHDRAW': 5}
+    assert states['NOBODY'] is None
+    reader.global_state()
+    requests = len(client.requests)
+
+    reader.local_states(['LP1', 'LP2'])
+    reader.global_state()
+    assert client.requests[requests:] == ['status', 'status']
+
+    client.last_round = 2
+    reader.local_state('LP1')
+    assert client.requests[-1] == '/accounts/LP1/applications/42'
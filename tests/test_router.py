@@ -0,0 +1,38 @@
+import pytest
+
+pytest.importorskip('pyteal')
+
+from algosdk.future import transaction  # noqa: E402
+from pyteal import App, Bytes, Int, Return, TealInputError, Txn  # noqa: E402
+
+from contracts.asaswap import METHOD_FREQUENCIES  # noqa: E402
+from contracts.router import Dispatch, dispatch_costs, report  # noqa: E402
+from contracts.teal import EvalContext, TealError, assemble, evaluate  # noqa: E402
+
+
+def test_hot_methods_are_dispatched_first():
+    costs = dispatch_costs(METHOD_FREQUENCIES)
+    declared = dispatch_costs(METHOD_FREQUENCIES, ordered=False)
+
+    assert costs['SWAP'] < costs['WITHDRAW'] < costs['ADD_LIQUIDITY'] < costs['UPDATE']
+    assert costs['SWAP'] < declared['SWAP']
+    assert costs['WITHDRAW'] < declared['WITHDRAW']
+    assert 'weighted average (ordered)' in report(METHOD_FREQUENCIES)
+
+
+@pytest.mark.parametrize('on_complete', [
+    transaction.OnComplete.UpdateApplicationOC,
+    transaction.OnComplete.DeleteApplicationOC,
+])
+def test_update_and_delete_are_rejected(on_complete):
+    program = assemble(open('./contracts/state.teal').read())
+    sp = transaction.SuggestedParams(1000, 1, 1000, 'A' * 44, flat_fee=True)
+    txn = transaction.ApplicationCallTxn('A' * 58, sp, 1, on_complete, app_args=[b'UPDATE'])
+    with pytest.raises(TealError):
+        evaluate(program, EvalContext([txn], 0), application=True)
+
+
+def test_dispatch_branches_must_end_the_program():
+    with pytest.raises(TealInputError):
+        Dispatch([Txn.application_id(), App.globalPut(Bytes('A'), Int(1))]).__teal__()
+    Dispatch([Txn.application_id(), Return(Int(1))]).__teal__()
@@ -0,0 +1,63 @@
+import pytest
+from algosdk.account import generate_account
+from algosdk.error import AlgodHTTPError
+
+from transactions.batch import RemoveLiquidityRequest, SwapRequest, WithdrawRequest
+from transactions.loadtest import LoadTest
+from transactions.local import LocalClient
+from transactions.main import add_liquidity_call, swap_call, read_local_state
+from transactions.scheduler import Scheduler
+from transactions.utils import wait_for_confirmation
+
+
+@pytest.fixture
+def load():
+    client = LocalClient()
+    priv_key, funder = generate_account()
+    client.ledger.fund(funder, 10 ** 12)
+    load = LoadTest(client, funder, priv_key, accounts=3)
+    load.setup()
+    return load
+
+
+def test_scheduler_chains_withdrawals_per_account(load):
+    client, pool = load.client, load.pool
+    (liquidity_key, liquidity), (pending_key, pending), (swapper_key, swapper) = load.accounts
+    sp = client.suggested_params()
+    wait_for_confirmation(client, add_liquidity_call(
+        client, liquidity, liquidity_key, sp, pool.app_id, pool.escrow_addr, 100000, 10000, pool.asset_index
+    ))
+    # Left over from an earlier session, withdrawn before the first scheduled swap
+    wait_for_confirmation(client, swap_call(client, pending, pending_key, sp, pool.app_id, 1000, pool.escrow_addr))
+
+    scheduler = Scheduler(client, pool.app_id, pool.escrow_addr, pool.asset_index, pool.logicsig())
+    with scheduler:
+        futures = [
+            # Identical requests back to back are separate transactions
+            scheduler.submit(SwapRequest(swapper, swapper_key, 1000)),
+            scheduler.submit(SwapRequest(swapper, swapper_key, 1000)),
+            scheduler.submit(SwapRequest(swapper, swapper_key, 5000, pool.asset_index)),
+            scheduler.submit(SwapRequest(pending, pending_key, 2000)),
+            scheduler.submit(RemoveLiquidityRequest(liquidity, liquidity_key, 5000)),
+            scheduler.submit(SwapRequest(liquidity, liquidity_key, 1000)),
+        ]
+        results = [future.result(timeout=30) for future in futures]
+        # A rejected request fails alone, the account's next request still runs
+        rejected = scheduler.submit(WithdrawRequest(swapper, swapper_key, 1, 0))
+        after = scheduler.submit(SwapRequest(swapper, swapper_key, 1000))
+        scheduler.join()
+        with pytest.raises(AlgodHTTPError):
+            rejected.result()
+        assert after.result().withdraw_txid
+
+    # The params provider the scheduler started is stopped with it
+    assert scheduler.suggested_params._thread is None
+    assert all(result.withdraw_txid for result in results)
+    assert results[0].asset_amount > 0 and results[0].algos_amount == 0
+    assert results[2].algos_amount > 0 and results[2].asset_amount == 0
+    assert results[4].algos_amount > 0 and results[4].asset_amount > 0
+    assert len({result.txid for result in results}) == len(results)
+    # Every account ends with its credits withdrawn
+    for _, address in load.accounts:
+        state = read_local_state(client, address, pool.app_id)
+        assert state['ALGOS_TO_WITHDRAW'] == state['TOKENS_TO_WITHDRAW'] == 0
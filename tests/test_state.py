@@ -0,0 +1,55 @@
+import pytest
+
+pyteal = pytest.importorskip('pyteal')
+
+from pyteal import App, Assert, Bytes, Int, Mode, Return, Seq, compileTeal  # noqa: E402
+
+from contracts.state import Cached, GlobalState, commit, load  # noqa: E402
+from contracts.teal import EvalContext, assemble, evaluate  # noqa: E402
+
+
+class Globals:
+    def __init__(self, **values):
+        self.state = {key.encode(): value for key, value in values.items()}
+
+    def app_global_get(self, app_id, key):
+        return self.state.get(key, 0)
+
+    def app_global_put(self, app_id, key, value):
+        self.state[key] = value
+
+
+def _run(expr, ledger):
+    program = assemble(compileTeal(expr, Mode.Application))
+    return evaluate(program, EvalContext([], 0, ledger=ledger), application=True)
+
+
+def test_staged_writes_are_visible_to_cached_reads_and_committed_once():
+    counter = GlobalState('COUNTER')
+    total = GlobalState('TOTAL')
+    doubled = Cached(counter.cached() * Int(2))
+    ledger = Globals(COUNTER=5, TOTAL=1)
+
+    _run(Seq([
+        load(counter, total),
+        counter.stage(counter.cached() + Int(1)),
+        # The state itself is untouched until commit
+        Assert(App.globalGet(Bytes('COUNTER')) == Int(5)),
+        doubled.store(),
+        total.stage(total.cached() + doubled.load() + doubled.load()),
+        commit(counter, total),
+        Return(Int(1)),
+    ]), ledger)
+
+    assert ledger.state == {b'COUNTER': 6, b'TOTAL': 25}
+
+
+def test_cached_reads_cost_less_than_repeated_reads():
+    balance = GlobalState('BALANCE')
+    direct = Seq([Assert(balance.get() + balance.get() + balance.get() + balance.get() > Int(0)), Return(Int(1))])
+    cached = Seq([
+        balance.load(),
+        Assert(balance.cached() + balance.cached() + balance.cached() + balance.cached() > Int(0)),
+        Return(Int(1)),
+    ])
+    assert _run(cached, Globals(BALANCE=1)) < _run(direct, Globals(BALANCE=1))
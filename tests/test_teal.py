@@ -0,0 +1,70 @@
+import pytest
+
+from contracts.teal import EvalContext, TealError, assemble, check_cost, disassemble, evaluate, program_cost
+
+
+def _run(source):
+    return evaluate(assemble(source), EvalContext([], 0))
+
+
+def test_assemble_layout():
+    program = assemble('#pragma version 2\nint 1\nint 300\n+\nbyte "ab"\npop\nint 1\nreturn')
+    assert program == bytes([
+        2,
+        0x20, 2, 1, 0xAC, 0x02,
+        0x26, 1, 2, ord('a'), ord('b'),
+        0x22, 0x23, 0x08, 0x28, 0x48, 0x22, 0x43,
+    ])
+
+
+def test_branches_are_relative_forward_offsets():
+    program = assemble('#pragma version 2\nint 1\nbnz done\nerr\ndone:\nint 1')
+    _, instructions = disassemble(program)
+    assert [i.name for i in instructions] == ['intcblock', 'intc_0', 'bnz', 'err', 'intc_0']
+    assert instructions[2].immediates == [instructions[4].pc]
+    assert program_cost(program) == 5
+
+    with pytest.raises(TealError):
+        assemble('#pragma version 2\nback:\nint 1\nbnz back')
+
+
+def test_evaluate_arithmetic_panics():
+    assert _run('#pragma version 2\nint 2\nint 3\n*\nint 6\n==') == 6
+    with pytest.raises(TealError):
+        _run('#pragma version 2\nint 18446744073709551615\nint 1\n+')
+    with pytest.raises(TealError):
+        _run('#pragma version 2\nint 1\nint 2\n-')
+    with pytest.raises(TealError):
+        _run('#pragma version 2\nint 1\nint 0\n/')
+    with pytest.raises(TealError):
+        _run('#pragma version 2\nbyte 0x010203040506070809\nbtoi')
+
+
+def test_evaluate_requires_single_nonzero_result():
+    with pytest.raises(TealError):
+        _run('#pragma version 2\nint 1\nint 1')
+    with pytest.raises(TealError):
+        _run('#pragma version 2\nint 0')
+    with pytest.raises(TealError):
+        _run('#pragma version 2\nbyte "x"')
+    assert _run('#pragma version 2\nint 0\nint 1\nreturn\nerr')
+
+
+def test_escrow_template_matches_assembled_escrow():
+    pyteal = pytest.importorskip('pyteal')
+    from contracts.asaswap import escrow
+    from transactions.escrow import EscrowTemplate, TEMPLATE_APP_ID
+
+    template = EscrowTemplate(assemble(pyteal.compileTeal(escrow(TEMPLATE_APP_ID), pyteal.Mode.Signature)))
+    for app_id in (123, 4321, 2 ** 40):
+        assert template.program(app_id) == assemble(pyteal.compileTeal(escrow(app_id), pyteal.Mode.Signature))
+
+
+def test_static_cost_is_checked_for_the_whole_program():
+    # Skips every hash, so it runs in 5 ops with the constant blocks but costs 797 statically
+    program = assemble('#pragma version 2\nint 1\nbnz done\n' + 'byte 0x00\nkeccak256\npop\n' * 6 + 'done:\nint 1')
+    assert program_cost(program) == 797
+    with pytest.raises(TealError, match='over the limit of 700'):
+        evaluate(program, EvalContext([], 0), application=True)
+    assert evaluate(program, EvalContext([], 0)) == 5
+    check_cost(program)
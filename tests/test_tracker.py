@@ -0,0 +1,97 @@
+import base64
+import threading
+
+import msgpack
+import pytest
+from algosdk import encoding
+from algosdk.account import generate_account
+from algosdk.future import transaction
+
+from transactions.tracker import ConfirmationTracker, ConfirmationExpired, block_txn_id
+
+GENESIS_HASH = base64.b64encode(bytes(32)).decode()
+
+
+def _block(*txns):
+    block = {'gh': bytes(32), 'gen': 'sandnet-v1', 'txns': []}
+    for txn in txns:
+        stxn = {'txn': msgpack.unpackb(base64.b64decode(encoding.msgpack_encode(txn)), raw=False)}
+        del stxn['txn']['gh']
+        if stxn['txn'].pop('gen', None):
+            stxn['hgi'] = True
+        block['txns'].append(stxn)
+    return block
+
+
+def _payment(amount):
+    _, sender = generate_account()
+    _, receiver = generate_account()
+    params = transaction.SuggestedParams(0, 1, 1001, GENESIS_HASH, 'sandnet-v1')
+    return transaction.PaymentTxn(sender, params, receiver, amount)
+
+
+def test_block_txn_id_matches_sdk():
+    txns = [_payment(1000), _payment(2000)]
+    block = _block(*txns)
+    assert [block_txn_id(stxn, block) for stxn in block['txns']] == [txn.get_txid() for txn in txns]
+
+
+class StubClient:
+    """
+    algod stub serving the blocks added to it, with a short long poll.
+    """
+    def __init__(self):
+        self.blocks = {2: _block()}
+        self.last_round = 2
+        self.fetched = []
+        self._cond = threading.Condition()
+
+    def add_block(self, round_num, block):
+        with self._cond:
+            self.blocks[round_num] = block
+            self.last_round = round_num
+            self._cond.notify_all()
+
+    def status(self):
+        return {'last-round': self.last_round}
+
+    def status_after_block(self, round_num):
+        with self._cond:
+            self._cond.wait_for(lambda: self.last_round > round_num, 0.05)
+        return self.status()
+
+    def block_info(self, round_num, response_format=None):
+        self.fetched.append(round_num)
+        return msgpack.packb({'block': self.blocks[round_num]}, use_bin_type=True)
+
+
+def test_tracker_resolves_many_transactions_per_block():
+    client = StubClient()
+    tracker = ConfirmationTracker(client, block_time=1)
+
+    txns = [_payment(amount) for amount in range(1, 6)]
+    futures = [tracker.track(txn.get_txid()) for txn in txns]
+    expiring = tracker.track(_payment(9).get_txid(), last_valid=4)
+
+    client.add_block(3, _block(*txns[:2]))
+    client.add_block(4, _block(*txns[2:]))
+
+    assert [future.result(5) for future in futures] == [3, 3, 4, 4, 4]
+    with pytest.raises(ConfirmationExpired):
+        expiring.result(5)
+    # Confirmed transactions registered late still resolve from the recent history
+    assert tracker.track(txns[0].get_txid()).result(0) == 3
+
+    # A restart right after a stop follows blocks with a single thread
+    first = tracker._thread
+    tracker.stop(timeout=0)
+    tracker.start()
+    second = tracker._thread
+    later = _payment(10)
+    future = tracker.track(later.get_txid())
+    client.add_block(5, _block(later))
+    assert future.result(5) == 5
+    tracker.stop()
+    first.join(1)
+    assert not first.is_alive() and not second.is_alive()
+    assert client.fetched == [2, 3, 4, 5]
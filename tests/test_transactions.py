@@ -1,10 +1,13 @@
+import pytest
 from algosdk.account import generate_account
+from algosdk.error import AlgodHTTPError
 
 from transactions.utils import wait_for_confirmation, suggested_params, client
 from transactions.main import (
     create_app,
     add_escrow,
     swap_call,
+    swap_settle_call,
     withdraw_call,
     add_liquidity_call,
     remove_liquidity_call,
@@ -179,3 +182,58 @@ def test_transactions(dispenser):
     assert local_state['USER_LIQUIDITY_TOKENS'] == 999000
     assert local_state['ALGOS_TO_WITHDRAW'] == 0
     assert local_state['TOKENS_TO_WITHDRAW'] == 3880
+
+    # The escrow pays out within the swap group, the pending withdrawal does not get in the way
+    with pytest.raises(AlgodHTTPError):
+        swap_settle_call(
+            client,
+            user,
+            user_priv_key,
+            suggested_params,
+            app_id,
+            1000,
+            3873,
+            escrow_addr,
+            asset_index,
+        )
+
+    tx_id = swap_settle_call(
+        client,
+        user,
+        user_priv_key,
+        suggested_params,
+        app_id,
+        1000,
+        3872,
+        escrow_addr,
+        asset_index,
+    )
+    wait_for_confirmation(client, tx_id)
+
+    global_state = read_global_state(client, user, app_id)
+    assert global_state['TOKENS_BALANCE'] == 3988248
+    assert global_state['ALGOS_BALANCE'] == 999000
+
+    local_state = read_local_state(client, user, app_id)
+    assert local_state['TOKENS_TO_WITHDRAW'] == 3880
+
+    # Only the asset transfer is due, the group carries no empty payment
+    tx_id = withdraw_call(
+        client,
+        user,
+        user_priv_key,
+        suggested_params,
+        app_id,
+        escrow_addr,
+        asset_index,
+        asset_amount=3880,
+    )
+    wait_for_confirmation(client, tx_id)
+
+    global_state = read_global_state(client, user, app_id)
+    assert global_state['TOKENS_BALANCE'] == 3988248
+    assert global_state['ALGOS_BALANCE'] == 998000
+
+    local_state = read_local_state(client, user, app_id)
+    assert local_state['ALGOS_TO_WITHDRAW'] == 0
+    assert local_state['TOKENS_TO_WITHDRAW'] == 0
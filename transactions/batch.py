@@ -0,0 +1,246 @@
+import os
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from algosdk.future import transaction
+
+from transactions.main import (
+    assign_group_id,
+    sign_group,
+    escrow_lsig,
+    swap_group,
+    swap_settle_group,
+    withdraw_group,
+    add_liquidity_group,
+    remove_liquidity_group,
+)
+from transactions.utils import resolve_params
+
+SwapRequest = namedtuple('SwapRequest', ['user', 'user_priv_key', 'amount', 'asset_index'], defaults=[None])
+SwapSettleRequest = namedtuple(
+    'SwapSettleRequest', ['user', 'user_priv_key', 'amount', 'payout', 'asset_in'], defaults=[False]
+)
+WithdrawRequest = namedtuple('WithdrawRequest', ['user', 'user_priv_key', 'algos_amount', 'asset_amount'])
+AddLiquidityRequest = namedtuple('AddLiquidityRequest', ['user', 'user_priv_key', 'asset_amount', 'algos_amount'])
+RemoveLiquidityRequest = namedtuple('RemoveLiquidityRequest', ['user', 'user_priv_key', 'amount'])
+OnboardRequest = namedtuple('OnboardRequest', ['user', 'user_priv_key', 'algos_amount'], defaults=[0])
+
+# Below this many groups forking signer processes costs more than it saves
+PARALLEL_SIGNING_THRESHOLD = 64
+# Most transactions algod accepts in one atomic group
+MAX_GROUP_SIZE = 16
+
+
+def _sign_chunk(chunk):
+    return [sign_group(txns, signers) for txns, signers in chunk]
+
+
+def sign_groups(groups, signers, executor=None):
+    """
+    Sign many groups, spreading the ed25519 work over a process pool.
+
+    `signers` holds one list of signers per group, as taken by `sign_group`.
+    """
+    work = list(zip(groups, signers))
+    if len(work) < PARALLEL_SIGNING_THRESHOLD:
+        return _sign_chunk(work)
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor()
+    try:
+        workers = getattr(executor, '_max_workers', None) or os.cpu_count() or 1
+        size = -(-len(work) // (workers * 4))
+        chunks = [work[i:i + size] for i in range(0, len(work), size)]
+        return [group for chunk in executor.map(_sign_chunk, chunks) for group in chunk]
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+
+def send_groups(client, signed_groups, max_workers: int = 16):
+    """
+    Submit signed groups concurrently and return their first transaction ids.
+
+    algod accepts a single group per request, so every group still takes one
+    `send_transactions` call, but the calls overlap. Rejected groups hold
+    the raised exception in place of the transaction id.
+    """
+    def send(signed_txns):
+        try:
+            return client.send_transactions(signed_txns)
+        except Exception as e:
+            return e
+
+    if len(signed_groups) <= 1:
+        return [send(signed_txns) for signed_txns in signed_groups]
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(signed_groups))) as pool:
+        return list(pool.map(send, signed_groups))
+
+
+def swap_calls(
+    client,
+    suggested_params,
+    app_id,
+    escrow_addr,
+    requests,
+    executor=None,
+):
+    suggested_params = resolve_params(suggested_params)
+    groups = [
+        swap_group(r.user, suggested_params, app_id, r.amount, escrow_addr, r.asset_index)
+        for r in requests
+    ]
+    signers = [[r.user_priv_key] * 2 for r in requests]
+    return send_groups(client, sign_groups(groups, signers, executor))
+
+
+def swap_settle_calls(
+    client,
+    suggested_params,
+    app_id,
+    escrow_addr,
+    asset_index,
+    requests,
+    lsig=None,
+    executor=None,
+):
+    suggested_params = resolve_params(suggested_params)
+    if lsig is None:
+        lsig = escrow_lsig(client)
+    groups = [
+        swap_settle_group(r.user, suggested_params, app_id, r.amount, r.payout, escrow_addr, asset_index, r.asset_in)
+        for r in requests
+    ]
+    signers = [[r.user_priv_key, r.user_priv_key, lsig] for r in requests]
+    return send_groups(client, sign_groups(groups, signers, executor))
+
+
+def withdraw_calls(
+    client,
+    suggested_params,
+    app_id,
+    escrow_addr,
+    asset_index,
+    requests,
+    lsig=None,
+    executor=None,
+):
+    suggested_params = resolve_params(suggested_params)
+    if lsig is None:
+        lsig = escrow_lsig(client)
+    groups = [
+        withdraw_group(r.user, suggested_params, app_id, escrow_addr, asset_index, r.algos_amount, r.asset_amount)
+        for r in requests
+    ]
+    signers = [[r.user_priv_key] + [lsig] * (len(group) - 1) for r, group in zip(requests, groups)]
+    return send_groups(client, sign_groups(groups, signers, executor))
+
+
+def add_liquidity_calls(
+    client,
+    suggested_params,
+    app_id,
+    escrow_addr,
+    asset_index,
+    requests,
+    executor=None,
+):
+    suggested_params = resolve_params(suggested_params)
+    groups = [
+        add_liquidity_group(r.user, suggested_params, app_id, escrow_addr, r.asset_amount, r.algos_amount, asset_index)
+        for r in requests
+    ]
+    signers = [[r.user_priv_key] * 3 for r in requests]
+    return send_groups(client, sign_groups(groups, signers, executor))
+
+
+def remove_liquidity_calls(
+    client,
+    suggested_params,
+    app_id,
+    requests,
+    executor=None,
+):
+    suggested_params = resolve_params(suggested_params)
+    groups = [remove_liquidity_group(r.user, suggested_params, app_id, r.amount) for r in requests]
+    signers = [[r.user_priv_key] for r in requests]
+    return send_groups(client, sign_groups(groups, signers, executor))
+
+
+def onboard_groups(
+    funder,
+    funder_priv_key,
+    suggested_params,
+    requests,
+    app_id=None,
+    asset_index=None,
+    max_group_size: int = MAX_GROUP_SIZE,
+):
+    """
+    Pack the funding, asset opt-in and app OptIn of many accounts into as few groups as fit.
+
+    Each account gets a payment of its `algos_amount` from `funder` when it
+    is not zero, then an opt-in to `asset_index` and to `app_id` when they
+    are given. The transactions of an account stay together in one group,
+    funding first, so an account is either fully onboarded or not at all.
+    Returns the groups, their signers and the indexes of the requests in each.
+    """
+    groups, signers, members = [], [], []
+    txns, keys, indexes = [], [], []
+    for i, r in enumerate(requests):
+        account_txns, account_keys = [], []
+        if r.algos_amount:
+            account_txns.append(transaction.PaymentTxn(funder, suggested_params, r.user, r.algos_amount))
+            account_keys.append(funder_priv_key)
+        if asset_index:
+            account_txns.append(transaction.AssetTransferTxn(r.user, suggested_params, r.user, 0, asset_index))
+            account_keys.append(r.user_priv_key)
+        if app_id:
+            account_txns.append(transaction.ApplicationOptInTxn(r.user, suggested_params, app_id))
+            account_keys.append(r.user_priv_key)
+        if not account_txns:
+            raise ValueError('nothing to onboard, give an algos_amount, an asset_index or an app_id')
+        if len(txns) + len(account_txns) > max_group_size:
+            groups.append(txns)
+            signers.append(keys)
+            members.append(indexes)
+            txns, keys, indexes = [], [], []
+        txns += account_txns
+        keys += account_keys
+        indexes.append(i)
+    if txns:
+        groups.append(txns)
+        signers.append(keys)
+        members.append(indexes)
+
+    groups = [assign_group_id(txns) if len(txns) > 1 else txns for txns in groups]
+    return groups, signers, members
+
+
+def onboard_calls(
+    client,
+    suggested_params,
+    funder,
+    funder_priv_key,
+    requests,
+    app_id=None,
+    asset_index=None,
+    executor=None,
+):
+    """
+    Fund and opt in many accounts, see `onboard_groups`.
+
+    Returns the first transaction id of the group of every request, or the
+    exception that rejected it.
+    """
+    suggested_params = resolve_params(suggested_params)
+    groups, signers, members = onboard_groups(
+        funder, funder_priv_key, suggested_params, requests, app_id, asset_index
+    )
+    tx_ids = send_groups(client, sign_groups(groups, signers, executor))
+    results = [None] * len(requests)
+    for tx_id, indexes in zip(tx_ids, members):
+        for i in indexes:
+            results[i] = tx_id
+    return results
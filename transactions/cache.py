@@ -0,0 +1,68 @@
+import os
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+
+
+class ProgramCache:
+    """
+    Compiled TEAL programs keyed by the sha256 of their source.
+
+    Keeps the most recently used `maxsize` programs in memory and, when
+    `directory` is given, persists every program there so it survives restarts.
+    """
+    def __init__(self, maxsize: int = 128, directory: str = None):
+        self.maxsize = maxsize
+        self.directory = directory
+        self._programs = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(source_code: bytes) -> str:
+        return hashlib.sha256(source_code).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.bin')
+
+    def get(self, source_code: bytes):
+        key = self.key(source_code)
+        with self._lock:
+            program = self._programs.get(key)
+            if program is not None:
+                self._programs.move_to_end(key)
+                return program
+
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                program = f.read()
+        except FileNotFoundError:
+            return None
+        self._remember(key, program)
+        return program
+
+    def put(self, source_code: bytes, program: bytes):
+        key = self.key(source_code)
+        self._remember(key, program)
+        if self.directory is None:
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file first so concurrent readers never see partial programs
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(program)
+        os.replace(tmp_path, self._path(key))
+
+    def _remember(self, key: str, program: bytes):
+        with self._lock:
+            self._programs[key] = program
+            self._programs.move_to_end(key)
+            while len(self._programs) > self.maxsize:
+                self._programs.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._programs.clear()
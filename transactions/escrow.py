@@ -0,0 +1,70 @@
+from algosdk import logic
+from algosdk.future import transaction
+
+# Placeholder app id compiled into the template, chosen so it never collides
+# with the other integer constants of the escrow program
+TEMPLATE_APP_ID = 0x7A5A5A5A5A5A5A5A
+
+INTCBLOCK_OPCODE = 0x20
+
+
+def encode_uvarint(value: int) -> bytes:
+    out = bytearray()
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+class EscrowTemplate:
+    """
+    Compiled escrow program with a patchable app id.
+
+    The assembler puts every integer constant into the leading intcblock, so
+    programs for different app ids only differ in that single entry. Patching
+    it yields the exact bytes algod would produce, without an algod call.
+    """
+    def __init__(self, program: bytes, placeholder: int = TEMPLATE_APP_ID):
+        version, version_length = logic.parse_uvarint(program)
+        if version_length <= 0 or program[version_length] != INTCBLOCK_OPCODE:
+            raise ValueError('program does not start with an intcblock')
+
+        pc = version_length + 1
+        count, used = logic.parse_uvarint(program[pc:])
+        pc += used
+        self.constants = []
+        start = end = None
+        for _ in range(count):
+            value, used = logic.parse_uvarint(program[pc:])
+            if value == placeholder:
+                start, end = pc, pc + used
+            else:
+                self.constants.append(value)
+            pc += used
+        if start is None:
+            raise ValueError('placeholder app id not found in the intcblock')
+
+        self._prefix = program[:start]
+        self._suffix = program[end:]
+
+    @classmethod
+    def compile(cls, client):
+        from pyteal import compileTeal, Mode
+        from contracts.asaswap import escrow
+        from transactions.utils import compile_program
+
+        source = compileTeal(escrow(TEMPLATE_APP_ID), Mode.Signature)
+        return cls(compile_program(client, source.encode('utf-8')))
+
+    def program(self, app_id: int) -> bytes:
+        if app_id in self.constants:
+            # The assembler would reuse the existing constant, changing the layout
+            raise ValueError(f'app id {app_id} collides with a constant of the escrow program')
+        return self._prefix + encode_uvarint(app_id) + self._suffix
+
+    def address(self, app_id: int) -> str:
+        return logic.address(self.program(app_id))
+
+    def logicsig(self, app_id: int) -> transaction.LogicSig:
+        return transaction.LogicSig(self.program(app_id))
@@ -0,0 +1,257 @@
+import os
+import json
+import base64
+import tempfile
+import threading
+from collections import namedtuple
+
+from algosdk import logic
+from algosdk.future import transaction
+
+from transactions.batch import send_groups, sign_groups
+from transactions.escrow import EscrowTemplate
+from transactions.main import assign_group_id
+from transactions.reader import decode_state
+from transactions.utils import compile_program, int_to_bytes, resolve_params, wait_for_confirmation
+
+# Minimum balance of an account plus one asset holding, and the fee of the escrow opt-in
+ESCROW_FUNDING = 100000 + 100000 + 1000
+
+DeployResult = namedtuple('DeployResult', ['pools', 'failed'])
+
+
+def escrow_program(client, template: EscrowTemplate, app_id: int) -> bytes:
+    try:
+        return template.program(app_id)
+    except ValueError:
+        # Only small app ids collide, compile those the slow way
+        from pyteal import compileTeal, Mode
+        from contracts.asaswap import escrow
+
+        return compile_program(client, compileTeal(escrow(app_id), Mode.Signature).encode('utf-8'))
+
+
+class PoolRecord(namedtuple('PoolRecord', ['asset_index', 'app_id', 'escrow_addr', 'program'])):
+    """
+    Deployed pool of a single asset, `program` is the compiled escrow LogicSig.
+    """
+    __slots__ = ()
+
+    def logicsig(self) -> transaction.LogicSig:
+        return transaction.LogicSig(self.program)
+
+    def as_dict(self) -> dict:
+        return {
+            'asset_index': self.asset_index,
+            'app_id': self.app_id,
+            'escrow_addr': self.escrow_addr,
+            'program': base64.b64encode(self.program).decode(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict):
+        return cls(data['asset_index'], data['app_id'], data['escrow_addr'], base64.b64decode(data['program']))
+
+
+class PoolRegistry:
+    """
+    Index of deployed pools by asset id and by app id.
+
+    When `path` is given the registry is loaded from that JSON file and
+    every change is written back to it.
+    """
+    def __init__(self, path: str = None):
+        self.path = path
+        self._by_asset = {}
+        self._by_app = {}
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            with open(path) as f:
+                for data in json.load(f)['pools']:
+                    self._index(PoolRecord.from_dict(data))
+
+    def _index(self, record: PoolRecord):
+        self._by_asset[record.asset_index] = record
+        self._by_app[record.app_id] = record
+
+    def __len__(self):
+        return len(self._by_asset)
+
+    def __contains__(self, asset_index: int):
+        return asset_index in self._by_asset
+
+    def __iter__(self):
+        return iter(list(self._by_asset.values()))
+
+    def get(self, asset_index: int) -> PoolRecord:
+        return self._by_asset.get(asset_index)
+
+    def get_by_app(self, app_id: int) -> PoolRecord:
+        return self._by_app.get(app_id)
+
+    def add(self, *records: PoolRecord):
+        with self._lock:
+            for record in records:
+                self._index(record)
+        self.save()
+
+    def save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            data = {'pools': [record.as_dict() for record in self._by_asset.values()]}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first so a crash never leaves a truncated registry
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+    def discover(self, client, creator: str, template: EscrowTemplate):
+        """
+        Add the pools created by `creator` that have their escrow set.
+        """
+        records = []
+        for app in client.account_info(creator).get('created-apps') or []:
+            state = decode_state(app['params'].get('global-state'))
+            if 'ASSET_IDX' not in state or 'ESCROW_ADDR' not in state:
+                continue
+            program = escrow_program(client, template, app['id'])
+            records.append(PoolRecord(state['ASSET_IDX'], app['id'], logic.address(program), program))
+        self.add(*records)
+        return records
+
+
+class PoolFactory:
+    """
+    Deploys pools for many assets at once.
+
+    All applications are created in one round. The next round sets every
+    pool up with a single group that funds the escrow and sets it on the
+    application, plus the escrow opt-in, which the escrow signs only on
+    its own. Deploying any number of pools takes two block waits.
+    """
+    def __init__(
+        self,
+        client,
+        creator,
+        creator_priv_key,
+        suggested_params,
+        registry: PoolRegistry = None,
+        template: EscrowTemplate = None,
+        escrow_funding: int = ESCROW_FUNDING,
+    ):
+        self.client = client
+        self.creator = creator
+        self.creator_priv_key = creator_priv_key
+        self.suggested_params = suggested_params
+        self.registry = registry if registry is not None else PoolRegistry()
+        self.escrow_funding = escrow_funding
+        self._template = template
+
+    @property
+    def template(self) -> EscrowTemplate:
+        if self._template is None:
+            self._template = EscrowTemplate.compile(self.client)
+        return self._template
+
+    def _programs(self):
+        approval = compile_program(self.client, open('./contracts/state.teal', 'rb').read())
+        clear = compile_program(self.client, open('./contracts/clear.teal', 'rb').read())
+        return approval, clear
+
+    def create_apps(self, asset_indexes, sp) -> dict:
+        """
+        Create an application for each asset and return their ids by asset.
+        """
+        approval, clear = self._programs()
+        groups = [[transaction.ApplicationCreateTxn(
+            self.creator,
+            sp,
+            transaction.OnComplete.NoOpOC.real,
+            approval,
+            clear,
+            transaction.StateSchema(num_byte_slices=2, num_uints=4),
+            transaction.StateSchema(num_byte_slices=0, num_uints=3),
+            app_args=[int_to_bytes(asset_index)]
+        )] for asset_index in asset_indexes]
+        signers = [[self.creator_priv_key]] * len(groups)
+        tx_ids = send_groups(self.client, sign_groups(groups, signers))
+
+        app_ids = {}
+        for asset_index, tx_id in zip(asset_indexes, tx_ids):
+            if isinstance(tx_id, Exception):
+                app_ids[asset_index] = tx_id
+            else:
+                app_ids[asset_index] = wait_for_confirmation(self.client, tx_id)['application-index']
+        return app_ids
+
+    def escrow_program(self, app_id: int) -> bytes:
+        return escrow_program(self.client, self.template, app_id)
+
+    def setup_group(self, app_id: int, sp):
+        """
+        Group that funds the escrow of a created application and sets it on the application.
+        """
+        escrow_addr = logic.address(self.escrow_program(app_id))
+        return assign_group_id([
+            transaction.PaymentTxn(self.creator, sp, escrow_addr, self.escrow_funding),
+            transaction.ApplicationCallTxn(
+                self.creator,
+                sp,
+                app_id,
+                transaction.OnComplete.NoOpOC.real,
+                app_args=['UPDATE'.encode('utf-8')],
+                accounts=[escrow_addr],
+            ),
+        ])
+
+    def opt_in(self, asset_index: int, app_id: int, sp) -> transaction.LogicSigTransaction:
+        lsig = transaction.LogicSig(self.escrow_program(app_id))
+        txn = transaction.AssetTransferTxn(lsig.address(), sp, lsig.address(), 0, asset_index)
+        return transaction.LogicSigTransaction(txn, lsig)
+
+    def deploy(self, asset_indexes) -> DeployResult:
+        """
+        Deploy a pool for each asset that does not have one in the registry yet.
+
+        Pools that fail are left out of the registry and returned in `failed`
+        with the error, by asset.
+        """
+        sp = resolve_params(self.suggested_params)
+        asset_indexes = [
+            asset_index for asset_index in dict.fromkeys(asset_indexes) if asset_index not in self.registry
+        ]
+        failed = {}
+
+        created = {}
+        for asset_index, app_id in self.create_apps(asset_indexes, sp).items():
+            if isinstance(app_id, Exception):
+                failed[asset_index] = app_id
+            else:
+                created[asset_index] = app_id
+
+        groups = [self.setup_group(app_id, sp) for app_id in created.values()]
+        signers = [[self.creator_priv_key] * 2] * len(groups)
+        funded = {}
+        tx_ids = send_groups(self.client, sign_groups(groups, signers))
+        for (asset_index, app_id), tx_id in zip(created.items(), tx_ids):
+            if isinstance(tx_id, Exception):
+                failed[asset_index] = tx_id
+            else:
+                funded[asset_index] = app_id
+
+        # Sent once every funding is in the pool, the opt-ins land in the same round
+        opt_ins = [[self.opt_in(asset_index, app_id, sp)] for asset_index, app_id in funded.items()]
+        pools = []
+        for (asset_index, app_id), tx_id in zip(funded.items(), send_groups(self.client, opt_ins)):
+            if isinstance(tx_id, Exception):
+                failed[asset_index] = tx_id
+                continue
+            wait_for_confirmation(self.client, tx_id)
+            program = self.escrow_program(app_id)
+            pools.append(PoolRecord(asset_index, app_id, logic.address(program), program))
+
+        self.registry.add(*pools)
+        return DeployResult(pools, failed)
@@ -0,0 +1,225 @@
+"""
+Append-only, columnar history of pool state and pool events.
+
+Every column of every pool is a flat little-endian file under
+`<directory>/<app_id>/<table>/<column>.bin`, so a whole column maps into
+memory with `numpy.memmap` and is scanned without copying. Rows are
+ordered by round, which makes range lookups a binary search.
+"""
+import os
+import base64
+from collections import namedtuple
+
+import numpy as np
+from algosdk import encoding
+
+SNAPSHOT_COLUMNS = {
+    'round': np.dtype('<u8'),
+    'algos_balance': np.dtype('<u8'),
+    'tokens_balance': np.dtype('<u8'),
+    'total_liquidity_tokens': np.dtype('<u8'),
+}
+# `*_out` of SWAP and REMOVE_LIQUIDITY is what the pool owes, whether it is paid in the same group or
+# credited for a WITHDRAW, whose own `*_out` is what the escrow transfers
+EVENT_COLUMNS = {
+    'round': np.dtype('<u8'),
+    'kind': np.dtype('u1'),
+    'sender': np.dtype('V32'),
+    'algos_in': np.dtype('<u8'),
+    'tokens_in': np.dtype('<u8'),
+    'algos_out': np.dtype('<u8'),
+    'tokens_out': np.dtype('<u8'),
+    'liquidity_tokens': np.dtype('<u8'),
+}
+TABLES = {'snapshots': SNAPSHOT_COLUMNS, 'events': EVENT_COLUMNS}
+
+# Values of the `kind` column
+ADD_LIQUIDITY = 1
+REMOVE_LIQUIDITY = 2
+SWAP = 3
+WITHDRAW = 4
+EVENT_KINDS = {'ADD_LIQUIDITY': ADD_LIQUIDITY, 'REMOVE_LIQUIDITY': REMOVE_LIQUIDITY, 'SWAP': SWAP, 'WITHDRAW': WITHDRAW}
+
+Snapshot = namedtuple('Snapshot', ['round', 'algos_balance', 'tokens_balance', 'total_liquidity_tokens'])
+
+
+def sender_address(value) -> str:
+    return encoding.encode_address(bytes(value))
+
+
+class HistoryStore:
+    """
+    Columnar history files of any number of pools.
+    """
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, app_id: int, table: str, column: str) -> str:
+        return os.path.join(self.directory, str(app_id), table, f'{column}.bin')
+
+    def append(self, app_id: int, table: str, columns: dict):
+        """
+        Append rows given as one sequence per column, rounds must not go backwards.
+        """
+        dtypes = TABLES[table]
+        arrays = {name: np.asarray(columns[name], dtype=dtype) for name, dtype in dtypes.items()}
+        lengths = {len(array) for array in arrays.values()}
+        if len(lengths) != 1:
+            raise ValueError('columns differ in length')
+        if not lengths.pop():
+            return
+        rounds = arrays['round']
+        last = self.read(app_id, table)['round']
+        if np.any(rounds[1:] < rounds[:-1]) or (len(last) and rounds[0] < last[-1]):
+            raise ValueError('rounds must not go backwards')
+
+        os.makedirs(os.path.dirname(self._path(app_id, table, 'round')), exist_ok=True)
+        # Drop what a torn append left past the complete rows, the new rows would not line up otherwise
+        for name, dtype in dtypes.items():
+            path = self._path(app_id, table, name)
+            if os.path.exists(path) and os.path.getsize(path) > len(last) * dtype.itemsize:
+                os.truncate(path, len(last) * dtype.itemsize)
+        # `round` goes last: a crash in between leaves rows that readers do not count yet
+        for name in sorted(dtypes, key=lambda name: name == 'round'):
+            with open(self._path(app_id, table, name), 'ab') as f:
+                f.write(arrays[name].tobytes())
+
+    def read(self, app_id: int, table: str) -> dict:
+        """
+        Read-only memory maps of every column, trimmed to the rows that are complete.
+        """
+        dtypes = TABLES[table]
+        sizes = {}
+        for name, dtype in dtypes.items():
+            try:
+                sizes[name] = os.path.getsize(self._path(app_id, table, name)) // dtype.itemsize
+            except FileNotFoundError:
+                sizes[name] = 0
+        rows = min(sizes.values())
+        if not rows:
+            return {name: np.empty(0, dtype=dtype) for name, dtype in dtypes.items()}
+        return {
+            name: np.memmap(self._path(app_id, table, name), dtype=dtype, mode='r', shape=(rows,))
+            for name, dtype in dtypes.items()
+        }
+
+    def snapshots(self, app_id: int) -> dict:
+        return self.read(app_id, 'snapshots')
+
+    def events(self, app_id: int) -> dict:
+        return self.read(app_id, 'events')
+
+    def snapshot_at(self, app_id: int, round_num: int) -> Snapshot:
+        """
+        Pool state as of the end of `round_num`, None before the first snapshot.
+        """
+        columns = self.snapshots(app_id)
+        index = np.searchsorted(columns['round'], round_num, side='right') - 1
+        if index < 0:
+            return None
+        return Snapshot(*(int(columns[name][index]) for name in SNAPSHOT_COLUMNS))
+
+    def between(self, app_id: int, table: str, start_round: int, end_round: int) -> dict:
+        """
+        Views of the rows from `start_round` up to and including `end_round`.
+        """
+        columns = self.read(app_id, table)
+        start = np.searchsorted(columns['round'], start_round, side='left')
+        end = np.searchsorted(columns['round'], end_round, side='right')
+        return {name: column[start:end] for name, column in columns.items()}
+
+
+class HistoryRecorder:
+    """
+    Turns indexer events into history rows.
+
+    Subscribe `record` to a `PoolIndexer`. A snapshot is taken for every
+    round that changed a pool, with the state at the end of that round.
+    Rows are buffered until `flush()`.
+    """
+    def __init__(self, store: HistoryStore):
+        self.store = store
+        self._state = {}
+        self._snapshots = {}
+        self._events = {}
+
+    def attach(self, indexer):
+        """
+        Start from the current replica of `indexer` and record its events from now on.
+        """
+        for app_id in indexer.app_ids:
+            self._state[app_id] = indexer.global_state(app_id)
+        indexer.subscribe(self.record)
+
+    def record(self, event):
+        state = self._state.setdefault(event.app_id, {})
+        before = dict(state)
+        state.update(event.delta['global'])
+
+        if any(key in event.delta['global'] for key in ('ALGOS_BALANCE', 'TOKENS_BALANCE', 'TOTAL_LIQUIDITY_TOKENS')):
+            snapshots = self._snapshots.setdefault(event.app_id, {})
+            # Later calls of the same round overwrite the earlier snapshot
+            snapshots[event.round] = (
+                state.get('ALGOS_BALANCE') or 0,
+                state.get('TOKENS_BALANCE') or 0,
+                state.get('TOTAL_LIQUIDITY_TOKENS') or 0,
+            )
+
+        kind = EVENT_KINDS.get(event.method)
+        if kind is not None:
+            self._events.setdefault(event.app_id, []).append(self._event_row(event, kind, before, state))
+
+    @staticmethod
+    def _event_row(event, kind, before, after) -> tuple:
+        escrow = after.get('ESCROW_ADDR')
+        escrow = encoding.encode_address(base64.b64decode(escrow)) if escrow else None
+        algos_in = tokens_in = algos_out = tokens_out = 0
+        for transfer in event.transfers:
+            if transfer.receiver == escrow:
+                if transfer.asset_index is None:
+                    algos_in += transfer.amount
+                else:
+                    tokens_in += transfer.amount
+            elif transfer.sender == escrow:
+                if transfer.asset_index is None:
+                    algos_out += transfer.amount
+                else:
+                    tokens_out += transfer.amount
+
+        # Amounts credited for a later withdrawal instead of paid out in the group
+        local = event.delta['local'].get(event.sender) or {}
+        if kind in (SWAP, REMOVE_LIQUIDITY):
+            algos_out += local.get('ALGOS_TO_WITHDRAW') or 0
+            tokens_out += local.get('TOKENS_TO_WITHDRAW') or 0
+
+        total_before = before.get('TOTAL_LIQUIDITY_TOKENS') or 0
+        total_after = after.get('TOTAL_LIQUIDITY_TOKENS') or 0
+        return (
+            event.round,
+            kind,
+            encoding.decode_address(event.sender),
+            algos_in,
+            tokens_in,
+            algos_out,
+            tokens_out,
+            abs(total_after - total_before),
+        )
+
+    def flush(self):
+        for app_id, snapshots in self._snapshots.items():
+            rounds = sorted(snapshots)
+            values = [snapshots[round_num] for round_num in rounds]
+            self.store.append(app_id, 'snapshots', {
+                'round': rounds,
+                'algos_balance': [value[0] for value in values],
+                'tokens_balance': [value[1] for value in values],
+                'total_liquidity_tokens': [value[2] for value in values],
+            })
+        for app_id, rows in self._events.items():
+            self.store.append(app_id, 'events', {
+                name: np.array([row[i] for row in rows], dtype=dtype) if name != 'sender'
+                else np.frombuffer(b''.join(row[i] for row in rows), dtype=dtype)
+                for i, (name, dtype) in enumerate(EVENT_COLUMNS.items())
+            })
+        self._snapshots = {}
+        self._events = {}
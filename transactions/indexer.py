@@ -0,0 +1,336 @@
+import os
+import json
+import base64
+import tempfile
+import threading
+from collections import namedtuple
+
+import msgpack
+from algosdk import encoding
+
+from transactions.reader import decode_state
+
+# OnCompletion values of `apan`, a missing value is NoOp
+ON_COMPLETION = {1: 'OptIn', 2: 'CloseOut', 3: 'ClearState', 4: 'UpdateApplication', 5: 'DeleteApplication'}
+
+# ValueDelta actions of `at`
+SET_BYTES = 1
+SET_UINT = 2
+DELETE = 3
+
+# `delta` holds the changed 'global' values and 'local' values by address, None for deleted keys
+PoolEvent = namedtuple('PoolEvent', ['round', 'app_id', 'sender', 'method', 'transfers', 'delta'])
+Transfer = namedtuple('Transfer', ['sender', 'receiver', 'amount', 'asset_index'])
+
+
+def decode_block(raw: bytes) -> dict:
+    # algod writes state keys and byte values as msgpack strings holding arbitrary bytes
+    return msgpack.unpackb(raw, raw=False, strict_map_key=False, unicode_errors='surrogateescape')['block']
+
+
+def _bytes(value) -> bytes:
+    if isinstance(value, str):
+        return value.encode('utf-8', 'surrogateescape')
+    return value
+
+
+def _address(value) -> str:
+    return encoding.encode_address(_bytes(value))
+
+
+def _method(stxn: dict) -> str:
+    txn = stxn['txn']
+    if 'apid' not in txn:
+        return 'create'
+    on_completion = txn.get('apan')
+    if on_completion:
+        return ON_COMPLETION.get(on_completion, str(on_completion))
+    args = txn.get('apaa') or []
+    return _bytes(args[0]).decode('utf-8', 'replace') if args else ''
+
+
+def _transfer(txn: dict) -> Transfer:
+    if txn.get('type') == 'pay':
+        return Transfer(_address(txn['snd']), _address(txn['rcv']) if 'rcv' in txn else None, txn.get('amt', 0), None)
+    return Transfer(
+        _address(txn['snd']), _address(txn['arcv']) if 'arcv' in txn else None, txn.get('aamt', 0), txn.get('xaid', 0)
+    )
+
+
+def _groups(stxns):
+    """
+    Split the transactions of a block into their groups.
+    """
+    group, group_id = [], None
+    for stxn in stxns:
+        grp = stxn['txn'].get('grp')
+        if group and (grp is None or grp != group_id):
+            yield group
+            group = []
+        group.append(stxn)
+        group_id = grp
+    if group:
+        yield group
+
+
+def _encode_value(value):
+    if isinstance(value, bytes):
+        return {'bytes': base64.b64encode(value).decode()}
+    return {'uint': value}
+
+
+def _decode_value(value):
+    if 'bytes' in value:
+        return base64.b64decode(value['bytes'])
+    return value['uint']
+
+
+def _as_key_value(state: dict) -> list:
+    # Same shape as algod state, so decode_state() turns it into the usual dict
+    return [
+        {'key': base64.b64encode(key).decode(), 'value': {
+            'type': SET_BYTES, 'bytes': base64.b64encode(value).decode(), 'uint': 0,
+        } if isinstance(value, bytes) else {'type': SET_UINT, 'bytes': '', 'uint': value}}
+        for key, value in state.items()
+    ]
+
+
+class PoolIndexer:
+    """
+    In-memory replica of the global and local state of ASASwap applications.
+
+    Follows blocks from algod and applies the state deltas (`dt`) that every
+    application call records, so the replica matches the ledger without
+    re-running the contract. The replica is complete when following starts
+    at or before the creation of an application, or from a checkpoint.
+    Reads never touch algod.
+    """
+    def __init__(
+        self,
+        client,
+        app_ids,
+        checkpoint_path: str = None,
+        checkpoint_interval: int = 100,
+        start_round: int = 1,
+        block_time: float = 4.5,
+    ):
+        self.client = client
+        self.checkpoint_path = checkpoint_path
+        self.checkpoint_interval = checkpoint_interval
+        self.block_time = block_time
+        self.last_round = start_round - 1
+        self._global = {app_id: {} for app_id in app_ids}
+        self._local = {app_id: {} for app_id in app_ids}
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = None
+        self._checkpointed = self.last_round
+        if checkpoint_path is not None and os.path.exists(checkpoint_path):
+            self.load_checkpoint()
+
+    # Reads
+
+    @property
+    def app_ids(self) -> list:
+        return list(self._global)
+
+    def global_state(self, app_id: int) -> dict:
+        with self._lock:
+            return decode_state(_as_key_value(self._global[app_id]))
+
+    def local_state(self, app_id: int, address: str) -> dict:
+        """
+        Local state of an account, None when it is not opted in.
+        """
+        with self._lock:
+            state = self._local[app_id].get(address)
+            return decode_state(_as_key_value(state)) if state is not None else None
+
+    def accounts(self, app_id: int) -> list:
+        with self._lock:
+            return list(self._local[app_id])
+
+    def pending_withdrawals(self, app_id: int) -> dict:
+        """
+        ALGOS_TO_WITHDRAW and TOKENS_TO_WITHDRAW of every account that has any.
+        """
+        with self._lock:
+            return {
+                address: (state.get(b'ALGOS_TO_WITHDRAW', 0), state.get(b'TOKENS_TO_WITHDRAW', 0))
+                for address, state in self._local[app_id].items()
+                if state.get(b'ALGOS_TO_WITHDRAW') or state.get(b'TOKENS_TO_WITHDRAW')
+            }
+
+    def quote_swap(self, app_id: int, amounts, asset_in, ratio_decimal_points: int, fee_pct: int):
+        from contracts.quote import quote_swap
+
+        with self._lock:
+            state = self._global[app_id]
+            algos_balance = state.get(b'ALGOS_BALANCE', 0)
+            tokens_balance = state.get(b'TOKENS_BALANCE', 0)
+        return quote_swap(amounts, asset_in, algos_balance, tokens_balance, ratio_decimal_points, fee_pct)
+
+    def subscribe(self, callback):
+        """
+        Call `callback` with a PoolEvent for every applied application call.
+        """
+        self._listeners.append(callback)
+
+    # Block processing
+
+    def process_block(self, round_num: int, block: dict):
+        events = []
+        with self._lock:
+            for group in _groups(block.get('txns') or []):
+                for stxn in group:
+                    event = self._apply(round_num, stxn, group)
+                    if event is not None:
+                        events.append(event)
+            self.last_round = round_num
+        for event in events:
+            for callback in self._listeners:
+                callback(event)
+
+    def _apply(self, round_num: int, stxn: dict, group: list):
+        txn = stxn['txn']
+        if txn.get('type') != 'appl':
+            return None
+        app_id = txn.get('apid') or stxn.get('apid')
+        if app_id not in self._global:
+            return None
+
+        sender = _address(txn['snd'])
+        method = _method(stxn)
+        local = self._local[app_id]
+        if method == 'OptIn':
+            local[sender] = {}
+
+        delta = stxn.get('dt') or {}
+        changed = {'global': self._apply_delta(self._global[app_id], delta.get('gd')), 'local': {}}
+        addresses = [sender] + [_address(address) for address in txn.get('apat') or []]
+        for index, changes in (delta.get('ld') or {}).items():
+            state = local.setdefault(addresses[index], {})
+            changed['local'][addresses[index]] = self._apply_delta(state, changes)
+
+        if method in ('CloseOut', 'ClearState'):
+            local.pop(sender, None)
+        elif method == 'DeleteApplication':
+            self._global[app_id] = {}
+            self._local[app_id] = {}
+
+        transfers = [_transfer(other['txn']) for other in group if other['txn'].get('type') in ('pay', 'axfer')]
+        return PoolEvent(round_num, app_id, sender, method, transfers, changed)
+
+    @staticmethod
+    def _apply_delta(state: dict, changes: dict) -> dict:
+        changed = {}
+        for key, value in (changes or {}).items():
+            key = _bytes(key)
+            action = value.get('at')
+            if action == SET_BYTES:
+                state[key] = _bytes(value.get('bs', b''))
+            elif action == SET_UINT:
+                state[key] = value.get('ui', 0)
+            elif action == DELETE:
+                state.pop(key, None)
+            changed[key] = state.get(key)
+        # Decoded like the rest of the reads, deleted keys are left as None
+        decoded = decode_state(_as_key_value({key: value for key, value in changed.items() if value is not None}))
+        for key, value in changed.items():
+            if value is None:
+                decoded[key.decode('utf-8', 'replace')] = None
+        return decoded
+
+    def fetch_block(self, round_num: int):
+        raw = self.client.block_info(round_num, response_format='msgpack')
+        self.process_block(round_num, decode_block(raw))
+
+    def catch_up(self, stopped: threading.Event = None):
+        """
+        Apply every block up to the last round of the node, or until `stopped` is set.
+        """
+        last_round = self.client.status()['last-round']
+        while self.last_round < last_round and not (stopped is not None and stopped.is_set()):
+            self.fetch_block(self.last_round + 1)
+            if self.last_round - self._checkpointed >= self.checkpoint_interval:
+                self.save_checkpoint()
+        return self.last_round
+
+    # Checkpoints
+
+    def save_checkpoint(self):
+        if self.checkpoint_path is None:
+            return
+        with self._lock:
+            data = {
+                'round': self.last_round,
+                'apps': {
+                    str(app_id): {
+                        'global': {key.hex(): _encode_value(value) for key, value in self._global[app_id].items()},
+                        'local': {
+                            address: {key.hex(): _encode_value(value) for key, value in state.items()}
+                            for address, state in self._local[app_id].items()
+                        },
+                    } for app_id in self._global
+                },
+            }
+        directory = os.path.dirname(os.path.abspath(self.checkpoint_path))
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first so a crash never leaves a truncated checkpoint
+        fd, tmp_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.checkpoint_path)
+        self._checkpointed = data['round']
+
+    def load_checkpoint(self):
+        with open(self.checkpoint_path) as f:
+            data = json.load(f)
+        with self._lock:
+            for app_id, app in data['apps'].items():
+                app_id = int(app_id)
+                if app_id not in self._global:
+                    continue
+                self._global[app_id] = {
+                    bytes.fromhex(key): _decode_value(value) for key, value in app['global'].items()
+                }
+                self._local[app_id] = {
+                    address: {bytes.fromhex(key): _decode_value(value) for key, value in state.items()}
+                    for address, state in app['local'].items()
+                }
+            self.last_round = self._checkpointed = data['round']
+
+    # Following
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            # Each thread has its own event, so one that is still stopping never runs on after a restart
+            self._stopped = threading.Event()
+            self._thread = threading.Thread(
+                target=self._follow_blocks, args=(self._stopped,), name='pool-indexer', daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: float = None):
+        """
+        Stop following blocks, wait up to `timeout` seconds, `block_time` by default, for the thread to exit
+        and save a checkpoint.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if self._stopped is not None:
+                self._stopped.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(self.block_time if timeout is None else timeout)
+        self.save_checkpoint()
+
+    def _follow_blocks(self, stopped: threading.Event):
+        while not stopped.is_set():
+            try:
+                self.catch_up(stopped)
+                self.client.status_after_block(self.last_round)
+            except Exception:
+                stopped.wait(1)
@@ -0,0 +1,431 @@
+"""
+Load generator for a single pool.
+
+Creates and funds many accounts, opts them in to a freshly deployed pool
+and submits a weighted mix of SWAP, ADD_LIQUIDITY, REMOVE_LIQUIDITY and
+WITHDRAW groups at a target rate. Confirmations are taken from the blocks
+that a PoolIndexer follows, which also provides the state every group is
+built from. Run with:
+
+    python -m transactions.loadtest --accounts 200 --rate 50 --duration 60 --mix swap=6,withdraw=3,add=1
+
+`NETWORK=local` runs against the in-process ledger, any other network needs
+a funded `--dispenser-key` (or `DISPENSER_PRIV_KEY`).
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from algosdk import account, mnemonic
+from algosdk.future import transaction
+
+from transactions.batch import OnboardRequest, onboard_calls, send_groups, sign_groups
+from transactions.factory import PoolFactory
+from transactions.indexer import PoolIndexer
+from transactions.local import LocalClient
+from transactions.metrics import classify_rejection
+from transactions.main import (
+    assign_group_id,
+    create_asset,
+    fund_account,
+    sign_group,
+    swap_group,
+    withdraw_group,
+    add_liquidity_group,
+    remove_liquidity_group,
+)
+from transactions.utils import get_client, wait_for_confirmation
+
+OPERATIONS = ('swap', 'add_liquidity', 'remove_liquidity', 'withdraw')
+DEFAULT_MIX = {'swap': 6, 'withdraw': 3, 'add_liquidity': 1, 'remove_liquidity': 1}
+# Short names accepted by parse_mix
+ALIASES = {'add': 'add_liquidity', 'remove': 'remove_liquidity'}
+
+ASSET_TOTAL = 10 ** 15
+# Account, asset holding and local state (3 uints) minimum balances
+ACCOUNT_MIN_BALANCE = 100000 + 100000 + 100000 + 3 * 28500
+
+
+def parse_mix(text: str) -> dict:
+    """
+    Parse `swap=6,withdraw=3,...` into weights by operation.
+    """
+    mix = {}
+    for item in filter(None, (part.strip() for part in text.split(','))):
+        name, _, weight = item.partition('=')
+        name = ALIASES.get(name.strip(), name.strip())
+        if name not in OPERATIONS:
+            raise ValueError(f'unknown operation {name!r}, expected one of {", ".join(OPERATIONS)}')
+        mix[name] = float(weight) if weight else 1.0
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError('the mix needs at least one operation with a positive weight')
+    return mix
+
+
+def percentile(values, pct: float):
+    """
+    Nearest-rank percentile of `values`, None when there are none.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+class LoadReport:
+    """
+    Outcome of a load run.
+
+    Latencies are measured from submission until the indexer applied the
+    block holding the group, in seconds and in rounds.
+    """
+    def __init__(self):
+        self.started_at = None
+        self.duration = 0.0
+        self.submitted = Counter()
+        self.confirmed = Counter()
+        self.rejections = Counter()
+        self.skipped = 0
+        self.groups_per_round = Counter()
+        self.latencies = []
+        self.round_latencies = []
+
+    @property
+    def sustained_groups_per_round(self) -> float:
+        if not self.groups_per_round:
+            return 0.0
+        rounds = max(self.groups_per_round) - min(self.groups_per_round) + 1
+        return sum(self.groups_per_round.values()) / rounds
+
+    def as_dict(self) -> dict:
+        return {
+            'duration': self.duration,
+            'submitted': dict(self.submitted),
+            'confirmed': dict(self.confirmed),
+            'rejected': sum(self.rejections.values()),
+            'skipped': self.skipped,
+            'groups_per_second': sum(self.confirmed.values()) / self.duration if self.duration else 0.0,
+            'groups_per_round': {
+                'sustained': self.sustained_groups_per_round,
+                'peak': max(self.groups_per_round.values(), default=0),
+            },
+            'latency': {f'p{pct}': percentile(self.latencies, pct) for pct in (50, 90, 99)},
+            'latency_rounds': {f'p{pct}': percentile(self.round_latencies, pct) for pct in (50, 90, 99)},
+            'rejections': dict(self.rejections.most_common()),
+        }
+
+    def format(self) -> str:
+        data = self.as_dict()
+        lines = [f'{"operation":<20}{"submitted":>10}{"confirmed":>10}']
+        for name in OPERATIONS:
+            if self.submitted[name]:
+                lines.append(f'{name:<20}{self.submitted[name]:>10}{self.confirmed[name]:>10}')
+        lines.append(f'duration: {data["duration"]:.1f}s, {data["groups_per_second"]:.2f} confirmed groups/s')
+        rounds = data['groups_per_round']
+        lines.append(f'groups per round: {rounds["sustained"]:.2f} sustained, {rounds["peak"]} peak')
+        for label, key, unit in (('latency', 'latency', 's'), ('latency in rounds', 'latency_rounds', '')):
+            values = ', '.join(
+                f'{name} {value:.3f}{unit}' if isinstance(value, float) else f'{name} {value}'
+                for name, value in data[key].items()
+            )
+            lines.append(f'{label}: {values}')
+        lines.append(f'skipped, no idle account: {self.skipped}')
+        lines.append(f'rejected: {data["rejected"]}')
+        for cause, count in self.rejections.most_common():
+            lines.append(f'  {count:>8}  {cause}')
+        return '\n'.join(lines)
+
+
+class LoadTest:
+    """
+    Drives a configurable mix of pool calls from many accounts.
+
+    Every account has at most one group in flight, so it is always built
+    from settled state: a pending withdrawal is withdrawn before the account
+    swaps or removes liquidity again, which the contract would reject.
+    """
+    def __init__(
+        self,
+        client,
+        funder,
+        funder_priv_key,
+        accounts: int = 100,
+        mix: dict = None,
+        algos_funding: int = 10000000,
+        tokens_funding: int = 10000000,
+        max_swap: int = 100000,
+        seed: int = None,
+        max_workers: int = 16,
+    ):
+        self.client = client
+        self.funder = funder
+        self.funder_priv_key = funder_priv_key
+        self.accounts_count = accounts
+        self.mix = mix or DEFAULT_MIX
+        self.algos_funding = algos_funding
+        self.tokens_funding = tokens_funding
+        self.max_swap = max_swap
+        self.random = random.Random(seed)
+        self.max_workers = max_workers
+        self.accounts = []
+        self.pool = None
+        self.indexer = None
+        self.report = LoadReport()
+        self._lsig = None
+        self._params = None
+        self._idle = []
+        self._in_flight = {}
+        self._lock = threading.Lock()
+
+    # Setup
+
+    def _confirm(self, tx_ids):
+        errors = [tx_id for tx_id in tx_ids if isinstance(tx_id, Exception)]
+        if errors:
+            raise RuntimeError(f'{len(errors)} setup groups were rejected, first: {errors[0]}')
+        for tx_id in dict.fromkeys(tx_ids):
+            wait_for_confirmation(self.client, tx_id)
+
+    def _send_chunked(self, sender_priv_key, txns):
+        groups = [
+            assign_group_id(txns[i:i + 16]) if len(txns[i:i + 16]) > 1 else txns[i:i + 16]
+            for i in range(0, len(txns), 16)
+        ]
+        signers = [[sender_priv_key] * len(group) for group in groups]
+        self._confirm(send_groups(self.client, sign_groups(groups, signers)))
+
+    def setup(self):
+        """
+        Create the asset and the pool, then fund, opt in and supply every account.
+        """
+        sp = self.client.suggested_params()
+        self.accounts = [account.generate_account() for _ in range(self.accounts_count)]
+        funding = ACCOUNT_MIN_BALANCE + self.algos_funding
+
+        operator_priv_key, operator = account.generate_account()
+        liquidity = self.algos_funding * max(1, self.accounts_count)
+        wait_for_confirmation(self.client, fund_account(
+            self.client, self.funder, self.funder_priv_key, sp, operator, 2 * liquidity + 10000000
+        ))
+
+        asset_index = wait_for_confirmation(
+            self.client, create_asset(self.client, operator, operator_priv_key, sp, ASSET_TOTAL, 0)
+        )['asset-index']
+        # The indexer replays the pool from its creation on
+        start_round = self.client.status()['last-round'] + 1
+        self.pool = PoolFactory(self.client, operator, operator_priv_key, sp).deploy([asset_index]).pools[0]
+
+        self._confirm(onboard_calls(
+            self.client, sp, self.funder, self.funder_priv_key,
+            [OnboardRequest(address, priv_key, funding) for priv_key, address in self.accounts]
+            + [OnboardRequest(operator, operator_priv_key)],
+            self.pool.app_id, asset_index,
+        ))
+
+        self._send_chunked(operator_priv_key, [
+            transaction.AssetTransferTxn(operator, sp, address, self.tokens_funding, asset_index)
+            for _, address in self.accounts
+        ])
+        # Seed the pool at 1 Algo to 10 tokens, deep enough for every account to trade against
+        seed_group = add_liquidity_group(
+            operator, sp, self.pool.app_id, self.pool.escrow_addr, 10 * liquidity, liquidity, asset_index
+        )
+        self._confirm([self.client.send_transactions(sign_group(seed_group, [operator_priv_key] * 3))])
+
+        self.indexer = PoolIndexer(self.client, [self.pool.app_id], start_round=start_round)
+        self.indexer.subscribe(self._on_event)
+        self._idle = list(range(len(self.accounts)))
+        self.random.shuffle(self._idle)
+
+    # Load
+
+    def _choose(self, address: str) -> str:
+        operation = self.random.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        state = self.indexer.local_state(self.pool.app_id, address) or {}
+        pending = state.get('ALGOS_TO_WITHDRAW') or state.get('TOKENS_TO_WITHDRAW')
+        if pending and operation in ('swap', 'remove_liquidity'):
+            return 'withdraw'
+        if operation == 'withdraw' and not pending:
+            return 'swap'
+        if operation == 'remove_liquidity' and not state.get('USER_LIQUIDITY_TOKENS'):
+            return 'add_liquidity'
+        return operation
+
+    def _group(self, operation: str, address: str, priv_key, sp):
+        pool = self.pool
+        if operation == 'swap':
+            if self.random.random() < 0.5:
+                group = swap_group(address, sp, pool.app_id, self.random.randint(1000, self.max_swap), pool.escrow_addr)
+            else:
+                amount = self.random.randint(1000, 10 * self.max_swap)
+                group = swap_group(address, sp, pool.app_id, amount, pool.escrow_addr, pool.asset_index)
+            return group, [priv_key] * 2
+        if operation == 'withdraw':
+            state = self.indexer.local_state(pool.app_id, address)
+            group = withdraw_group(
+                address, sp, pool.app_id, pool.escrow_addr, pool.asset_index,
+                state['ALGOS_TO_WITHDRAW'], state['TOKENS_TO_WITHDRAW'],
+            )
+            return group, [priv_key] + [self._lsig] * (len(group) - 1)
+        if operation == 'add_liquidity':
+            state = self.indexer.global_state(pool.app_id)
+            algos_amount = self.random.randint(1000, self.max_swap)
+            asset_amount = algos_amount * state['TOKENS_BALANCE'] // state['ALGOS_BALANCE']
+            group = add_liquidity_group(
+                address, sp, pool.app_id, pool.escrow_addr, asset_amount, algos_amount, pool.asset_index
+            )
+            return group, [priv_key] * 3
+        liquidity = self.indexer.local_state(pool.app_id, address)['USER_LIQUIDITY_TOKENS']
+        return remove_liquidity_group(address, sp, pool.app_id, self.random.randint(1, liquidity)), [priv_key]
+
+    def _submit(self, index: int):
+        priv_key, address = self.accounts[index]
+        sp = self._params.get()
+        try:
+            operation = self._choose(address)
+            signed_txns = sign_group(*self._group(operation, address, priv_key, sp))
+        except Exception as e:
+            self._reject(index, address, e)
+            return
+        with self._lock:
+            self._in_flight[address] = (index, operation, time.monotonic(), self.indexer.last_round, sp.last)
+            self.report.submitted[operation] += 1
+        try:
+            self.client.send_transactions(signed_txns)
+        except Exception as e:
+            self._reject(index, address, e)
+
+    def _reject(self, index: int, address: str, error):
+        with self._lock:
+            self._in_flight.pop(address, None)
+            self.report.rejections[classify_rejection(error)] += 1
+            self._idle.append(index)
+
+    def _on_event(self, event):
+        with self._lock:
+            entry = self._in_flight.pop(event.sender, None)
+            if entry is None:
+                return
+            index, operation, submitted_at, submitted_round, _ = entry
+            self.report.confirmed[operation] += 1
+            self.report.groups_per_round[event.round] += 1
+            self.report.latencies.append(time.monotonic() - submitted_at)
+            self.report.round_latencies.append(event.round - submitted_round)
+            self._idle.append(index)
+
+    def _expire(self):
+        last_round = self.indexer.last_round
+        with self._lock:
+            expired = [address for address, entry in self._in_flight.items() if last_round > entry[4]]
+            for address in expired:
+                self._idle.append(self._in_flight.pop(address)[0])
+                self.report.rejections['expired'] += 1
+
+    def run(self, rate: float, duration: float, drain_timeout: float = 30) -> LoadReport:
+        """
+        Submit groups at `rate` per second for `duration` seconds and wait for the stragglers.
+        """
+        from transactions.params import SuggestedParamsProvider
+
+        if self.pool is None:
+            self.setup()
+        self._lsig = self.pool.logicsig()
+        self._params = SuggestedParamsProvider(self.client)
+        self.indexer.catch_up()
+        self.indexer.start()
+        report = self.report
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            started = time.monotonic()
+            report.started_at = time.time()
+            ticks = 0
+            while True:
+                now = time.monotonic()
+                if now - started >= duration:
+                    break
+                due = started + ticks / rate
+                if due > now:
+                    time.sleep(min(due - now, 0.05))
+                    continue
+                ticks += 1
+                with self._lock:
+                    index = self._idle.pop(0) if self._idle else None
+                if index is None:
+                    report.skipped += 1
+                    self._expire()
+                    continue
+                executor.submit(self._submit, index)
+            executor.shutdown(wait=True)
+
+            deadline = time.monotonic() + drain_timeout
+            while self._in_flight and time.monotonic() < deadline:
+                self._expire()
+                time.sleep(0.05)
+            report.duration = time.monotonic() - started
+            with self._lock:
+                if self._in_flight:
+                    report.rejections['unconfirmed'] += len(self._in_flight)
+        finally:
+            executor.shutdown(wait=False)
+            self.indexer.stop()
+            self._params.stop()
+        return report
+
+
+def _funder(client, dispenser_key: str = None):
+    if isinstance(client, LocalClient) and not dispenser_key:
+        priv_key, address = account.generate_account()
+        client.ledger.fund(address, 10 ** 15)
+        return priv_key, address
+    if not dispenser_key:
+        raise SystemExit('a funded --dispenser-key or DISPENSER_PRIV_KEY is required outside NETWORK=local')
+    if len(dispenser_key.split()) == 25:
+        dispenser_key = mnemonic.to_private_key(dispenser_key)
+    return dispenser_key, account.address_from_private_key(dispenser_key)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m transactions.loadtest', description=__doc__.split('\n\n')[0])
+    parser.add_argument('--accounts', type=int, default=100, help='number of accounts to create')
+    parser.add_argument('--rate', type=float, default=20, help='groups submitted per second')
+    parser.add_argument('--duration', type=float, default=60, help='seconds of load')
+    parser.add_argument('--mix', type=parse_mix, default=DEFAULT_MIX, help='weights, e.g. swap=6,withdraw=3,add=1')
+    parser.add_argument('--algos-funding', type=int, default=10000000, help='microalgos to trade with per account')
+    parser.add_argument('--tokens-funding', type=int, default=10000000, help='tokens to trade with per account')
+    parser.add_argument('--max-swap', type=int, default=100000, help='largest swap in microalgos')
+    parser.add_argument('--workers', type=int, default=16, help='concurrent submissions')
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--dispenser-key', default=os.environ.get('DISPENSER_PRIV_KEY'))
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    args = parser.parse_args(argv)
+
+    client = get_client()
+    funder_priv_key, funder = _funder(client, args.dispenser_key)
+    load = LoadTest(
+        client,
+        funder,
+        funder_priv_key,
+        accounts=args.accounts,
+        mix=args.mix,
+        algos_funding=args.algos_funding,
+        tokens_funding=args.tokens_funding,
+        max_swap=args.max_swap,
+        seed=args.seed,
+        max_workers=args.workers,
+    )
+    print(f'setting up {args.accounts} accounts', file=sys.stderr)
+    load.setup()
+    print(f'pool {load.pool.app_id}, {args.rate:g} groups/s for {args.duration:g}s', file=sys.stderr)
+    report = load.run(args.rate, args.duration)
+    print(json.dumps(report.as_dict(), indent=2) if args.json else report.format())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,836 @@
+"""
+In-process stand-in for an algod node in dev mode.
+
+`LocalLedger` applies transaction groups with the rules the contracts rely
+on: fees, minimum balances, signatures, atomic groups, asset holdings,
+application state schemas and TEAL evaluation through contracts.teal.
+`LocalClient` serves the algod REST endpoints the SDK uses from a ledger,
+confirming every accepted group in a block of its own.
+"""
+import re
+import time
+import base64
+import threading
+
+import msgpack
+from nacl.signing import VerifyKey
+from nacl.exceptions import BadSignatureError
+from algosdk import constants, encoding, logic
+from algosdk.error import AlgodHTTPError
+from algosdk.future import transaction
+from algosdk.v2client import algod
+
+from contracts import teal
+
+GENESIS_ID = 'local-v1'
+CONSENSUS_VERSION = 'local'
+MIN_TXN_FEE = 1000
+MIN_BALANCE = 100000
+ASSET_MIN_BALANCE = 100000
+APP_MIN_BALANCE = 100000
+SCHEMA_UINT_MIN_BALANCE = 28500
+SCHEMA_BYTES_MIN_BALANCE = 50000
+MAX_GROUP_SIZE = 16
+MAX_TXN_LIFE = 1000
+MAX_GLOBAL_SCHEMA_ENTRIES = 64
+MAX_LOCAL_SCHEMA_ENTRIES = 16
+MAX_KEY_LEN = 64
+MAX_BYTES_VALUE_LEN = 64
+
+_MISSING = object()
+
+
+class TransactionRejected(Exception):
+    """
+    Raised when the ledger refuses a transaction group.
+    """
+
+
+def _txid(raw_txn: dict) -> bytes:
+    return encoding.checksum(constants.txid_prefix + msgpack.packb(raw_txn, use_bin_type=True))
+
+
+def _encode_txid(digest: bytes) -> str:
+    return base64.b32encode(digest).decode().strip('=')
+
+
+def _decode_signed(raw: dict):
+    if 'lsig' in raw:
+        return transaction.LogicSigTransaction.undictify(raw)
+    if 'sig' in raw:
+        return transaction.SignedTransaction.undictify(raw)
+    return transaction.Transaction.undictify(raw['txn'])
+
+
+def _schema_cost(schema) -> int:
+    if schema is None:
+        return 0
+    return (schema.num_uints or 0) * SCHEMA_UINT_MIN_BALANCE + (schema.num_byte_slices or 0) * SCHEMA_BYTES_MIN_BALANCE
+
+
+def _check_schema(state: dict, schema, what: str):
+    uints = sum(1 for value in state.values() if isinstance(value, int))
+    byte_slices = len(state) - uints
+    if uints > ((schema and schema.num_uints) or 0) or byte_slices > ((schema and schema.num_byte_slices) or 0):
+        raise TransactionRejected(f'{what} state exceeds its schema')
+
+
+def encode_state(state: dict) -> list:
+    """
+    Encode application state as the `key-value` list returned by algod.
+    """
+    return [
+        {
+            'key': base64.b64encode(key).decode(),
+            'value': {'type': 1, 'bytes': base64.b64encode(value).decode(), 'uint': 0}
+            if isinstance(value, bytes)
+            else {'type': 2, 'bytes': '', 'uint': value},
+        }
+        for key, value in state.items()
+    ]
+
+
+def state_delta(before: dict, after: dict) -> dict:
+    """
+    Changes between two states of an application, as the `gd`/`ld` maps of a block EvalDelta.
+    """
+    delta = {}
+    for key, value in after.items():
+        if before.get(key, _MISSING) != value:
+            delta[_delta_key(key)] = {'at': 1, 'bs': value} if isinstance(value, bytes) else {'at': 2, 'ui': value}
+    for key in before.keys() - after.keys():
+        delta[_delta_key(key)] = {'at': 3}
+    return delta
+
+
+def _delta_key(key: bytes):
+    # algod writes keys as msgpack strings
+    try:
+        return key.decode('utf-8')
+    except UnicodeDecodeError:
+        return key
+
+
+def _schema_json(schema) -> dict:
+    return {
+        'num-uint': (schema and schema.num_uints) or 0,
+        'num-byte-slice': (schema and schema.num_byte_slices) or 0,
+    }
+
+
+class LocalLedger:
+    """
+    Accounts, assets and applications of a single-node dev network.
+
+    Every mutation goes through an undo journal so a rejected group leaves
+    no trace. Accepted groups are confirmed immediately in a new block.
+    """
+    def __init__(self, genesis_id: str = GENESIS_ID):
+        self.genesis_id = genesis_id
+        self.genesis_hash = base64.b64encode(encoding.checksum(genesis_id.encode())).decode()
+        self.round = 0
+        self.timestamp = int(time.time())
+        self.last_round_time = time.monotonic()
+        self.accounts = {}
+        self.assets = {}
+        self.apps = {}
+        self.blocks = {
+            0: {'rnd': 0, 'gen': genesis_id, 'gh': base64.b64decode(self.genesis_hash), 'ts': self.timestamp},
+        }
+        self.confirmed = {}
+        self.next_index = 1
+        self.cond = threading.Condition(threading.RLock())
+        # Called with the program, the context and the executed instruction indexes of every evaluation
+        self.tracer = None
+        self._journal = []
+
+    # Journaled mutations
+
+    def _set(self, container: dict, key, value):
+        self._journal.append((container, key, container.get(key, _MISSING)))
+        container[key] = value
+
+    def _del(self, container: dict, key):
+        self._journal.append((container, key, container[key]))
+        del container[key]
+
+    def _rollback(self, savepoint: int):
+        while len(self._journal) > savepoint:
+            container, key, old = self._journal.pop()
+            if old is _MISSING:
+                container.pop(key, None)
+            else:
+                container[key] = old
+
+    def _account(self, address: str) -> dict:
+        account = self.accounts.get(address)
+        if account is None:
+            account = {'amount': 0, 'assets': {}, 'apps': {}, 'created_apps': {}, 'created_assets': {}}
+            self._set(self.accounts, address, account)
+        return account
+
+    def _credit(self, address: str, amount: int):
+        account = self._account(address)
+        self._set(account, 'amount', account['amount'] + amount)
+
+    def _debit(self, address: str, amount: int):
+        account = self.accounts.get(address)
+        balance = account['amount'] if account else 0
+        if balance < amount:
+            raise TransactionRejected(f'overspend (account {address}, balance {balance}, amount {amount})')
+        self._set(account, 'amount', balance - amount)
+
+    def fund(self, address: str, amount: int):
+        """
+        Credit `address` out of thin air, like a genesis allocation.
+        """
+        with self.cond:
+            self._credit(address, amount)
+            self._journal.clear()
+
+    def min_balance(self, address: str) -> int:
+        account = self.accounts.get(address)
+        if account is None:
+            return 0
+        total = MIN_BALANCE + ASSET_MIN_BALANCE * len(account['assets'])
+        for app_id in account['apps']:
+            total += APP_MIN_BALANCE + _schema_cost(self.apps[app_id]['local_schema'])
+        for app_id in account['created_apps']:
+            total += APP_MIN_BALANCE + _schema_cost(self.apps[app_id]['global_schema'])
+        return total
+
+    # Accessors used by the TEAL evaluator
+
+    def _local(self, address: str, app_id: int) -> dict:
+        account = self.accounts.get(address)
+        local = account['apps'].get(app_id) if account else None
+        if local is None:
+            raise teal.TealError(f'{address} has not opted in to app {app_id}')
+        return local
+
+    def _check_value(self, key: bytes, value):
+        if len(key) > MAX_KEY_LEN:
+            raise teal.TealError(f'key too long: length was {len(key)}, maximum is {MAX_KEY_LEN}')
+        if isinstance(value, bytes) and len(value) > MAX_BYTES_VALUE_LEN:
+            raise teal.TealError(f'value too long: length was {len(value)}, maximum is {MAX_BYTES_VALUE_LEN}')
+
+    def app_global_get(self, app_id: int, key: bytes):
+        return self.apps[app_id]['global'].get(key, 0)
+
+    def app_global_get_ex(self, app_id: int, key: bytes):
+        app = self.apps.get(app_id)
+        return app['global'].get(key) if app else None
+
+    def app_global_put(self, app_id: int, key: bytes, value):
+        self._check_value(key, value)
+        self._set(self.apps[app_id]['global'], key, value)
+
+    def app_global_del(self, app_id: int, key: bytes):
+        state = self.apps[app_id]['global']
+        if key in state:
+            self._del(state, key)
+
+    def app_local_get(self, address: str, app_id: int, key: bytes):
+        return self._local(address, app_id).get(key, 0)
+
+    def app_local_get_ex(self, address: str, app_id: int, key: bytes):
+        account = self.accounts.get(address)
+        local = account['apps'].get(app_id) if account else None
+        return local.get(key) if local is not None else None
+
+    def app_local_put(self, address: str, app_id: int, key: bytes, value):
+        self._check_value(key, value)
+        self._set(self._local(address, app_id), key, value)
+
+    def app_local_del(self, address: str, app_id: int, key: bytes):
+        local = self._local(address, app_id)
+        if key in local:
+            self._del(local, key)
+
+    def opted_in(self, address: str, app_id: int) -> bool:
+        account = self.accounts.get(address)
+        return bool(account) and app_id in account['apps']
+
+    def balance(self, address: str) -> int:
+        account = self.accounts.get(address)
+        return account['amount'] if account else 0
+
+    def asset_holding_get(self, address: str, asset_id: int, field: str):
+        account = self.accounts.get(address)
+        holding = account['assets'].get(asset_id) if account else None
+        if holding is None:
+            return None
+        return holding if field == 'AssetBalance' else 0
+
+    def asset_params_get(self, asset_id: int, field: str):
+        params = self.assets.get(asset_id)
+        if params is None:
+            return None
+        if field in ('AssetManager', 'AssetReserve', 'AssetFreeze', 'AssetClawback'):
+            address = params[field[5:].lower()]
+            return encoding.decode_address(address) if address else teal.ZERO_ADDRESS
+        if field == 'AssetTotal':
+            return params['total']
+        if field == 'AssetDecimals':
+            return params['decimals']
+        if field == 'AssetDefaultFrozen':
+            return int(params['default-frozen'])
+        if field == 'AssetUnitName':
+            return params['unit-name'].encode()
+        if field == 'AssetName':
+            return params['name'].encode()
+        if field == 'AssetURL':
+            return params['url'].encode()
+        return params['metadata-hash'] or b''
+
+    # Transaction processing
+
+    def submit(self, signed_txns, raw_txns) -> str:
+        """
+        Verify and apply a group atomically, then confirm it in a new block.
+
+        `raw_txns` are the decoded msgpack dicts of `signed_txns`, needed to
+        check signatures and ids against the exact bytes that were sent.
+        """
+        with self.cond:
+            try:
+                txids, created = self._apply_group(signed_txns, raw_txns)
+            except Exception:
+                self._rollback(0)
+                raise
+            finally:
+                self._journal.clear()
+            self._commit_block(signed_txns, raw_txns, txids, created)
+            return txids[0]
+
+    def _apply_group(self, signed_txns, raw_txns):
+        if not signed_txns or len(signed_txns) > MAX_GROUP_SIZE:
+            raise TransactionRejected(f'group size {len(signed_txns)} is out of range')
+        txns = []
+        for stxn in signed_txns:
+            if not isinstance(stxn, (transaction.SignedTransaction, transaction.LogicSigTransaction)):
+                raise TransactionRejected('transaction is not signed')
+            txns.append(stxn.transaction)
+
+        txids = [_txid(raw['txn']) for raw in raw_txns]
+        for digest in txids:
+            if _encode_txid(digest) in self.confirmed:
+                raise TransactionRejected(f'transaction already in ledger: {_encode_txid(digest)}')
+        self._check_group(txns, raw_txns)
+
+        for i, (stxn, raw) in enumerate(zip(signed_txns, raw_txns)):
+            self._check_validity(stxn.transaction)
+            self._check_signature(stxn, raw, txns, i)
+
+        created = []
+        for i, txn in enumerate(txns):
+            created.append(self._apply(txn, txns, i))
+            for address in {txn.sender, getattr(txn, 'receiver', None)} - {None}:
+                account = self.accounts.get(address)
+                if account is not None and account['amount'] < self.min_balance(address):
+                    raise TransactionRejected(
+                        f'account {address} balance {account["amount"]} below min {self.min_balance(address)}'
+                    )
+        return [_encode_txid(digest) for digest in txids], created
+
+    def _check_group(self, txns, raw_txns):
+        groups = {txn.group for txn in txns}
+        if len(txns) == 1 and groups == {None}:
+            return
+        if len(groups) != 1 or None in groups:
+            raise TransactionRejected('transactions of a group must share a group id')
+        txids = []
+        for raw in raw_txns:
+            ungrouped = {key: value for key, value in raw['txn'].items() if key != 'grp'}
+            txids.append(_txid(ungrouped))
+        encoded = msgpack.packb({'txlist': txids}, use_bin_type=True)
+        if encoding.checksum(constants.tgid_prefix + encoded) != groups.pop():
+            raise TransactionRejected('incomplete group')
+
+    def _check_validity(self, txn):
+        next_round = self.round + 1
+        if not txn.first_valid_round <= next_round <= txn.last_valid_round:
+            raise TransactionRejected(
+                f'txn dead: round {next_round} outside of {txn.first_valid_round}--{txn.last_valid_round}'
+            )
+        if txn.last_valid_round - txn.first_valid_round > MAX_TXN_LIFE:
+            raise TransactionRejected('validity window exceeds the maximum transaction life')
+        if txn.genesis_hash != self.genesis_hash:
+            raise TransactionRejected('genesis hash mismatch')
+        if txn.genesis_id and txn.genesis_id != self.genesis_id:
+            raise TransactionRejected('genesis id mismatch')
+        if txn.fee < MIN_TXN_FEE:
+            raise TransactionRejected(f'fee {txn.fee} below threshold {MIN_TXN_FEE}')
+        if txn.rekey_to:
+            raise TransactionRejected('rekeying is not supported')
+
+    def _check_signature(self, stxn, raw, txns, index):
+        txn = stxn.transaction
+        if isinstance(stxn, transaction.SignedTransaction):
+            if not stxn.signature:
+                raise TransactionRejected('transaction is not signed')
+            if stxn.authorizing_address and stxn.authorizing_address != txn.sender:
+                raise TransactionRejected(f'should have been authorized by {txn.sender}')
+            signer = encoding.decode_address(txn.sender)
+            message = constants.txid_prefix + msgpack.packb(raw['txn'], use_bin_type=True)
+            try:
+                VerifyKey(signer).verify(message, base64.b64decode(stxn.signature))
+            except BadSignatureError:
+                raise TransactionRejected(f'invalid signature for {txn.sender}')
+            return
+
+        lsig = stxn.lsig
+        if lsig.sig or lsig.msig:
+            raise TransactionRejected('delegated logic signatures are not supported')
+        if logic.address(lsig.logic) != txn.sender:
+            raise TransactionRejected(f'logic sig address does not match sender {txn.sender}')
+        if len(lsig.logic) + sum(len(arg) for arg in lsig.args or []) > teal.MAX_LOGIC_SIG_LEN:
+            raise TransactionRejected('logic sig too long')
+        ctx = teal.EvalContext(txns, index, args=lsig.args, round_num=self.round + 1, timestamp=self.timestamp)
+        try:
+            self._evaluate(lsig.logic, ctx)
+        except teal.TealError as e:
+            raise TransactionRejected(f'rejected by logic sig of {txn.sender}: {e}')
+
+    def _evaluate(self, program: bytes, ctx, application: bool = False) -> int:
+        if self.tracer is None:
+            return teal.evaluate(program, ctx, application=application)
+        trace = []
+        try:
+            return teal.evaluate(program, ctx, application=application, trace=trace)
+        finally:
+            self.tracer(program, ctx, trace)
+
+    def _apply(self, txn, txns, index):
+        self._debit(txn.sender, txn.fee)
+        if txn.type == 'pay':
+            return self._apply_payment(txn)
+        if txn.type == 'axfer':
+            return self._apply_asset_transfer(txn)
+        if txn.type == 'acfg':
+            return self._apply_asset_config(txn)
+        if txn.type == 'appl':
+            return self._apply_app_call(txn, txns, index)
+        raise TransactionRejected(f'unsupported transaction type {txn.type}')
+
+    def _apply_payment(self, txn):
+        self._debit(txn.sender, txn.amt)
+        self._credit(txn.receiver, txn.amt)
+        if txn.close_remainder_to:
+            account = self.accounts[txn.sender]
+            if account['assets'] or account['apps'] or account['created_apps']:
+                raise TransactionRejected(f'cannot close account {txn.sender} with assets or applications')
+            self._credit(txn.close_remainder_to, account['amount'])
+            self._del(self.accounts, txn.sender)
+
+    def _apply_asset_transfer(self, txn):
+        asset_id = txn.index
+        params = self.assets.get(asset_id)
+        if params is None:
+            raise TransactionRejected(f'asset {asset_id} does not exist')
+        sender_account = self.accounts[txn.sender]
+
+        if txn.amount == 0 and txn.receiver == txn.sender and not txn.revocation_target:
+            if asset_id not in sender_account['assets']:
+                self._set(sender_account['assets'], asset_id, 0)
+            return
+
+        source = txn.sender
+        if txn.revocation_target:
+            if txn.sender != params['clawback']:
+                raise TransactionRejected(f'{txn.sender} is not the clawback of asset {asset_id}')
+            source = txn.revocation_target
+        source_holdings = self.accounts.get(source, {}).get('assets', {})
+        if asset_id not in source_holdings:
+            raise TransactionRejected(f'{source} has not opted in to asset {asset_id}')
+        receiver = self.accounts.get(txn.receiver)
+        if receiver is None or asset_id not in receiver['assets']:
+            raise TransactionRejected(f'{txn.receiver} has not opted in to asset {asset_id}')
+        if source_holdings[asset_id] < txn.amount:
+            raise TransactionRejected(
+                f'underflow on subtracting {txn.amount} from sender amount {source_holdings[asset_id]}'
+            )
+        self._set(source_holdings, asset_id, source_holdings[asset_id] - txn.amount)
+        self._set(receiver['assets'], asset_id, receiver['assets'][asset_id] + txn.amount)
+
+        if txn.close_assets_to:
+            if txn.sender == params['creator']:
+                raise TransactionRejected('cannot close asset holding of the creator')
+            target = self.accounts.get(txn.close_assets_to)
+            if target is None or asset_id not in target['assets']:
+                raise TransactionRejected(f'{txn.close_assets_to} has not opted in to asset {asset_id}')
+            self._set(target['assets'], asset_id, target['assets'][asset_id] + source_holdings[asset_id])
+            self._del(source_holdings, asset_id)
+
+    def _apply_asset_config(self, txn):
+        if not txn.index:
+            asset_id = self.next_index
+            self.next_index += 1
+            self._set(self.assets, asset_id, {
+                'creator': txn.sender,
+                'total': txn.total or 0,
+                'decimals': txn.decimals or 0,
+                'default-frozen': bool(txn.default_frozen),
+                'unit-name': txn.unit_name or '',
+                'name': txn.asset_name or '',
+                'url': txn.url or '',
+                'metadata-hash': txn.metadata_hash,
+                'manager': txn.manager,
+                'reserve': txn.reserve,
+                'freeze': txn.freeze,
+                'clawback': txn.clawback,
+            })
+            creator = self.accounts[txn.sender]
+            self._set(creator['assets'], asset_id, txn.total or 0)
+            self._set(creator['created_assets'], asset_id, True)
+            return {'asset-index': asset_id}
+
+        params = self.assets.get(txn.index)
+        if params is None:
+            raise TransactionRejected(f'asset {txn.index} does not exist')
+        if txn.sender != params['manager']:
+            raise TransactionRejected(f'{txn.sender} is not the manager of asset {txn.index}')
+        if not any((txn.manager, txn.reserve, txn.freeze, txn.clawback)):
+            creator = self.accounts[params['creator']]
+            if creator['assets'].get(txn.index) != params['total']:
+                raise TransactionRejected('cannot destroy asset: creator is holding only part of it')
+            self._del(creator['assets'], txn.index)
+            self._del(creator['created_assets'], txn.index)
+            self._del(self.assets, txn.index)
+            return
+        updated = dict(params, manager=txn.manager, reserve=txn.reserve, freeze=txn.freeze, clawback=txn.clawback)
+        self._set(self.assets, txn.index, updated)
+
+    def _apply_app_call(self, txn, txns, index):
+        on_complete = int(txn.on_complete or 0)
+        created = None
+        app_id = txn.index
+        if not app_id:
+            app_id = self.next_index
+            self.next_index += 1
+            self._create_app(app_id, txn)
+            created = {'application-index': app_id}
+        app = self.apps.get(app_id)
+        if app is None:
+            raise TransactionRejected(f'application {app_id} does not exist')
+
+        sender = self.accounts[txn.sender]
+        if on_complete == transaction.OnComplete.OptInOC:
+            if app_id in sender['apps']:
+                raise TransactionRejected(f'{txn.sender} has already opted in to app {app_id}')
+            self._set(sender['apps'], app_id, {})
+        elif on_complete in (transaction.OnComplete.CloseOutOC, transaction.OnComplete.ClearStateOC):
+            if app_id not in sender['apps']:
+                raise TransactionRejected(f'{txn.sender} is not opted in to app {app_id}')
+
+        ctx = teal.EvalContext(
+            txns, index, ledger=self, app_id=app_id, round_num=self.round + 1, timestamp=self.timestamp
+        )
+        # Sender first, then Txn.Accounts, numbered like the local deltas of a block
+        addresses = list(dict.fromkeys([txn.sender] + list(txn.accounts or [])))
+        before = self._app_states(app_id, addresses)
+        if on_complete == transaction.OnComplete.ClearStateOC:
+            # A failing clear program only loses its own changes, the account is cleared regardless
+            savepoint = len(self._journal)
+            try:
+                self._evaluate(app['clear'], ctx, application=True)
+            except teal.TealError:
+                self._rollback(savepoint)
+            else:
+                self._check_schemas(app_id, txns)
+            info = dict(created or {}, dt=self._eval_delta(app_id, addresses, before))
+            self._del(sender['apps'], app_id)
+            return info
+
+        try:
+            self._evaluate(app['approval'], ctx, application=True)
+        except teal.TealError as e:
+            raise TransactionRejected(f'transaction rejected by ApprovalProgram of app {app_id}: {e}')
+        self._check_schemas(app_id, txns)
+        info = dict(created or {}, dt=self._eval_delta(app_id, addresses, before))
+
+        if on_complete == transaction.OnComplete.CloseOutOC:
+            self._del(sender['apps'], app_id)
+        elif on_complete == transaction.OnComplete.UpdateApplicationOC:
+            self._check_programs(txn)
+            self._set(app, 'approval', txn.approval_program)
+            self._set(app, 'clear', txn.clear_program)
+        elif on_complete == transaction.OnComplete.DeleteApplicationOC:
+            self._del(self.accounts[app['creator']]['created_apps'], app_id)
+            self._del(self.apps, app_id)
+        return info
+
+    def _app_states(self, app_id: int, addresses) -> tuple:
+        local = []
+        for address in addresses:
+            account = self.accounts.get(address)
+            state = account['apps'].get(app_id) if account else None
+            local.append(dict(state) if state is not None else {})
+        return dict(self.apps[app_id]['global']), local
+
+    def _eval_delta(self, app_id: int, addresses, before) -> dict:
+        global_before, local_before = before
+        global_after, local_after = self._app_states(app_id, addresses)
+        delta = {}
+        global_delta = state_delta(global_before, global_after)
+        if global_delta:
+            delta['gd'] = global_delta
+        local_delta = {}
+        for i, (old, new) in enumerate(zip(local_before, local_after)):
+            changes = state_delta(old, new)
+            if changes:
+                local_delta[i] = changes
+        if local_delta:
+            delta['ld'] = local_delta
+        return delta
+
+    def _check_programs(self, txn):
+        for program in (txn.approval_program, txn.clear_program):
+            if not program:
+                raise TransactionRejected('approval and clear programs are required')
+            if len(program) > teal.MAX_APP_PROGRAM_LEN:
+                raise TransactionRejected(f'program too long: {len(program)} > {teal.MAX_APP_PROGRAM_LEN}')
+            try:
+                teal.check_cost(program, application=True)
+            except teal.TealError as e:
+                raise TransactionRejected(str(e))
+
+    def _create_app(self, app_id: int, txn):
+        self._check_programs(txn)
+        global_schema = txn.global_schema or transaction.StateSchema(0, 0)
+        local_schema = txn.local_schema or transaction.StateSchema(0, 0)
+        if (global_schema.num_uints or 0) + (global_schema.num_byte_slices or 0) > MAX_GLOBAL_SCHEMA_ENTRIES:
+            raise TransactionRejected('global schema too large')
+        if (local_schema.num_uints or 0) + (local_schema.num_byte_slices or 0) > MAX_LOCAL_SCHEMA_ENTRIES:
+            raise TransactionRejected('local schema too large')
+        self._set(self.apps, app_id, {
+            'creator': txn.sender,
+            'approval': txn.approval_program,
+            'clear': txn.clear_program,
+            'global_schema': global_schema,
+            'local_schema': local_schema,
+            'global': {},
+        })
+        self._set(self.accounts[txn.sender]['created_apps'], app_id, True)
+
+    def _check_schemas(self, app_id: int, txns):
+        app = self.apps[app_id]
+        _check_schema(app['global'], app['global_schema'], 'global')
+        addresses = set()
+        for txn in txns:
+            addresses.add(txn.sender)
+            addresses.update(getattr(txn, 'accounts', None) or [])
+        for address in addresses:
+            account = self.accounts.get(address)
+            if account and app_id in account['apps']:
+                _check_schema(account['apps'][app_id], app['local_schema'], 'local')
+
+    def _commit_block(self, signed_txns, raw_txns, txids, created):
+        self.round += 1
+        self.timestamp = max(int(time.time()), self.timestamp)
+        self.last_round_time = time.monotonic()
+        block_txns = []
+        for raw, txid, info in zip(raw_txns, txids, created):
+            stxn = dict(raw)
+            stxn['txn'] = {key: value for key, value in raw['txn'].items() if key not in ('gh', 'gen')}
+            stxn['hgi'] = True
+            info = dict(info or {})
+            delta = info.pop('dt', None)
+            if delta:
+                stxn['dt'] = delta
+            if 'asset-index' in info:
+                stxn['caid'] = info['asset-index']
+            if 'application-index' in info:
+                stxn['apid'] = info['application-index']
+            block_txns.append(stxn)
+            self.confirmed[txid] = dict(info, **{'confirmed-round': self.round, 'pool-error': ''})
+        self.blocks[self.round] = {
+            'rnd': self.round,
+            'gen': self.genesis_id,
+            'gh': base64.b64decode(self.genesis_hash),
+            'ts': self.timestamp,
+            'txns': block_txns,
+        }
+        self.cond.notify_all()
+
+    # JSON views, shaped like the algod v2 responses
+
+    def app_json(self, app_id: int) -> dict:
+        app = self.apps[app_id]
+        return {
+            'id': app_id,
+            'params': {
+                'creator': app['creator'],
+                'approval-program': base64.b64encode(app['approval']).decode(),
+                'clear-state-program': base64.b64encode(app['clear']).decode(),
+                'global-state': encode_state(app['global']),
+                'global-state-schema': _schema_json(app['global_schema']),
+                'local-state-schema': _schema_json(app['local_schema']),
+            },
+        }
+
+    def local_state_json(self, address: str, app_id: int) -> dict:
+        return {
+            'id': app_id,
+            'schema': _schema_json(self.apps[app_id]['local_schema']),
+            'key-value': encode_state(self.accounts[address]['apps'][app_id]),
+        }
+
+    def asset_json(self, asset_id: int) -> dict:
+        params = self.assets[asset_id]
+        params = {key: value for key, value in params.items() if value is not None}
+        if 'metadata-hash' in params:
+            params['metadata-hash'] = base64.b64encode(params['metadata-hash']).decode()
+        return {'index': asset_id, 'params': params}
+
+    def account_json(self, address: str) -> dict:
+        account = self.accounts.get(address) or {
+            'amount': 0, 'assets': {}, 'apps': {}, 'created_apps': {}, 'created_assets': {}
+        }
+        return {
+            'address': address,
+            'amount': account['amount'],
+            'amount-without-pending-rewards': account['amount'],
+            'min-balance': self.min_balance(address),
+            'pending-rewards': 0,
+            'rewards': 0,
+            'reward-base': 0,
+            'round': self.round,
+            'status': 'Offline',
+            'assets': [
+                {
+                    'asset-id': asset_id,
+                    'amount': amount,
+                    'creator': self.assets[asset_id]['creator'],
+                    'is-frozen': False,
+                }
+                for asset_id, amount in account['assets'].items()
+            ],
+            'created-assets': [self.asset_json(asset_id) for asset_id in account['created_assets']],
+            'apps-local-state': [self.local_state_json(address, app_id) for app_id in account['apps']],
+            'created-apps': [self.app_json(app_id) for app_id in account['created_apps']],
+        }
+
+
+class LocalClient(algod.AlgodClient):
+    """
+    AlgodClient served by a LocalLedger instead of a node.
+
+    Only `algod_request` is replaced, so every SDK method and every helper
+    built on them goes through the same request paths as with a real node.
+    """
+    def __init__(self, ledger: LocalLedger = None, wait_timeout: float = 60):
+        super().__init__('', 'local://')
+        self.ledger = ledger or LocalLedger()
+        self.wait_timeout = wait_timeout
+        self._routes = [
+            ('GET', re.compile(r'/status$'), self._status),
+            ('GET', re.compile(r'/status/wait-for-block-after/(\d+)$'), self._status_after_block),
+            ('GET', re.compile(r'/transactions/params$'), self._params),
+            ('POST', re.compile(r'/transactions$'), self._send),
+            ('GET', re.compile(r'/transactions/pending/(\w+)$'), self._pending),
+            ('POST', re.compile(r'/teal/compile$'), self._compile),
+            ('GET', re.compile(r'/accounts/(\w+)$'), self._account),
+            ('GET', re.compile(r'/accounts/(\w+)/applications/(\d+)$'), self._account_app),
+            ('GET', re.compile(r'/applications/(\d+)$'), self._app),
+            ('GET', re.compile(r'/assets/(\d+)$'), self._asset),
+            ('GET', re.compile(r'/blocks/(\d+)$'), self._block),
+            ('GET', re.compile(r'/health$'), lambda data: None),
+        ]
+
+    def algod_request(self, method, requrl, params=None, data=None, headers=None, response_format='json'):
+        for route_method, pattern, handler in self._routes:
+            match = pattern.match(requrl)
+            if match and route_method == method:
+                with self.ledger.cond:
+                    response = handler(data, *match.groups())
+                if response_format != 'json' and not isinstance(response, bytes):
+                    response = msgpack.packb(response, use_bin_type=True)
+                return response
+        raise AlgodHTTPError(f'{method} {requrl} is not supported by the local ledger', 404)
+
+    def _status(self, data):
+        ledger = self.ledger
+        return {
+            'last-round': ledger.round,
+            'last-version': CONSENSUS_VERSION,
+            'next-version': CONSENSUS_VERSION,
+            'next-version-round': ledger.round + 1,
+            'next-version-supported': True,
+            'time-since-last-round': int((time.monotonic() - ledger.last_round_time) * 1e9),
+            'catchup-time': 0,
+            'stopped-at-unsupported-round': False,
+        }
+
+    def _status_after_block(self, data, round_num):
+        self.ledger.cond.wait_for(lambda: self.ledger.round > int(round_num), self.wait_timeout)
+        return self._status(data)
+
+    def _params(self, data):
+        ledger = self.ledger
+        return {
+            'consensus-version': CONSENSUS_VERSION,
+            'fee': 0,
+            'min-fee': MIN_TXN_FEE,
+            'genesis-hash': ledger.genesis_hash,
+            'genesis-id': ledger.genesis_id,
+            'last-round': ledger.round,
+        }
+
+    def _send(self, data):
+        unpacker = msgpack.Unpacker(raw=False, strict_map_key=False)
+        unpacker.feed(data)
+        try:
+            raw_txns = list(unpacker)
+            signed_txns = [_decode_signed(raw) for raw in raw_txns]
+        except Exception as e:
+            raise AlgodHTTPError(f'cannot decode transactions: {e}', 400)
+        try:
+            return {'txId': self.ledger.submit(signed_txns, raw_txns)}
+        except TransactionRejected as e:
+            raise AlgodHTTPError(str(e), 400)
+
+    def _pending(self, data, txid):
+        info = self.ledger.confirmed.get(txid)
+        if info is None:
+            raise AlgodHTTPError('txn does not exist', 404)
+        return dict(info)
+
+    def _compile(self, data):
+        try:
+            program = teal.assemble(data.decode('utf-8'))
+        except teal.TealError as e:
+            raise AlgodHTTPError(str(e), 400)
+        return {'hash': logic.address(program), 'result': base64.b64encode(program).decode()}
+
+    def _account(self, data, address):
+        return self.ledger.account_json(address)
+
+    def _account_app(self, data, address, app_id):
+        ledger = self.ledger
+        app_id = int(app_id)
+        account = ledger.accounts.get(address)
+        if account is None or (app_id not in account['apps'] and app_id not in account['created_apps']):
+            raise AlgodHTTPError('account application info not found', 404)
+        response = {}
+        if app_id in account['apps']:
+            response['app-local-state'] = ledger.local_state_json(address, app_id)
+        if app_id in account['created_apps']:
+            response['created-app'] = ledger.app_json(app_id)['params']
+        return response
+
+    def _app(self, data, app_id):
+        if int(app_id) not in self.ledger.apps:
+            raise AlgodHTTPError('application does not exist', 404)
+        return self.ledger.app_json(int(app_id))
+
+    def _asset(self, data, asset_id):
+        if int(asset_id) not in self.ledger.assets:
+            raise AlgodHTTPError('asset does not exist', 404)
+        return self.ledger.asset_json(int(asset_id))
+
+    def _block(self, data, round_num):
+        block = self.ledger.blocks.get(int(round_num))
+        if block is None:
+            raise AlgodHTTPError(f'failed to retrieve information from the ledger: round {round_num}', 404)
+        return {'block': block}
@@ -1,31 +1,36 @@
-import base64
-
-from pyteal import *
 from algosdk.future import transaction
 
-from contracts.asaswap import escrow
-from transactions.utils import compile_program, int_to_bytes
+from transactions.metrics import operation, phase
+from transactions.reader import StateReader, fetch_global_state
+from transactions.utils import compile_program, int_to_bytes, program_cache, resolve_params
 
 
+@operation
 def create_app(
     client,
     creator,
     creator_priv_key,
     suggested_params,
     asset_index,
+    cache=program_cache,
 ):
-    txn = transaction.ApplicationCreateTxn(
-        creator,
-        suggested_params,
-        transaction.OnComplete.NoOpOC.real,
-        compile_program(client, open('./contracts/state.teal', 'rb').read()),
-        compile_program(client, open('./contracts/clear.teal', 'rb').read()),
-        transaction.StateSchema(num_byte_slices=2, num_uints=4),
-        transaction.StateSchema(num_byte_slices=0, num_uints=3),
-        app_args=[int_to_bytes(asset_index)]
-    )
+    suggested_params = resolve_params(suggested_params)
+    approval_program = compile_program(client, open('./contracts/state.teal', 'rb').read(), cache)
+    clear_program = compile_program(client, open('./contracts/clear.teal', 'rb').read(), cache)
+    with phase('build'):
+        txn = transaction.ApplicationCreateTxn(
+            creator,
+            suggested_params,
+            transaction.OnComplete.NoOpOC.real,
+            approval_program,
+            clear_program,
+            transaction.StateSchema(num_byte_slices=2, num_uints=4),
+            transaction.StateSchema(num_byte_slices=0, num_uints=3),
+            app_args=[int_to_bytes(asset_index)]
+        )
 
-    signed_txn = txn.sign(creator_priv_key)
+    with phase('sign'):
+        signed_txn = txn.sign(creator_priv_key)
     tx_id = client.send_transactions([signed_txn])
 
     return tx_id
@@ -34,9 +39,18 @@ def create_app(
 def create_escrow(
     client,
     app_id,
+    template=None,
 ):
+    if template is not None:
+        # Derive the address offline, without touching the shared escrow.teal
+        return template.address(app_id)
+
+    # PyTeal is only needed here, keep it out of the import path of every client
+    from pyteal import Mode
+    from contracts.asaswap import escrow, to_teal
+
     with open('./contracts/escrow.teal', 'w') as f:
-        escrow_teal = compileTeal(escrow(app_id), Mode.Signature)
+        escrow_teal = to_teal(escrow(app_id), Mode.Signature)
         f.write(escrow_teal)
 
     compile_response = client.compile(open('./contracts/escrow.teal', 'rb').read().decode('utf-8'))
@@ -52,6 +66,7 @@ def create_asset(
     total,
     decimals,
 ):
+    suggested_params = resolve_params(suggested_params)
     txn = transaction.AssetConfigTxn(
         sender,
         sp=suggested_params,
@@ -79,6 +94,7 @@ def fund_account(
     account,
     amount
 ):
+    suggested_params = resolve_params(suggested_params)
     txn = transaction.PaymentTxn(
         sender,
         suggested_params,
@@ -95,8 +111,11 @@ def escrow_opt_in_to_asset(
     suggested_params,
     address,
     asset_index,
+    lsig=None,
 ):
-    lsig = transaction.LogicSig(compile_program(client, open('./contracts/escrow.teal', 'rb').read()))
+    suggested_params = resolve_params(suggested_params)
+    if lsig is None:
+        lsig = escrow_lsig(client)
     asset_opt_in = transaction.AssetTransferTxn(
         address,
         suggested_params,
@@ -116,6 +135,7 @@ def delete_app(
     suggested_params,
     app_id,
 ):
+    suggested_params = resolve_params(suggested_params)
     txn = transaction.ApplicationDeleteTxn(
         creator,
         suggested_params,
@@ -133,6 +153,7 @@ def close_out(
     suggested_params,
     app_id,
 ):
+    suggested_params = resolve_params(suggested_params)
     txn = transaction.ApplicationCloseOutTxn(
         user,
         suggested_params,
@@ -151,6 +172,7 @@ def add_escrow(
     app_id,
     escrow_addr,
 ):
+    suggested_params = resolve_params(suggested_params)
     txn = transaction.ApplicationCallTxn(
         creator,
         suggested_params,
@@ -171,6 +193,7 @@ def opt_in_to_app(
     suggested_params,
     app_id,
 ):
+    suggested_params = resolve_params(suggested_params)
     txn = transaction.ApplicationOptInTxn(
         user,
         suggested_params,
@@ -181,10 +204,33 @@ def opt_in_to_app(
     return tx_id
 
 
-def swap_call(
-    client,
+def assign_group_id(txns):
+    gid = transaction.calculate_group_id(txns)
+    for txn in txns:
+        txn.group = gid
+    return txns
+
+
+@phase('sign')
+def sign_group(txns, signers):
+    """
+    Sign each transaction with its signer, a private key or an escrow LogicSig.
+    """
+    signed_txns = []
+    for txn, signer in zip(txns, signers):
+        if isinstance(signer, transaction.LogicSig):
+            signed_txns.append(transaction.LogicSigTransaction(txn, signer))
+        else:
+            signed_txns.append(txn.sign(signer))
+    return signed_txns
+
+
+def escrow_lsig(client):
+    return transaction.LogicSig(compile_program(client, open('./contracts/escrow.teal', 'rb').read()))
+
+
+def _swap_txns(
     user,
-    user_priv_key,
     suggested_params,
     app_id,
     amount,
@@ -215,69 +261,172 @@ def swap_call(
             amount,
         )
 
-    gid = transaction.calculate_group_id([app_txn, swap_txn])
-    app_txn.group = gid
-    swap_txn.group = gid
+    return [app_txn, swap_txn]
 
-    signed_app_txn = app_txn.sign(user_priv_key)
-    signed_swap_txn = swap_txn.sign(user_priv_key)
-    tx_id = client.send_transactions([signed_app_txn, signed_swap_txn])
+
+@phase('build')
+def swap_group(
+    user,
+    suggested_params,
+    app_id,
+    amount,
+    escrow_addr,
+    asset_index=None
+):
+    return assign_group_id(_swap_txns(user, suggested_params, app_id, amount, escrow_addr, asset_index))
+
+
+@operation
+def swap_call(
+    client,
+    user,
+    user_priv_key,
+    suggested_params,
+    app_id,
+    amount,
+    escrow_addr,
+    asset_index=None
+):
+    suggested_params = resolve_params(suggested_params)
+    txns = swap_group(user, suggested_params, app_id, amount, escrow_addr, asset_index)
+    signed_txns = sign_group(txns, [user_priv_key, user_priv_key])
+    tx_id = client.send_transactions(signed_txns)
     return tx_id
 
 
-def withdraw_call(
+@phase('build')
+def swap_settle_group(
+    user,
+    suggested_params,
+    app_id,
+    amount,
+    payout,
+    escrow_addr,
+    asset_index,
+    asset_in=False,
+):
+    """
+    Swap group in which the escrow pays `payout` out to the user right away.
+
+    The user deposits ASA tokens when `asset_in` is set and Algos otherwise,
+    the payout is the other one of the two. Its fee is paid by the pool.
+    """
+    txns = _swap_txns(user, suggested_params, app_id, amount, escrow_addr, asset_index if asset_in else None)
+
+    if asset_in:
+        payout_txn = transaction.PaymentTxn(
+            escrow_addr,
+            suggested_params,
+            user,
+            payout,
+        )
+    else:
+        payout_txn = transaction.AssetTransferTxn(
+            escrow_addr,
+            suggested_params,
+            user,
+            payout,
+            asset_index,
+        )
+
+    return assign_group_id(txns + [payout_txn])
+
+
+@operation
+def swap_settle_call(
     client,
     user,
     user_priv_key,
     suggested_params,
     app_id,
+    amount,
+    payout,
+    escrow_addr,
+    asset_index,
+    asset_in=False,
+    lsig=None,
+):
+    suggested_params = resolve_params(suggested_params)
+    txns = swap_settle_group(user, suggested_params, app_id, amount, payout, escrow_addr, asset_index, asset_in)
+
+    if lsig is None:
+        lsig = escrow_lsig(client)
+    signed_txns = sign_group(txns, [user_priv_key, user_priv_key, lsig])
+    tx_id = client.send_transactions(signed_txns)
+    return tx_id
+
+
+@phase('build')
+def withdraw_group(
+    user,
+    suggested_params,
+    app_id,
     escrow_addr,
     asset_index,
     algos_amount=0,
     asset_amount=0,
 ):
-    app_txn = transaction.ApplicationCallTxn(
+    """
+    Withdraw group with a transfer from the escrow for each non-zero amount.
+
+    With both amounts set the asset transfer comes before the payment.
+    """
+    txns = [transaction.ApplicationCallTxn(
         user,
         suggested_params,
         app_id,
         transaction.OnComplete.NoOpOC.real,
         app_args=['WITHDRAW'.encode('utf-8')]
-    )
-
-    asset_withdraw_txn = transaction.AssetTransferTxn(
-        escrow_addr,
-        suggested_params,
-        user,
-        asset_amount,
-        asset_index,
-    )
-    algos_withdraw_txn = transaction.PaymentTxn(
-        escrow_addr,
-        suggested_params,
-        user,
-        algos_amount,
-    )
+    )]
 
-    gid = transaction.calculate_group_id([app_txn, asset_withdraw_txn, algos_withdraw_txn])
-    app_txn.group = gid
-    asset_withdraw_txn.group = gid
-    algos_withdraw_txn.group = gid
+    if asset_amount:
+        txns.append(transaction.AssetTransferTxn(
+            escrow_addr,
+            suggested_params,
+            user,
+            asset_amount,
+            asset_index,
+        ))
+    if algos_amount or not asset_amount:
+        txns.append(transaction.PaymentTxn(
+            escrow_addr,
+            suggested_params,
+            user,
+            algos_amount,
+        ))
 
-    lsig = transaction.LogicSig(compile_program(client, open('./contracts/escrow.teal', 'rb').read()))
-    signed_asset_withdraw_txn = transaction.LogicSigTransaction(asset_withdraw_txn, lsig)
-    signed_algos_withdraw_txn = transaction.LogicSigTransaction(algos_withdraw_txn, lsig)
-    signed_app_txn = app_txn.sign(user_priv_key)
-    tx_id = client.send_transactions([signed_app_txn, signed_asset_withdraw_txn, signed_algos_withdraw_txn])
-    return tx_id
+    return assign_group_id(txns)
 
 
-def add_liquidity_call(
+@operation
+def withdraw_call(
     client,
     user,
     user_priv_key,
     suggested_params,
     app_id,
     escrow_addr,
+    asset_index,
+    algos_amount=0,
+    asset_amount=0,
+    lsig=None,
+):
+    suggested_params = resolve_params(suggested_params)
+    txns = withdraw_group(user, suggested_params, app_id, escrow_addr, asset_index, algos_amount, asset_amount)
+
+    if lsig is None:
+        lsig = escrow_lsig(client)
+    signed_txns = sign_group(txns, [user_priv_key] + [lsig] * (len(txns) - 1))
+    tx_id = client.send_transactions(signed_txns)
+    return tx_id
+
+
+@phase('build')
+def add_liquidity_group(
+    user,
+    suggested_params,
+    app_id,
+    escrow_addr,
     asset_amount,
     algos_amount,
     asset_index,
@@ -305,28 +454,41 @@ def add_liquidity_call(
         algos_amount,
     )
 
-    gid = transaction.calculate_group_id([app_txn, asset_add_txn, algos_add_txn])
-    app_txn.group = gid
-    asset_add_txn.group = gid
-    algos_add_txn.group = gid
+    return assign_group_id([app_txn, asset_add_txn, algos_add_txn])
+
 
-    signed_app_txn = app_txn.sign(user_priv_key)
-    signed_asset_add_txn = asset_add_txn.sign(user_priv_key)
-    signed_algos_add_txn = algos_add_txn.sign(user_priv_key)
+@operation
+def add_liquidity_call(
+    client,
+    user,
+    user_priv_key,
+    suggested_params,
+    app_id,
+    escrow_addr,
+    asset_amount,
+    algos_amount,
+    asset_index,
+):
+    suggested_params = resolve_params(suggested_params)
+    txns = add_liquidity_group(
+        user,
+        suggested_params,
+        app_id,
+        escrow_addr,
+        asset_amount,
+        algos_amount,
+        asset_index,
+    )
+    signed_txns = sign_group(txns, [user_priv_key] * 3)
 
-    tx_id = client.send_transactions([
-        signed_app_txn,
-        signed_asset_add_txn,
-        signed_algos_add_txn,
-    ])
+    tx_id = client.send_transactions(signed_txns)
 
     return tx_id
 
 
-def remove_liquidity_call(
-    client,
+@phase('build')
+def remove_liquidity_group(
     user,
-    user_priv_key,
     suggested_params,
     app_id,
     amount
@@ -338,33 +500,30 @@ def remove_liquidity_call(
         transaction.OnComplete.NoOpOC.real,
         app_args=['REMOVE_LIQUIDITY'.encode('utf-8'), int_to_bytes(amount)]
     )
+    return [txn]
 
-    signed_txn = txn.sign(user_priv_key)
-    tx_id = client.send_transactions([signed_txn])
+
+@operation
+def remove_liquidity_call(
+    client,
+    user,
+    user_priv_key,
+    suggested_params,
+    app_id,
+    amount
+):
+    suggested_params = resolve_params(suggested_params)
+    txns = remove_liquidity_group(user, suggested_params, app_id, amount)
+
+    signed_txns = sign_group(txns, [user_priv_key])
+    tx_id = client.send_transactions(signed_txns)
     return tx_id
 
 
 def read_local_state(client, addr, app_id):
-    results = client.account_info(addr)
-    local_state = results['apps-local-state'][0]
-    for index in local_state:
-        if local_state[index] == app_id:
-            local_data = {
-                base64.b64decode(key['key']).decode('utf-8'): key['value']['bytes']
-                if key['value']['type'] == 1
-                else key['value']['uint'] for key in local_state['key-value']
-            }
-            return local_data
+    return StateReader(client, app_id).fetch_local_state(addr)
 
 
 def read_global_state(client, addr, app_id):
-    results = client.account_info(addr)
-    apps_created = results['created-apps']
-    for app in apps_created:
-        if app['id'] == app_id:
-            global_data = {
-                base64.b64decode(key['key']).decode('utf-8'): key['value']['bytes']
-                if key['value']['type'] == 1
-                else key['value']['uint'] for key in app['params']['global-state']
-            }
-            return global_data
+    # The application is looked up directly, `addr` is kept for compatibility
+    return fetch_global_state(client, app_id)
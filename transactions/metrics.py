@@ -0,0 +1,282 @@
+"""
+Opt-in latency instrumentation of the transaction helpers.
+
+The helpers of `transactions.main` are marked as operations and their
+steps as phases: build, sign, compile, submit and confirm. Nothing is
+recorded until `enable()` is called with one or more sinks; afterwards
+every operation records the time of each phase, the algod requests it made
+by endpoint and, when it raises, the rejection reason. `flush()` hands the
+collected metrics to the sinks, `PrometheusTextfileSink` writes them in
+the Prometheus text format for the node exporter textfile collector.
+"""
+import os
+import re
+import time
+import bisect
+import tempfile
+import functools
+import threading
+from contextlib import contextmanager
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# Rejections are grouped by the first matching pattern, anything else by its normalized message
+REJECTION_CAUSES = [
+    ('approval program', re.compile(r'ApprovalProgram|logic eval error', re.I)),
+    ('escrow logic sig', re.compile(r'logic sig|LogicSig|rejected by logic', re.I)),
+    ('overspend', re.compile(r'overspend', re.I)),
+    ('below min balance', re.compile(r'below min', re.I)),
+    ('not opted in', re.compile(r'not opted in|has not opted', re.I)),
+    ('already in ledger', re.compile(r'already in ledger', re.I)),
+    ('expired', re.compile(r'txn dead|round outside|expired', re.I)),
+    ('fee too low', re.compile(r'below threshold|fee .* too small', re.I)),
+]
+_ADDRESS = re.compile(r'\b[A-Z2-7]{52,58}\b')
+_NUMBER = re.compile(r'\d+')
+_PATH_ID = re.compile(r'/(?:\d+|[A-Z2-7]{52,58})(?=/|$)')
+
+_registry = None
+_local = threading.local()
+
+
+def classify_rejection(error) -> str:
+    message = str(error)
+    for cause, pattern in REJECTION_CAUSES:
+        if pattern.search(message):
+            return cause
+    return _NUMBER.sub('N', _ADDRESS.sub('ADDR', message))[:80]
+
+
+def endpoint(method: str, requrl: str) -> str:
+    return f'{method} {_PATH_ID.sub("/:id", requrl.split("?")[0])}'
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """
+    Phase timings, request counts and rejections by operation.
+    """
+    def __init__(self, sinks=()):
+        self.sinks = list(sinks)
+        self.phases = {}
+        self.operations = {}
+        self.requests = {}
+        self.rejections = {}
+        self._lock = threading.Lock()
+
+    def observe_phase(self, operation: str, phase: str, seconds: float):
+        with self._lock:
+            self.phases.setdefault((operation, phase), Histogram()).observe(seconds)
+
+    def observe_operation(self, operation: str, seconds: float):
+        with self._lock:
+            self.operations.setdefault(operation, Histogram()).observe(seconds)
+
+    def count_request(self, operation: str, endpoint: str):
+        with self._lock:
+            self.requests[operation, endpoint] = self.requests.get((operation, endpoint), 0) + 1
+
+    def reject(self, operation: str, reason: str):
+        with self._lock:
+            self.rejections[operation, reason] = self.rejections.get((operation, reason), 0) + 1
+
+    def flush(self):
+        for sink in self.sinks:
+            sink.export(self)
+
+
+class PrometheusTextfileSink:
+    """
+    Writes the metrics to `path` in the Prometheus text exposition format.
+    """
+    def __init__(self, path: str, prefix: str = 'asaswap'):
+        self.path = path
+        self.prefix = prefix
+
+    @staticmethod
+    def _labels(labels: tuple, **extra) -> str:
+        pairs = list(labels) + list(extra.items())
+        escaped = (
+            (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            for name, value in pairs
+        )
+        return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+    def _histogram(self, name: str, help_text: str, histograms: dict) -> list:
+        name = f'{self.prefix}_{name}'
+        lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        for labels, histogram in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float('inf'),), histogram.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{name}_bucket{self._labels(labels, le=le)} {cumulative}')
+            lines.append(f'{name}_sum{self._labels(labels)} {histogram.sum!r}')
+            lines.append(f'{name}_count{self._labels(labels)} {histogram.count}')
+        return lines
+
+    def _counter(self, name: str, help_text: str, counts: dict) -> list:
+        name = f'{self.prefix}_{name}'
+        lines = [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        lines.extend(f'{name}{self._labels(labels)} {count}' for labels, count in sorted(counts.items()))
+        return lines
+
+    def render(self, metrics: Metrics) -> str:
+        def labelled(values: dict, *names) -> dict:
+            return {
+                tuple(zip(names, key if isinstance(key, tuple) else (key,))): value
+                for key, value in values.items()
+            }
+
+        with metrics._lock:
+            lines = (
+                self._histogram(
+                    'phase_seconds', 'Time spent in each phase of an operation.',
+                    labelled(metrics.phases, 'operation', 'phase'),
+                )
+                + self._histogram(
+                    'operation_seconds', 'Time spent in each operation.',
+                    labelled(metrics.operations, 'operation'),
+                )
+                + self._counter(
+                    'algod_requests_total', 'algod requests made by each operation.',
+                    labelled(metrics.requests, 'operation', 'endpoint'),
+                )
+                + self._counter(
+                    'rejections_total', 'Operations that raised, by reason.',
+                    labelled(metrics.rejections, 'operation', 'reason'),
+                )
+            )
+        return '\n'.join(lines) + '\n'
+
+    def export(self, metrics: Metrics):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        # The collector must never read a half written file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(fd, 'w') as f:
+            f.write(self.render(metrics))
+        os.replace(tmp_path, self.path)
+
+
+def enable(*sinks, interval: float = None) -> Metrics:
+    """
+    Start recording, and flush to the sinks every `interval` seconds when it is given.
+    """
+    global _registry
+    _registry = Metrics(sinks)
+    if interval:
+        registry = _registry
+
+        def flush_periodically():
+            while _registry is registry:
+                time.sleep(interval)
+                registry.flush()
+
+        threading.Thread(target=flush_periodically, name='metrics-flush', daemon=True).start()
+    return _registry
+
+
+def disable():
+    global _registry
+    registry, _registry = _registry, None
+    if registry is not None:
+        registry.flush()
+
+
+def get_metrics() -> Metrics:
+    return _registry
+
+
+def flush():
+    if _registry is not None:
+        _registry.flush()
+
+
+def _current_operation(default: str) -> str:
+    return getattr(_local, 'operation', None) or default
+
+
+@contextmanager
+def phase(name: str):
+    """
+    Time a phase of the running operation, usable as a decorator too.
+
+    Nested phases of the same name are timed once, by the outermost one.
+    """
+    registry = _registry
+    active = _local.__dict__.setdefault('phases', set())
+    if registry is None or name in active:
+        yield
+        return
+    active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        active.discard(name)
+        registry.observe_phase(_current_operation(name), name, time.perf_counter() - started)
+
+
+def instrument_client(client):
+    """
+    Count the algod requests of `client`, and time transaction submissions as the submit phase.
+    """
+    if getattr(client, '_metrics_instrumented', False) or not hasattr(client, 'algod_request'):
+        return client
+    request = client.algod_request
+
+    def algod_request(method, requrl, *args, **kwargs):
+        registry = _registry
+        if registry is None:
+            return request(method, requrl, *args, **kwargs)
+        registry.count_request(_current_operation('other'), endpoint(method, requrl))
+        if method == 'POST' and requrl == '/transactions':
+            with phase('submit'):
+                return request(method, requrl, *args, **kwargs)
+        return request(method, requrl, *args, **kwargs)
+
+    client.algod_request = algod_request
+    client._metrics_instrumented = True
+    return client
+
+
+def operation(func):
+    """
+    Mark a helper taking the algod client first as an operation.
+
+    Operations called from another operation are accounted to the outer one.
+    """
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        registry = _registry
+        if registry is None or getattr(_local, 'operation', None) is not None:
+            return func(*args, **kwargs)
+        client = args[0] if args else kwargs.get('client')
+        if client is not None:
+            instrument_client(client)
+        _local.operation = name
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            registry.reject(name, classify_rejection(e))
+            raise
+        finally:
+            _local.operation = None
+            registry.observe_operation(name, time.perf_counter() - started)
+    return wrapper
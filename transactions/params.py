@@ -0,0 +1,97 @@
+import time
+import threading
+
+
+class SuggestedParamsProvider:
+    """
+    Suggested params shared by all transaction builders.
+
+    Params are fetched once and refreshed after `ttl_rounds` rounds, long
+    before their validity window of 1000 rounds runs out. With `background`
+    enabled a daemon thread follows new blocks and refreshes them ahead of
+    time, otherwise the age is estimated from `block_time` on every `get()`.
+    After `stop()` the age is estimated too, until `start()` is called again.
+    Every call to `get()` returns a complete snapshot that is never mutated.
+    """
+    def __init__(self, client, ttl_rounds: int = 500, background: bool = True, block_time: float = 4.5):
+        self.client = client
+        self.ttl_rounds = ttl_rounds
+        self.background = background
+        self.block_time = block_time
+        self._params = None
+        self._fetched_at = None
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = None
+        # Set by stop(), so a late get() does not start another thread
+        self._closed = False
+
+    def get(self):
+        params = self._params
+        if params is None or self._expired(params):
+            with self._lock:
+                if self._params is params:
+                    self._fetch()
+                params = self._params
+        if self.background and self._thread is None and not self._closed:
+            self.start()
+        return params
+
+    def refresh(self):
+        with self._lock:
+            self._fetch()
+        return self._params
+
+    def _fetch(self):
+        self._params = self.client.suggested_params()
+        self._fetched_at = time.monotonic()
+
+    def _expired(self, params) -> bool:
+        thread = self._thread
+        if thread is not None and thread.is_alive():
+            # The background thread keeps the params fresh
+            return False
+        return time.monotonic() - self._fetched_at >= self.ttl_rounds * self.block_time
+
+    def observe_round(self, last_round: int):
+        params = self._params
+        if params is None or last_round >= params.first + self.ttl_rounds:
+            self.refresh()
+
+    def start(self):
+        with self._lock:
+            self._closed = False
+            if self._thread is not None and self._thread.is_alive():
+                return
+            # Each thread has its own event, so one that is still stopping never runs on after a restart
+            self._stopped = threading.Event()
+            self._thread = threading.Thread(
+                target=self._follow_blocks, args=(self._stopped,), name='suggested-params', daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: float = None):
+        """
+        Stop the background thread and wait up to `timeout` seconds, `block_time` by default, for it to exit.
+        """
+        with self._lock:
+            self._closed = True
+            thread, self._thread = self._thread, None
+            if self._stopped is not None:
+                self._stopped.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(self.block_time if timeout is None else timeout)
+
+    def _follow_blocks(self, stopped: threading.Event):
+        last_round = None
+        while not stopped.is_set():
+            try:
+                if last_round is None:
+                    last_round = self.client.status()['last-round']
+                else:
+                    last_round = self.client.status_after_block(last_round)['last-round']
+                self.observe_round(last_round)
+            except Exception:
+                # Keep serving the cached params and retry once the node is reachable
+                last_round = None
+                stopped.wait(self.block_time)
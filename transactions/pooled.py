@@ -0,0 +1,305 @@
+"""
+AlgodClient over persistent connections to several algod nodes.
+
+`PooledAlgodClient` keeps a pool of keep-alive HTTP connections per node and
+spreads requests over the nodes that are in sync. Idempotent requests are
+retried on another node, with backoff, when a node fails or answers with a
+server error. A node that fails is left out for a while, and so is a node
+whose last round lags behind the best one. The pending info of a submitted
+transaction is asked from the node that accepted it, the only one sure to
+know about it. Only `algod_request` is replaced, so every SDK method and every
+helper in `transactions.main` works unchanged.
+"""
+import json
+import time
+import threading
+import http.client
+from urllib import parse
+
+from algosdk import constants
+from algosdk.error import AlgodHTTPError
+from algosdk.v2client import algod
+
+# Submitting a transaction twice is harmless but reports an error, so it is only
+# retried when the connection was refused, before anything was sent
+IDEMPOTENT_POSTS = ('/v2/teal/compile', '/v2/teal/dryrun')
+LONG_POLL_PREFIX = '/v2/status/wait-for-block-after/'
+SUBMIT_PATH = '/v2/transactions'
+PENDING_PREFIX = '/v2/transactions/pending/'
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class NodeUnavailable(Exception):
+    """
+    Raised when no node could serve a request.
+    """
+
+
+class ConnectionPool:
+    """
+    Idle keep-alive connections to a single node.
+    """
+    def __init__(self, address: str, size: int = 8, timeout: float = 10):
+        url = parse.urlsplit(address)
+        self.address = address
+        self.scheme = url.scheme or 'http'
+        self.host = url.hostname
+        self.port = url.port
+        self.base_path = url.path.rstrip('/')
+        self.size = size
+        self.timeout = timeout
+        self._idle = []
+        self._lock = threading.Lock()
+
+    def _connect(self, timeout: float):
+        if self.scheme == 'https':
+            return http.client.HTTPSConnection(self.host, self.port, timeout=timeout)
+        return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+    def request(self, method: str, path: str, body=None, headers=None, timeout: float = None):
+        """
+        Send a request and return its status and body, reusing an idle connection when there is one.
+        """
+        timeout = timeout or self.timeout
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        while True:
+            reused = conn is not None
+            if conn is None:
+                conn = self._connect(timeout)
+            elif conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            try:
+                conn.request(method, self.base_path + path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                conn.close()
+                if not reused:
+                    raise
+                # The node closed the idle connection, the request never reached it
+                conn = None
+            except BaseException:
+                conn.close()
+                raise
+
+        if response.will_close:
+            conn.close()
+        else:
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+        return response.status, data
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+class Node:
+    def __init__(self, pool: ConnectionPool):
+        self.pool = pool
+        self.last_round = None
+        self.down_until = 0.0
+        self.failures = 0
+
+    @property
+    def address(self) -> str:
+        return self.pool.address
+
+    def available(self, now: float) -> bool:
+        return now >= self.down_until
+
+    def failed(self, backoff: float, max_backoff: float):
+        self.failures += 1
+        self.down_until = time.monotonic() + min(max_backoff, backoff * 2 ** (self.failures - 1))
+
+    def succeeded(self):
+        self.failures = 0
+        self.down_until = 0.0
+
+
+class PooledAlgodClient(algod.AlgodClient):
+    """
+    AlgodClient that spreads requests over several nodes.
+
+    Nodes more than `max_round_lag` rounds behind the best known node are
+    skipped, their last rounds are refreshed at most every
+    `status_interval` seconds. Failed nodes are skipped for a backoff that
+    doubles with every consecutive failure, up to `max_backoff` seconds.
+
+    The pending info of a transaction goes to the node that accepted it
+    while that node is in sync, so helpers such as `wait_for_confirmation`
+    do not get a 404 from a node the transaction has not reached yet.
+    """
+    def __init__(
+        self,
+        algod_token: str,
+        addresses,
+        headers: dict = None,
+        pool_size: int = 8,
+        timeout: float = 10,
+        long_poll_timeout: float = 70,
+        retries: int = 3,
+        backoff: float = 0.1,
+        max_backoff: float = 30,
+        max_round_lag: int = 2,
+        status_interval: float = 5,
+    ):
+        if isinstance(addresses, str):
+            addresses = [address.strip() for address in addresses.split(',') if address.strip()]
+        if not addresses:
+            raise ValueError('at least one algod address is required')
+        super().__init__(algod_token, addresses[0], headers)
+        self.nodes = [Node(ConnectionPool(address, pool_size, timeout)) for address in addresses]
+        self.long_poll_timeout = long_poll_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_round_lag = max_round_lag
+        self.status_interval = status_interval
+        self._next = 0
+        self._checked_at = None
+        self._lock = threading.Lock()
+        # Node that accepted each transaction id
+        self._submitted = {}
+
+    # Node selection
+
+    def refresh_rounds(self):
+        """
+        Fetch the last round of every available node.
+        """
+        self._checked_at = time.monotonic()
+        for node in self.nodes:
+            if not node.available(time.monotonic()):
+                continue
+            try:
+                status, data = node.pool.request('GET', '/v2/status', headers=self._headers('/status'))
+            except (OSError, http.client.HTTPException):
+                node.failed(self.backoff, self.max_backoff)
+                continue
+            if status == 200:
+                node.last_round = json.loads(data)['last-round']
+                node.succeeded()
+            elif status in RETRY_STATUSES:
+                node.failed(self.backoff, self.max_backoff)
+
+    def in_sync(self) -> list:
+        """
+        Available nodes that are within `max_round_lag` of the best one, spread round-robin.
+        """
+        if self._checked_at is None or time.monotonic() - self._checked_at >= self.status_interval:
+            self.refresh_rounds()
+        now = time.monotonic()
+        nodes = [node for node in self.nodes if node.available(now)]
+        rounds = [node.last_round for node in nodes if node.last_round is not None]
+        if rounds:
+            best = max(rounds)
+            nodes = [
+                node for node in nodes
+                if node.last_round is not None and best - node.last_round <= self.max_round_lag
+            ]
+        with self._lock:
+            start = self._next
+            self._next += 1
+        if not nodes:
+            return []
+        start %= len(nodes)
+        return nodes[start:] + nodes[:start]
+
+    def _candidates(self, pinned: Node = None) -> list:
+        nodes = self.in_sync()
+        if pinned in nodes:
+            nodes.remove(pinned)
+            nodes.insert(0, pinned)
+        # With every node failing or lagging, still try them in order of last round
+        rest = sorted(
+            (node for node in self.nodes if node not in nodes),
+            key=lambda node: -(node.last_round or 0),
+        )
+        return nodes + rest
+
+    def _pinned(self, method: str, path: str) -> Node:
+        if method != 'GET' or not path.startswith(PENDING_PREFIX):
+            return None
+        with self._lock:
+            return self._submitted.get(path[len(PENDING_PREFIX):].split('?')[0])
+
+    def _accepted(self, node: Node, txid: str):
+        with self._lock:
+            if len(self._submitted) > 10000:
+                self._submitted.clear()
+            self._submitted[txid] = node
+
+    # Requests
+
+    def _headers(self, requrl: str, headers: dict = None) -> dict:
+        header = {}
+        if self.headers:
+            header.update(self.headers)
+        if headers:
+            header.update(headers)
+        if requrl not in constants.no_auth:
+            header[constants.algod_auth_header] = self.algod_token
+        return header
+
+    def algod_request(self, method, requrl, params=None, data=None, headers=None, response_format='json'):
+        header = self._headers(requrl, headers)
+        path = requrl if requrl in constants.unversioned_paths else algod.api_version_path_prefix + requrl
+        if params:
+            path += '?' + parse.urlencode(params)
+        idempotent = method == 'GET' or path.startswith(IDEMPOTENT_POSTS)
+        timeout = self.long_poll_timeout if path.startswith(LONG_POLL_PREFIX) else None
+
+        errors = []
+        for attempt, node in enumerate(self._candidates(self._pinned(method, path))[:self.retries + 1]):
+            if attempt:
+                time.sleep(min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+            try:
+                status, body = node.pool.request(method, path, data, header, timeout)
+            except ConnectionRefusedError as e:
+                node.failed(self.backoff, self.max_backoff)
+                errors.append(f'{node.address}: {e}')
+                continue
+            except (OSError, http.client.HTTPException) as e:
+                node.failed(self.backoff, self.max_backoff)
+                if not idempotent:
+                    raise NodeUnavailable(f'{node.address}: {e}') from e
+                errors.append(f'{node.address}: {e}')
+                continue
+
+            if status in RETRY_STATUSES and idempotent:
+                node.failed(self.backoff, self.max_backoff)
+                errors.append(f'{node.address}: HTTP {status}')
+                continue
+            node.succeeded()
+            if status >= 400:
+                text = body.decode('utf-8', 'replace')
+                try:
+                    message = json.loads(text)['message']
+                except (ValueError, KeyError, TypeError):
+                    message = text
+                raise AlgodHTTPError(message, status)
+            if response_format != 'json':
+                return body
+            try:
+                result = json.loads(body)
+            except ValueError:
+                return None
+            if isinstance(result, dict) and isinstance(result.get('last-round'), int):
+                node.last_round = result['last-round']
+            if method == 'POST' and path == SUBMIT_PATH and isinstance(result, dict) and result.get('txId'):
+                self._accepted(node, result['txId'])
+            return result
+        raise NodeUnavailable(f'{method} {requrl} failed on every node: {"; ".join(errors)}')
+
+    def close(self):
+        for node in self.nodes:
+            node.pool.close()
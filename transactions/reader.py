@@ -0,0 +1,132 @@
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from algosdk.error import AlgodHTTPError
+
+GLOBAL_KEYS = (
+    'TOTAL_LIQUIDITY_TOKENS',
+    'ALGOS_BALANCE',
+    'TOKENS_BALANCE',
+    'ESCROW_ADDR',
+    'CREATOR_ADDR',
+    'ASSET_IDX',
+)
+LOCAL_KEYS = (
+    'ALGOS_TO_WITHDRAW',
+    'TOKENS_TO_WITHDRAW',
+    'USER_LIQUIDITY_TOKENS',
+)
+
+# Keys come back base64 encoded, decode each of them only once
+_key_names = {base64.b64encode(name.encode('utf-8')).decode(): name for name in GLOBAL_KEYS + LOCAL_KEYS}
+
+
+def _key_name(encoded_key: str) -> str:
+    name = _key_names.get(encoded_key)
+    if name is None:
+        name = base64.b64decode(encoded_key).decode('utf-8', errors='replace')
+        _key_names[encoded_key] = name
+    return name
+
+
+def decode_state(key_value) -> dict:
+    return {
+        _key_name(key['key']): key['value']['bytes']
+        if key['value']['type'] == 1
+        else key['value']['uint'] for key in key_value or []
+    }
+
+
+def fetch_global_state(client, app_id: int) -> dict:
+    app = client.algod_request('GET', f'/applications/{app_id}')
+    return decode_state(app['params'].get('global-state'))
+
+
+def _local_state_from_account(account: dict, app_id: int):
+    for local_state in account.get('apps-local-state') or []:
+        if local_state['id'] == app_id:
+            return decode_state(local_state.get('key-value'))
+    return None
+
+
+class StateReader:
+    """
+    Reads pool and account state of a single application.
+
+    Global state comes from the application endpoint and local state from
+    the per-account application endpoint when the node supports it, instead
+    of whole `account_info` documents. Results are cached until the node
+    reports a new round, and many accounts are read concurrently.
+    """
+    def __init__(self, client, app_id: int, max_workers: int = 16):
+        self.client = client
+        self.app_id = app_id
+        self.max_workers = max_workers
+        # None until the node was seen to support /accounts/{addr}/applications/{id}
+        self.app_endpoint = None
+        self._round = None
+        self._global = None
+        self._locals = {}
+        self._lock = threading.Lock()
+
+    def _sync_round(self, round_num: int = None) -> int:
+        if round_num is None:
+            round_num = self.client.status()['last-round']
+        with self._lock:
+            if round_num != self._round:
+                self._round = round_num
+                self._global = None
+                self._locals = {}
+        return round_num
+
+    def global_state(self, round_num: int = None) -> dict:
+        self._sync_round(round_num)
+        state = self._global
+        if state is None:
+            state = self._global = fetch_global_state(self.client, self.app_id)
+        return state
+
+    def local_state(self, addr: str, round_num: int = None):
+        """
+        Return the decoded local state of `addr`, None when it has not opted in.
+        """
+        self._sync_round(round_num)
+        try:
+            return self._locals[addr]
+        except KeyError:
+            pass
+        state = self._locals[addr] = self.fetch_local_state(addr)
+        return state
+
+    def local_states(self, addrs, round_num: int = None) -> dict:
+        round_num = self._sync_round(round_num)
+        missing = [addr for addr in set(addrs) if addr not in self._locals]
+        if len(missing) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(missing))) as pool:
+                for addr, state in zip(missing, pool.map(self.fetch_local_state, missing)):
+                    self._locals[addr] = state
+        return {addr: self.local_state(addr, round_num) for addr in addrs}
+
+    def fetch_local_state(self, addr: str):
+        """
+        Read the local state of `addr` from the node, bypassing the cache.
+        """
+        if self.app_endpoint is not False:
+            try:
+                response = self.client.algod_request('GET', f'/accounts/{addr}/applications/{self.app_id}')
+            except AlgodHTTPError as e:
+                if e.code != 404:
+                    raise
+            else:
+                self.app_endpoint = True
+                local_state = response.get('app-local-state')
+                return decode_state(local_state.get('key-value')) if local_state else None
+            if self.app_endpoint:
+                # The endpoint works, the account just has not opted in
+                return None
+
+        state = _local_state_from_account(self.client.account_info(addr), self.app_id)
+        if state is not None:
+            self.app_endpoint = False
+        return state
@@ -0,0 +1,188 @@
+"""
+Per-account scheduling of SWAP, REMOVE_LIQUIDITY and WITHDRAW calls.
+
+SWAP and REMOVE_LIQUIDITY credit the account in local state and are
+rejected until that credit is withdrawn, so an account can only have one
+of them in flight. `Scheduler` queues the requests of every account and
+submits the next one only after the previous one and the WITHDRAW chained
+to it have confirmed, while the queues of different accounts run in
+parallel on a thread pool.
+"""
+import copy
+import threading
+from collections import deque, namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+
+from transactions.batch import RemoveLiquidityRequest, SwapRequest, WithdrawRequest
+from transactions.main import remove_liquidity_call, swap_call, withdraw_call
+from transactions.params import SuggestedParamsProvider
+from transactions.reader import StateReader
+from transactions.tracker import ConfirmationTracker
+from transactions.utils import resolve_params
+
+ScheduledResult = namedtuple(
+    'ScheduledResult', ['txid', 'confirmed_round', 'withdraw_txid', 'algos_amount', 'asset_amount']
+)
+
+
+class Scheduler:
+    """
+    Runs the requests of each account one after the other, and accounts in parallel.
+
+    Requests are the `SwapRequest`, `RemoveLiquidityRequest` and
+    `WithdrawRequest` tuples of `transactions.batch`. `submit()` returns a
+    future resolved with a ScheduledResult once the call, and the WITHDRAW
+    of whatever it credited, confirmed. A rejected request fails its own
+    future only, the next request of the account first withdraws any credit
+    left behind. `lsig` is the escrow LogicSig of the pool, it signs the
+    WITHDRAW transfers.
+    """
+    def __init__(
+        self,
+        client,
+        app_id: int,
+        escrow_addr: str,
+        asset_index: int,
+        lsig,
+        suggested_params=None,
+        tracker: ConfirmationTracker = None,
+        max_workers: int = 16,
+        timeout: float = None,
+    ):
+        self.client = client
+        self.app_id = app_id
+        self.escrow_addr = escrow_addr
+        self.asset_index = asset_index
+        self._own_params = suggested_params is None
+        self.suggested_params = suggested_params or SuggestedParamsProvider(client)
+        self.lsig = lsig
+        self.timeout = timeout
+        self.reader = StateReader(client, app_id)
+        self._own_tracker = tracker is None
+        self.tracker = tracker or ConfirmationTracker(client)
+        # Started before anything is sent, so no confirmation round is missed
+        self.tracker.start()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='scheduler')
+        self._queues = {}
+        self._running = set()
+        # Accounts known to have nothing to withdraw
+        self._settled = set()
+        # Round each account's last group confirmed in
+        self._last_round = {}
+        self._outstanding = set()
+        self._lock = threading.Lock()
+
+    def submit(self, request) -> Future:
+        if not isinstance(request, (SwapRequest, RemoveLiquidityRequest, WithdrawRequest)):
+            raise TypeError(f'cannot schedule {type(request).__name__}')
+        future = Future()
+        with self._lock:
+            self._queues.setdefault(request.user, deque()).append((request, future))
+            self._outstanding.add(future)
+            start = request.user not in self._running
+            if start:
+                self._running.add(request.user)
+        future.add_done_callback(self._done)
+        if start:
+            self._executor.submit(self._next, request.user)
+        return future
+
+    def _done(self, future):
+        with self._lock:
+            self._outstanding.discard(future)
+
+    def join(self, timeout: float = None):
+        """
+        Wait until every submitted request is done.
+        """
+        with self._lock:
+            pending = list(self._outstanding)
+        wait(pending, timeout)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        if self._own_tracker:
+            self.tracker.stop()
+        if self._own_params:
+            self.suggested_params.stop()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _next(self, user: str):
+        with self._lock:
+            request, future = self._queues[user].popleft()
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(self._run(request))
+            except Exception as e:
+                self._settled.discard(user)
+                future.set_exception(e)
+        with self._lock:
+            if not self._queues[user]:
+                del self._queues[user]
+                self._running.discard(user)
+                return
+        # One request per task, so busy accounts do not hold a worker while others wait
+        self._executor.submit(self._next, user)
+
+    # Requests
+
+    def _params(self, user: str):
+        params = resolve_params(self.suggested_params)
+        last_round = self._last_round.get(user)
+        if last_round is None or last_round <= params.first:
+            return params
+        # Repeating a request with the same params would send the same transaction again
+        params = copy.copy(params)
+        params.last += last_round - params.first
+        params.first = last_round
+        return params
+
+    def _confirm(self, user: str, txid: str, params) -> int:
+        confirmed_round = self.tracker.wait(txid, params.last, self.timeout)
+        self._last_round[user] = confirmed_round
+        return confirmed_round
+
+    def _withdraw(self, user: str, user_priv_key: str, algos_amount: int, asset_amount: int) -> tuple:
+        params = self._params(user)
+        txid = withdraw_call(
+            self.client, user, user_priv_key, params, self.app_id, self.escrow_addr, self.asset_index,
+            algos_amount, asset_amount, self.lsig,
+        )
+        return txid, self._confirm(user, txid, params)
+
+    def _withdraw_credit(self, user: str, user_priv_key: str) -> tuple:
+        state = self.reader.fetch_local_state(user) or {}
+        algos_amount = state.get('ALGOS_TO_WITHDRAW', 0)
+        asset_amount = state.get('TOKENS_TO_WITHDRAW', 0)
+        txid = None
+        if algos_amount or asset_amount:
+            txid, _ = self._withdraw(user, user_priv_key, algos_amount, asset_amount)
+        self._settled.add(user)
+        return txid, algos_amount, asset_amount
+
+    def _run(self, request) -> ScheduledResult:
+        user, user_priv_key = request.user, request.user_priv_key
+        if isinstance(request, WithdrawRequest):
+            txid, confirmed_round = self._withdraw(user, user_priv_key, request.algos_amount, request.asset_amount)
+            self._settled.add(user)
+            return ScheduledResult(txid, confirmed_round, None, request.algos_amount, request.asset_amount)
+
+        if user not in self._settled:
+            self._withdraw_credit(user, user_priv_key)
+        params = self._params(user)
+        if isinstance(request, SwapRequest):
+            txid = swap_call(
+                self.client, user, user_priv_key, params, self.app_id, request.amount, self.escrow_addr,
+                request.asset_index,
+            )
+        else:
+            txid = remove_liquidity_call(self.client, user, user_priv_key, params, self.app_id, request.amount)
+        self._settled.discard(user)
+        confirmed_round = self._confirm(user, txid, params)
+        withdraw_txid, algos_amount, asset_amount = self._withdraw_credit(user, user_priv_key)
+        return ScheduledResult(txid, confirmed_round, withdraw_txid, algos_amount, asset_amount)
@@ -0,0 +1,145 @@
+import base64
+import asyncio
+import threading
+from concurrent.futures import Future
+
+import msgpack
+from algosdk import encoding
+
+
+class ConfirmationExpired(Exception):
+    """
+    Raised when a tracked transaction was not confirmed before its last valid round.
+    """
+
+
+def _canonical(value):
+    if isinstance(value, dict):
+        return {key: _canonical(value[key]) for key in sorted(value)}
+    if isinstance(value, list):
+        return [_canonical(item) for item in value]
+    return value
+
+
+def block_txn_id(stxn: dict, block: dict) -> str:
+    """
+    Compute the id of a transaction as stored in a msgpack block.
+
+    Blocks strip the genesis hash, and the genesis id unless `hgi` is set,
+    from every transaction, so they are restored before hashing.
+    """
+    txn = dict(stxn['txn'])
+    txn['gh'] = block['gh']
+    if stxn.get('hgi'):
+        txn['gen'] = block['gen']
+    encoded = msgpack.packb(_canonical(txn), use_bin_type=True)
+    digest = encoding.checksum(b'TX' + encoded)
+    return base64.b32encode(digest).decode().strip('=')
+
+
+def decode_block(raw: bytes) -> dict:
+    return msgpack.unpackb(raw, raw=False, strict_map_key=False)['block']
+
+
+class ConfirmationTracker:
+    """
+    Resolve any number of transactions by following blocks once.
+
+    Every block is fetched a single time and matched against all tracked
+    transaction ids, instead of polling algod once per transaction.
+    """
+    def __init__(self, client, history_rounds: int = 10, block_time: float = 4.5):
+        self.client = client
+        self.history_rounds = history_rounds
+        self.block_time = block_time
+        self.last_round = None
+        self._pending = {}
+        self._recent = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = None
+
+    def track(self, txid: str, last_valid: int = None) -> Future:
+        """
+        Return a future resolved with the confirmed round of `txid`.
+        """
+        future = Future()
+        with self._lock:
+            confirmed_round = self._recent.get(txid)
+            if confirmed_round is not None:
+                future.set_result(confirmed_round)
+                return future
+            self._pending.setdefault(txid, []).append((future, last_valid))
+        if self._thread is None:
+            self.start()
+        return future
+
+    def wait(self, txid: str, last_valid: int = None, timeout: float = None) -> int:
+        return self.track(txid, last_valid).result(timeout)
+
+    async def wait_async(self, txid: str, last_valid: int = None, timeout: float = None) -> int:
+        return await asyncio.wait_for(asyncio.wrap_future(self.track(txid, last_valid)), timeout)
+
+    def process_block(self, round_num: int, block: dict):
+        confirmed = {block_txn_id(stxn, block) for stxn in block.get('txns') or []}
+        with self._lock:
+            for txid in confirmed:
+                self._recent[txid] = round_num
+                for future, _ in self._pending.pop(txid, []):
+                    future.set_result(round_num)
+
+            for txid, waiters in list(self._pending.items()):
+                alive = []
+                for future, last_valid in waiters:
+                    if last_valid is not None and round_num >= last_valid:
+                        future.set_exception(ConfirmationExpired(f'{txid} expired at round {last_valid}'))
+                    else:
+                        alive.append((future, last_valid))
+                if alive:
+                    self._pending[txid] = alive
+                else:
+                    del self._pending[txid]
+
+            # Remember recent confirmations so late registrations still resolve
+            oldest = round_num - self.history_rounds
+            self._recent = {txid: r for txid, r in self._recent.items() if r > oldest}
+            self.last_round = round_num
+
+    def fetch_block(self, round_num: int):
+        raw = self.client.block_info(round_num, response_format='msgpack')
+        self.process_block(round_num, decode_block(raw))
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self.last_round is None:
+                # Include the current round, transactions may have confirmed in it already
+                self.last_round = self.client.status()['last-round'] - 1
+            # Each thread has its own event, so one that is still stopping never runs on after a restart
+            self._stopped = threading.Event()
+            self._thread = threading.Thread(
+                target=self._follow_blocks, args=(self._stopped,), name='confirmation-tracker', daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, timeout: float = None):
+        """
+        Stop following blocks and wait up to `timeout` seconds, `block_time` by default, for the thread to exit.
+        """
+        with self._lock:
+            thread, self._thread = self._thread, None
+            if self._stopped is not None:
+                self._stopped.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(self.block_time if timeout is None else timeout)
+
+    def _follow_blocks(self, stopped: threading.Event):
+        while not stopped.is_set():
+            try:
+                last_round = self.client.status()['last-round']
+                while self.last_round < last_round and not stopped.is_set():
+                    self.fetch_block(self.last_round + 1)
+                self.client.status_after_block(self.last_round)
+            except Exception:
+                stopped.wait(1)
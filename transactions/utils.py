@@ -3,15 +3,43 @@ import base64
 
 from algosdk.v2client import algod
 
+from transactions.cache import ProgramCache
+from transactions import metrics
+from transactions.metrics import phase
+from transactions.params import SuggestedParamsProvider
+
 network = os.environ.get('NETWORK', 'localhost')
 algod_port = os.environ.get('ALGOD_PORT', 4001)
+algod_token = os.environ.get('ALGOD_TOKEN', 'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa')
+# Comma separated algod addresses, requests are spread over them with failover
+algod_nodes = os.environ.get('ALGOD_NODES')
+# Prometheus textfile that phase timings of the transaction helpers are written to, off when unset
+metrics_textfile = os.environ.get('METRICS_TEXTFILE')
+
+_client = None
+_params_provider = None
+
+program_cache = ProgramCache(
+    maxsize=int(os.environ.get('TEAL_CACHE_SIZE', 128)),
+    directory=os.environ.get('TEAL_CACHE_DIR'),
+)
 
 
-def compile_program(client, source_code):
+@phase('compile')
+def compile_program(client, source_code, cache=program_cache):
+    if cache is not None:
+        program = cache.get(source_code)
+        if program is not None:
+            return program
+
     compile_response = client.compile(source_code.decode('utf-8'))
-    return base64.b64decode(compile_response['result'])
+    program = base64.b64decode(compile_response['result'])
+    if cache is not None:
+        cache.put(source_code, program)
+    return program
 
 
+@phase('confirm')
 def wait_for_confirmation(client, txid):
     last_round = client.status().get('last-round')
     tx_info = client.pending_transaction_info(txid)
@@ -38,10 +66,67 @@ def int_to_bytes(i):
     return string.encode('latin1')
 
 
-client = algod.AlgodClient(
-    'aaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaaa',
-    f'http://{network}:{algod_port}'
-)
+def connect(address=None, token=None):
+    """
+    Create the shared algod client, replacing any previous one.
+    """
+    global _client, _params_provider
+    if network == 'local' and address is None:
+        # In-process ledger, for running the suite without a sandbox
+        from transactions.local import LocalClient
+        _client = LocalClient()
+    elif algod_nodes and address is None:
+        from transactions.pooled import PooledAlgodClient
+        _client = PooledAlgodClient(token or algod_token, algod_nodes)
+    else:
+        _client = algod.AlgodClient(
+            token or algod_token,
+            address or f'http://{network}:{algod_port}'
+        )
+    if _params_provider is not None:
+        _params_provider.stop()
+    _params_provider = None
+    if metrics_textfile and metrics.get_metrics() is None:
+        metrics.enable(
+            metrics.PrometheusTextfileSink(metrics_textfile),
+            interval=float(os.environ.get('METRICS_INTERVAL', 15)),
+        )
+    return _client
+
+
+def get_client():
+    if _client is None:
+        connect()
+    return _client
+
+
+def get_params_provider():
+    global _params_provider
+    if _params_provider is None:
+        _params_provider = SuggestedParamsProvider(
+            get_client(),
+            ttl_rounds=int(os.environ.get('PARAMS_TTL_ROUNDS', 500)),
+        )
+    return _params_provider
+
+
+def get_suggested_params():
+    return get_params_provider().get()
+
+
+def resolve_params(suggested_params):
+    """
+    Accept either suggested params or a provider and return a params snapshot.
+    """
+    if isinstance(suggested_params, SuggestedParamsProvider):
+        return suggested_params.get()
+    return suggested_params
 
-suggested_params = client.suggested_params()
 
+def __getattr__(name):
+    # `client` and `suggested_params` are created on first access, not on import
+    if name == 'client':
+        return get_client()
+    if name == 'suggested_params':
+        return get_params_provider()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')